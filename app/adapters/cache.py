@@ -0,0 +1,321 @@
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, Optional, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from app import settings
+from app.entities.user import User
+from app.entities.wallet import WalletEntity
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V", bound=BaseModel)
+
+
+@dataclass
+class CacheMetrics:
+    """Counters of the cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    def as_dict(self) -> dict:
+        """Return counters as plain dictionary."""
+
+        return dict(self.__dict__)
+
+
+def estimate_size(entity: BaseModel) -> int:
+    """
+    Roughly estimate memory (in bytes) taken by the entity.
+
+    :param entity: Cached entity
+    :returns: Size in bytes
+    """
+
+    fields = entity.__dict__
+    return sys.getsizeof(entity) + sys.getsizeof(fields) + sum(map(sys.getsizeof, fields.values()))
+
+
+class LRUCache(Generic[K, V]):
+    """
+    In-process LRU cache of entities with time to live.
+
+    Entries over 'max_entries' or 'max_bytes' are evicted starting
+    from the least recently used one.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        max_bytes: int,
+        on_remove: Optional[Callable[[V], None]] = None,
+    ):
+        """
+        Overwrites default constructor.
+
+        :param ttl: Time (in seconds) entry is valid for
+        :param max_entries: Maximum number of entries
+        :param max_bytes: Maximum estimated size of all entries
+        :param on_remove: Function called with entity removed from cache
+        """
+
+        self._on_remove = on_remove
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: "OrderedDict[K, Tuple[float, int, V]]" = OrderedDict()
+        self._size = 0
+        # Loaded value is stored only if nothing was invalidated during the load,
+        # otherwise it may be older than the invalidation
+        self._generation = 0
+        self.metrics = CacheMetrics()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    @property
+    def size(self) -> int:
+        """Estimated size of all entries in bytes."""
+
+        return self._size
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        Return cached entity, if it is not expired.
+
+        :param key: Key of entity
+        :returns: Entity or None
+        """
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.metrics.misses += 1
+            return None
+
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.metrics.expirations += 1
+            self.metrics.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.metrics.hits += 1
+        return value
+
+    def put(self, key: K, value: V):
+        """
+        Store entity in cache.
+
+        :param key: Key of entity
+        :param value: Entity
+        """
+
+        if key in self._entries:
+            self._remove(key)
+
+        size = estimate_size(value)
+        if size > self._max_bytes:
+            return
+
+        self._entries[key] = (time.monotonic() + self._ttl, size, value)
+        self._size += size
+        while len(self._entries) > self._max_entries or self._size > self._max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.metrics.evictions += 1
+
+    async def get_or_load(
+        self, key: K, loader: Callable[[], Awaitable[Optional[V]]]
+    ) -> Optional[V]:
+        """
+        Return cached entity or load it and store in cache.
+
+        :param key: Key of entity
+        :param loader: Function which loads entity from the database
+        :returns: Entity or None if it does not exist
+        """
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        generation = self._generation
+        value = await loader()
+        if value is not None and generation == self._generation:
+            self.put(key, value)
+        return value
+
+    def invalidate(self, keys: Iterable[K]):
+        """
+        Remove entities from cache.
+
+        :param keys: Keys of entities
+        """
+
+        self._generation += 1
+        for key in keys:
+            if key in self._entries:
+                self._remove(key)
+                self.metrics.invalidations += 1
+
+    def clear(self):
+        """Remove all entities from cache."""
+
+        self._generation += 1
+        for key in list(self._entries):
+            self._remove(key)
+            self.metrics.invalidations += 1
+
+    def _remove(self, key: K):
+        """Remove entry and update size of cache."""
+
+        _, size, value = self._entries.pop(key)
+        self._size -= size
+        if self._on_remove:
+            self._on_remove(value)
+
+
+class BalanceCache:
+    """Cache of users (with balances of their wallets) and wallets."""
+
+    def __init__(
+        self,
+        ttl: float = settings.BALANCE_CACHE_TTL,
+        max_entries: int = settings.BALANCE_CACHE_MAX_ENTRIES,
+        max_bytes: int = settings.BALANCE_CACHE_MAX_BYTES,
+        change_grace: float = settings.REPLICA_MAX_STALENESS + settings.REPLICA_CHECK_INTERVAL,
+    ):
+        """
+        Overwrites default constructor.
+
+        :param ttl: Time (in seconds) entry is valid for
+        :param max_entries: Maximum number of entries of each kind
+        :param max_bytes: Maximum estimated size of entries of each kind
+        :param change_grace: Time (in seconds) wallet is considered recently changed
+            after its invalidation (replica may not have the change yet)
+        """
+
+        # Owners of wallets are tracked only while they are cached
+        self._user_by_wallet: Dict[int, int] = {}
+        # Invalidation times of wallets within the grace window, the oldest first
+        self._changed_at: "OrderedDict[int, float]" = OrderedDict()
+        self._change_grace = change_grace
+        self.users: LRUCache[int, User] = LRUCache(
+            ttl,
+            max_entries,
+            max_bytes,
+            on_remove=self._forget_owner,
+        )
+        self.wallets: LRUCache[int, WalletEntity] = LRUCache(ttl, max_entries, max_bytes)
+        # Set while changes made by other processes may be missed (entities are not cached)
+        self.bypassed = False
+
+    async def get_user(
+        self, user_id: int, loader: Callable[[], Awaitable[Optional[User]]]
+    ) -> Optional[User]:
+        """
+        Return user by its id, loading it on cache miss.
+
+        :param user_id: ID of user
+        :param loader: Function which loads user from the database
+        :returns: User entity or None
+        """
+
+        if self.bypassed:
+            return await loader()
+        user = await self.users.get_or_load(user_id, loader)
+        if user is not None and user_id in self.users:
+            # Wallet of the user never changes
+            self._user_by_wallet[user.wallet_id] = user.id
+        return user
+
+    async def get_wallet(
+        self, wallet_id: int, loader: Callable[[], Awaitable[Optional[WalletEntity]]]
+    ) -> Optional[WalletEntity]:
+        """
+        Return wallet by its id, loading it on cache miss.
+
+        :param wallet_id: ID of wallet
+        :param loader: Function which loads wallet from the database
+        :returns: Wallet entity or None
+        """
+
+        if self.bypassed:
+            return await loader()
+        return await self.wallets.get_or_load(wallet_id, loader)
+
+    def invalidate_wallets(self, wallet_ids: Iterable[int]):
+        """
+        Remove wallets and their owners from cache.
+
+        :param wallet_ids: IDs of changed wallets
+        """
+
+        wallet_ids = list(wallet_ids)
+        now = time.monotonic()
+        for wallet_id in wallet_ids:
+            self._changed_at.pop(wallet_id, None)
+            self._changed_at[wallet_id] = now
+        self._forget_changes(now)
+        self.wallets.invalidate(wallet_ids)
+        self.users.invalidate(
+            [
+                self._user_by_wallet[wallet_id]
+                for wallet_id in wallet_ids
+                if wallet_id in self._user_by_wallet
+            ]
+        )
+
+    def changed_recently(self, wallet_id: int) -> bool:
+        """
+        Whether wallet was invalidated within the grace window.
+
+        Replica may still return the wallet (or its owner) without the change,
+        so it has to be read from the primary before it is cached again.
+
+        :param wallet_id: ID of wallet
+        :returns: True if the wallet was changed recently
+        """
+
+        changed_at = self._changed_at.get(wallet_id)
+        return changed_at is not None and time.monotonic() - changed_at < self._change_grace
+
+    def clear(self):
+        """Remove all entities from cache."""
+
+        self.wallets.clear()
+        self.users.clear()
+
+    def metrics(self) -> dict:
+        """Return counters and sizes of the cache."""
+
+        caches: Dict[str, LRUCache] = {"users": self.users, "wallets": self.wallets}
+        return {
+            name: {**cache.metrics.as_dict(), "entries": len(cache), "bytes": cache.size}
+            for name, cache in caches.items()
+        }
+
+    def _forget_changes(self, now: float):
+        """Stop tracking wallets changed before the grace window."""
+
+        while self._changed_at:
+            wallet_id, changed_at = next(iter(self._changed_at.items()))
+            if now - changed_at < self._change_grace:
+                break
+            del self._changed_at[wallet_id]
+
+    def _forget_owner(self, user: User):
+        """Stop tracking owner of the wallet when the user leaves cache."""
+
+        self._user_by_wallet.pop(user.wallet_id, None)
@@ -0,0 +1,88 @@
+import csv
+import io
+import zlib
+from enum import Enum
+from typing import AsyncIterator, List
+
+from app.entities.wallet_operation import WalletOperationEntity
+
+EXPORT_COLUMNS = ["id", "operation", "wallet_from", "wallet_to", "amount", "created_at"]
+
+
+class ExportFormats(Enum):
+    """Supported formats of operations export."""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+MEDIA_TYPES = {ExportFormats.CSV: "text/csv", ExportFormats.NDJSON: "application/x-ndjson"}
+
+
+def _csv_header() -> bytes:
+    """Return encoded header of CSV export."""
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_COLUMNS)
+    return buffer.getvalue().encode()
+
+
+def _csv(operations: List[WalletOperationEntity]) -> str:
+    """Serialize operations to CSV rows."""
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (
+            operation.id,
+            operation.operation.value,
+            operation.wallet_from,
+            operation.wallet_to,
+            operation.amount,
+            operation.created_at.isoformat(),
+        )
+        for operation in operations
+    )
+    return buffer.getvalue()
+
+
+def _ndjson(operations: List[WalletOperationEntity]) -> str:
+    """Serialize operations to newline delimited JSON."""
+
+    return "".join(f"{operation.json()}\n" for operation in operations)
+
+
+async def serialize_operations(
+    chunks: AsyncIterator[List[WalletOperationEntity]], export_format: ExportFormats
+) -> AsyncIterator[bytes]:
+    """
+    Serialize chunks of operations one by one.
+
+    :param chunks: Iterator over lists of operations
+    :param export_format: Format of the export
+    :returns: Iterator over encoded chunks (CSV starts with header)
+    """
+
+    if export_format == ExportFormats.CSV:
+        yield _csv_header()
+        serialize = _csv
+    else:
+        serialize = _ndjson
+    async for operations in chunks:
+        yield serialize(operations).encode()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """
+    Compress stream of bytes to gzip format without buffering the whole stream.
+
+    :param chunks: Iterator over data
+    :param level: Compression level
+    :returns: Iterator over compressed data
+    """
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for data in chunks:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
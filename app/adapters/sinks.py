@@ -0,0 +1,134 @@
+import asyncio
+import sys
+import urllib.request
+from abc import ABC, abstractmethod
+from typing import List, TextIO
+
+from app.entities.outbox import OutboxEvent
+
+
+def _ndjson(events: List[OutboxEvent]) -> str:
+    """Serialize events to newline delimited JSON."""
+
+    return "".join(f"{event.json()}\n" for event in events)
+
+
+class AbstractEventSink(ABC):
+    """Downstream system receiving events of the outbox."""
+
+    @abstractmethod
+    async def deliver(self, events: List[OutboxEvent]):
+        """
+        Deliver batch of events, raising error if it was not accepted.
+
+        Batch may be delivered more than once (if relay fails before
+        deleting it), so consumers should deduplicate events by id.
+
+        :param events: Events ordered by id
+        """
+        ...
+
+
+class StreamSink(AbstractEventSink):
+    """Sink writing events as NDJSON to text stream (stdout by default)."""
+
+    def __init__(self, stream: TextIO = sys.stdout):
+        """
+        Overwrites default constructor.
+
+        :param stream: Text stream
+        """
+
+        self._stream = stream
+
+    async def deliver(self, events: List[OutboxEvent]):
+        """
+        Write events to the stream.
+
+        :param events: Events ordered by id
+        """
+
+        self._stream.write(_ndjson(events))
+        self._stream.flush()
+
+
+class FileSink(AbstractEventSink):
+    """Sink appending events as NDJSON to file."""
+
+    def __init__(self, path: str):
+        """
+        Overwrites default constructor.
+
+        :param path: Path to the file
+        """
+
+        self._path = path
+
+    async def deliver(self, events: List[OutboxEvent]):
+        """
+        Append events to the file.
+
+        :param events: Events ordered by id
+        """
+
+        await asyncio.get_running_loop().run_in_executor(None, self._append, _ndjson(events))
+
+    def _append(self, data: str):
+        """Append data to the file (called in executor)."""
+
+        with open(self._path, "a", encoding="utf-8") as file:
+            file.write(data)
+
+
+class HttpSink(AbstractEventSink):
+    """Sink posting batches of events as NDJSON to HTTP endpoint."""
+
+    def __init__(self, url: str, timeout: float = 10):
+        """
+        Overwrites default constructor.
+
+        :param url: URL of the endpoint
+        :param timeout: Time (in seconds) to wait for the response
+        """
+
+        self._url = url
+        self._timeout = timeout
+
+    async def deliver(self, events: List[OutboxEvent]):
+        """
+        Post events to the endpoint, any status except 2xx is an error.
+
+        :param events: Events ordered by id
+        """
+
+        await asyncio.get_running_loop().run_in_executor(None, self._post, _ndjson(events))
+
+    def _post(self, data: str):
+        """Post data to the endpoint (called in executor)."""
+
+        request = urllib.request.Request(
+            self._url,
+            data=data.encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+            method="POST",
+        )
+        # Statuses over 2xx are raised by urlopen as HTTPError
+        with urllib.request.urlopen(request, timeout=self._timeout):  # nosec
+            pass
+
+
+def build_sink(target: str) -> AbstractEventSink:
+    """
+    Create sink by its target.
+
+    :param target: 'stdout', 'file:<path>' or URL of HTTP endpoint
+    :returns: Event sink
+    """
+
+    if target == "stdout":
+        return StreamSink()
+    if target.startswith("file:"):
+        return FileSink(path=target[len("file:") :])
+    if target.startswith(("http://", "https://")):
+        return HttpSink(url=target)
+    raise ValueError(f"Unknown sink: {target}")
@@ -0,0 +1,60 @@
+from typing import Any, Dict, List
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import ClauseElement
+
+
+def _get_dialect() -> postgresql.dialect:
+    """Return dialect configured the same way as in 'databases' postgres backend."""
+
+    dialect = postgresql.dialect(paramstyle="pyformat")
+    dialect.implicit_returning = True
+    dialect.supports_native_enum = True
+    dialect.supports_native_decimal = True
+    return dialect
+
+
+_dialect = _get_dialect()
+
+
+class CompiledQuery:
+    """
+    SQLAlchemy statement compiled to asyncpg SQL only once.
+
+    Values are passed through named bind parameters of the statement
+    (sa.bindparam), so the same SQL text is sent on every call and
+    asyncpg reuses its prepared statement from the connection cache.
+    """
+
+    def __init__(self, query: ClauseElement):
+        """
+        Overwrites default constructor.
+
+        :param query: Statement with named bind parameters
+        """
+
+        compiled = query.compile(dialect=_dialect)
+        # Literal values of the statement are kept as defaults
+        self._defaults: Dict[str, Any] = dict(compiled.params)
+        self.params: List[str] = sorted(compiled.params)
+        mapping = {name: f"${position}" for position, name in enumerate(self.params, start=1)}
+        self.sql: str = compiled.string % mapping
+        self._processors = {
+            name: processor
+            for name, processor in compiled._bind_processors.items()  # pylint: disable=protected-access
+            if name in mapping
+        }
+
+    def args(self, values: Dict[str, Any]) -> List[Any]:
+        """
+        Convert named values to positional arguments of the query.
+
+        :param values: Values of bind parameters
+        :returns: List of arguments
+        """
+
+        args = []
+        for name in self.params:
+            value = values[name] if name in values else self._defaults[name]
+            args.append(self._processors[name](value) if name in self._processors else value)
+        return args
@@ -1,20 +1,50 @@
+import asyncio
+from logging import getLogger
+
 from databases import Database
 
 from app import settings
 
-_db = Database(settings.BILLING_DB_DSN)  # type: ignore
+logger = getLogger(__name__)
+
+_db = Database(
+    settings.BILLING_DB_DSN,
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+    statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+    command_timeout=settings.DB_COMMAND_TIMEOUT,
+)  # type: ignore
 
 
 async def connect_db():
     """Function for estabslishing database connection."""
     if not _db.is_connected:
         await _db.connect()
+        await warm_up_db(_db, settings.DB_POOL_MIN_SIZE)
 
 
 async def disconnect_db():
     """Function for closing databse connection."""
     if _db.is_connected:
-        await _db.connect()
+        await _db.disconnect()
+
+
+async def warm_up_db(db: Database, connections: int):
+    """
+    Touch pool connections concurrently, so they are ready before the first requests.
+
+    :param db: Instance of Database class
+    :param connections: Number of connections to touch
+    """
+
+    async def _touch():
+        async with db.connection() as connection:
+            await connection.execute(query="select 1")
+
+    # Every task acquires its own connection from the pool
+    await asyncio.gather(*(asyncio.create_task(_touch()) for _ in range(connections)))
+    logger.info("Warmed up %s database connections", connections)
 
 
 def get_db() -> Database:
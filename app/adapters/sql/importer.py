@@ -0,0 +1,283 @@
+import csv
+import json
+import time
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from enum import Enum
+from logging import getLogger
+from typing import Iterator, List, Optional, Tuple
+
+import asyncpg
+from pydantic import EmailStr
+
+from app.entities.currency import CurrencyEnum
+from app.entities.outbox import OutboxEventTypes
+from app.entities.wallet_operation import Operations
+
+logger = getLogger(__name__)
+
+ImportRecord = Tuple[int, str, Decimal, str]
+
+# Precision and scale of balances, COPY of not fitting value fails the whole chunk
+BALANCE_PRECISION, BALANCE_SCALE = 10, 2
+
+CREATE_STAGING_QUERY = f"""
+create temp table if not exists import_staging (
+    line_no bigint not null,
+    email text not null,
+    balance numeric({BALANCE_PRECISION}, {BALANCE_SCALE}) not null,
+    currency text not null
+) on commit delete rows
+"""
+
+PROGRESS_QUERY = """
+insert into import_progress (import_id) values ($1)
+on conflict (import_id) do update set import_id = excluded.import_id
+returning last_line, imported, skipped
+"""
+
+MERGE_QUERY = f"""
+with source as (
+    select distinct on (email) email, balance, currency
+    from import_staging
+    order by email, line_no
+), new_users as (
+    insert into users (email)
+    select email from source
+    on conflict on constraint unique_email do nothing
+    returning id, email
+), new_wallets as (
+    insert into wallets (user_id, balance, currency)
+    select new_users.id, source.balance, source.currency
+    from new_users join source on source.email = new_users.email
+    returning id, user_id, balance
+), operations as (
+    insert into wallet_operations (operation, wallet_from, wallet_to, amount)
+    select '{Operations.CREATE.value}', null::integer, id, 0::numeric from new_wallets
+    union all
+    select '{Operations.DEPOSIT.value}', null::integer, id, balance from new_wallets where balance > 0
+    returning id
+), events as (
+    -- Same payloads as events of users created and enrolled through the API
+    insert into outbox (event_type, payload)
+    select
+        '{OutboxEventTypes.USER_CREATED.value}',
+        jsonb_build_object(
+            'user_id', new_users.id, 'email', new_users.email, 'wallet_id', new_wallets.id
+        )
+    from new_users join new_wallets on new_wallets.user_id = new_users.id
+    union all
+    select
+        '{OutboxEventTypes.DEPOSIT.value}',
+        jsonb_build_object(
+            'wallet_from', null, 'wallet_to', id, 'credited_wallet_id', id,
+            'debited_wallet_id', null, 'amount', balance::text
+        )
+    from new_wallets where balance > 0
+    returning id
+)
+select count(*) from new_wallets
+"""
+
+UPDATE_PROGRESS_QUERY = """
+update import_progress
+set last_line = $2, imported = imported + $3, skipped = skipped + $4
+where import_id = $1
+"""
+
+
+class ImportFormats(Enum):
+    """Supported formats of import file."""
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class InvalidRecord(ValueError):
+    """Exception for row of the import file which cannot be imported."""
+
+
+@dataclass
+class ImportStats:
+    """Statistics of the import."""
+
+    last_line: int = 0
+    imported: int = 0
+    skipped: int = 0
+
+
+def _parse_balance(value: object) -> Decimal:
+    """
+    Convert raw balance to decimal fitting the balance column.
+
+    :param value: Raw balance
+    :returns: Balance
+    :raises InvalidRecord: If balance is not a non-negative number fitting the column
+    """
+
+    try:
+        balance = Decimal(str(value))
+    except InvalidOperation as error:
+        raise InvalidRecord(f"balance {value!r} is not a number") from error
+    if not balance.is_finite() or balance < 0:
+        raise InvalidRecord(f"balance {value!r} is not a non-negative number")
+
+    _, digits, exponent = balance.normalize().as_tuple()
+    if -exponent > BALANCE_SCALE:
+        raise InvalidRecord(f"balance {value!r} has more than {BALANCE_SCALE} decimal places")
+    if len(digits) + exponent > BALANCE_PRECISION - BALANCE_SCALE:
+        raise InvalidRecord(
+            f"balance {value!r} does not fit numeric({BALANCE_PRECISION}, {BALANCE_SCALE})"
+        )
+    return balance
+
+
+def _parse_record(line_no: int, data: Optional[dict]) -> ImportRecord:
+    """
+    Convert raw row of the import file to the staging record.
+
+    :param line_no: Number of the row in file
+    :param data: Raw row (None for malformed row)
+    :returns: Staging record
+    :raises InvalidRecord: If the row is not valid
+    """
+
+    if not isinstance(data, dict):
+        raise InvalidRecord("malformed row")
+    email = str(data.get("email") or "").strip()
+    currency = str(data.get("currency") or CurrencyEnum.USD.value)
+    # Validated and normalized the same way as emails of users created through the API
+    try:
+        email = EmailStr.validate(email)
+    except ValueError as error:
+        raise InvalidRecord(f"email {email!r} is not valid") from error
+    if currency not in CurrencyEnum.__members__:
+        raise InvalidRecord(f"currency {currency!r} is not supported")
+    return line_no, email, _parse_balance(data.get("balance") or "0"), currency
+
+
+def read_records(path: str, file_format: ImportFormats) -> Iterator[Tuple[int, Optional[dict]]]:
+    """
+    Lazily read rows of the import file.
+
+    :param path: Path to the file
+    :param file_format: Format of the file
+    :returns: Iterator over pairs of row number and raw row (None for malformed rows)
+    """
+
+    with open(path, newline="", encoding="utf-8") as import_file:
+        if file_format == ImportFormats.CSV:
+            for line_no, row in enumerate(csv.DictReader(import_file), start=1):
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(import_file, start=1):
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_no, None
+
+
+class BalanceImporter:
+    """Imports users, wallets and opening balances through COPY."""
+
+    def __init__(self, connection: asyncpg.Connection, chunk_size: int = 10000):
+        """
+        Overwrites default constructor.
+
+        :param connection: Raw asyncpg connection
+        :param chunk_size: Number of rows merged within one transaction
+        """
+
+        self._connection = connection
+        self._chunk_size = chunk_size
+
+    async def run(self, path: str, file_format: ImportFormats, import_id: str) -> ImportStats:
+        """
+        Import file, skipping rows committed by the previous runs with the same import id.
+
+        :param path: Path to the file
+        :param file_format: Format of the file
+        :param import_id: ID of the import (used for resuming)
+        :returns: Import statistics
+        """
+
+        await self._connection.execute(CREATE_STAGING_QUERY)
+        row = await self._connection.fetchrow(PROGRESS_QUERY, import_id)
+        stats = ImportStats(**dict(row))
+        if stats.last_line:
+            logger.info("Resuming import %s from line %s", import_id, stats.last_line + 1)
+
+        started_at = time.monotonic()
+        processed = 0
+        chunk: List[ImportRecord] = []
+        invalid = 0
+        last_line = stats.last_line
+        for line_no, data in read_records(path, file_format):
+            if line_no <= stats.last_line:
+                continue
+
+            try:
+                chunk.append(_parse_record(line_no, data))
+            except InvalidRecord as error:
+                logger.warning("Skipping line %s of %s: %s", line_no, path, error)
+                invalid += 1
+            last_line = line_no
+
+            if len(chunk) + invalid >= self._chunk_size:
+                processed += len(chunk) + invalid
+                await self._merge_chunk(import_id, chunk, invalid, last_line, stats)
+                self._report(stats, processed, started_at)
+                chunk, invalid = [], 0
+
+        if chunk or invalid:
+            processed += len(chunk) + invalid
+            await self._merge_chunk(import_id, chunk, invalid, last_line, stats)
+            self._report(stats, processed, started_at)
+        return stats
+
+    async def _merge_chunk(
+        self,
+        import_id: str,
+        chunk: List[ImportRecord],
+        invalid: int,
+        last_line: int,
+        stats: ImportStats,
+    ):
+        """
+        Copy chunk to the staging table and merge it within one transaction.
+
+        :param import_id: ID of the import
+        :param chunk: Valid records of the chunk
+        :param invalid: Number of invalid rows of the chunk
+        :param last_line: Number of the last row of the chunk
+        :param stats: Import statistics to update
+        """
+
+        async with self._connection.transaction():
+            await self._connection.copy_records_to_table(
+                "import_staging",
+                records=chunk,
+                columns=["line_no", "email", "balance", "currency"],
+            )
+            imported = await self._connection.fetchval(MERGE_QUERY)
+            skipped = len(chunk) - imported + invalid
+            await self._connection.execute(
+                UPDATE_PROGRESS_QUERY, import_id, last_line, imported, skipped
+            )
+
+        stats.last_line = last_line
+        stats.imported += imported
+        stats.skipped += skipped
+
+    @staticmethod
+    def _report(stats: ImportStats, processed: int, started_at: float):
+        """Log progress of the import."""
+
+        elapsed = time.monotonic() - started_at
+        logger.info(
+            "Imported up to line %s: %s imported, %s skipped, %.0f rows/sec",
+            stats.last_line,
+            stats.imported,
+            stats.skipped,
+            processed / elapsed if elapsed else 0,
+        )
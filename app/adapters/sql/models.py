@@ -1,6 +1,7 @@
 import enum
 
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
 
 metadata = sa.MetaData()
 
@@ -32,13 +33,48 @@ wallets = sa.Table(
     ),
     sa.Column("balance", sa.Numeric(10, 2, asdecimal=True), nullable=False, server_default="0"),
     sa.Column("currency", sa.String, server_default=CurrencyEnum.USD.value, nullable=False),
+    # Number of balance shards, 0 if balance is stored in the wallet row only
+    sa.Column("balance_shards", sa.SmallInteger, nullable=False, server_default="0"),
     sa.CheckConstraint("amount >= 0", name="operations_positive_amount"),
 )
 
+# Parts of balances of hot wallets, which are changed without locking the wallet row
+wallet_balance_shards = sa.Table(
+    "wallet_balance_shards",
+    metadata,
+    sa.Column(
+        "wallet_id",
+        sa.Integer,
+        sa.ForeignKey("wallets.id", ondelete="cascade"),
+        primary_key=True,
+        nullable=False,
+    ),
+    sa.Column("shard", sa.SmallInteger, primary_key=True, nullable=False),
+    sa.Column("balance", sa.Numeric(10, 2, asdecimal=True), nullable=False, server_default="0"),
+    sa.CheckConstraint("balance >= 0", name="wallet_shard_positive_balance"),
+)
+
+# Balance of the wallet including its shards (literals are not turned into bind parameters)
+_zero: sa.sql.ColumnElement = sa.literal_column("0")
+wallet_balance = (
+    wallets.c.balance
+    + sa.case(
+        [
+            (
+                wallets.c.balance_shards > _zero,
+                sa.select([sa.func.coalesce(sa.func.sum(wallet_balance_shards.c.balance), _zero)])
+                .where(wallet_balance_shards.c.wallet_id == wallets.c.id)
+                .scalar_subquery(),  # type: ignore[attr-defined]  # stubs lack SQLAlchemy 1.4 API
+            )
+        ],
+        else_=_zero,
+    )
+).label("balance")
+
 wallet_operations = sa.Table(
     "wallet_operations",
     metadata,
-    sa.Column("id", sa.Integer, primary_key=True, nullable=False),
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=True, nullable=False),
     sa.Column("operation", sa.String),
     sa.Column("wallet_from", sa.Integer, nullable=True),
     sa.Column("wallet_to", sa.Integer, nullable=True),
@@ -48,5 +84,122 @@ wallet_operations = sa.Table(
         nullable=False,
         server_default="0",
     ),
+    # Table is partitioned by month of creation, so it is a part of primary key
+    sa.Column(
+        "created_at",
+        sa.DateTime(timezone=True),
+        primary_key=True,
+        nullable=False,
+        server_default=sa.func.now(),
+    ),
     sa.CheckConstraint("balance >= 0", name="wallet_positive_balance"),
+    sa.Index("wallet_operations_wallet_to_id_idx", "wallet_to", "id"),
+    sa.Index("wallet_operations_wallet_from_id_idx", "wallet_from", "id"),
+)
+
+# Balances of wallets including operations created before 'taken_at'
+wallet_balance_snapshots = sa.Table(
+    "wallet_balance_snapshots",
+    metadata,
+    sa.Column(
+        "wallet_id",
+        sa.Integer,
+        sa.ForeignKey("wallets.id", ondelete="cascade"),
+        primary_key=True,
+        nullable=False,
+    ),
+    sa.Column("taken_at", sa.DateTime(timezone=True), primary_key=True, nullable=False),
+    sa.Column("balance", sa.Numeric(10, 2, asdecimal=True), nullable=False),
+)
+
+
+def wallet_operation_delta(wallet_id: sa.sql.ColumnElement) -> sa.sql.ColumnElement:
+    """
+    Return change of the wallet balance made by wallet operation.
+
+    Deposit of transfer is written with swapped wallets ('wallet_from' is the
+    credited one), while deposit of enrollment has only 'wallet_to'.
+
+    :param wallet_id: ID of wallet (column or bind parameter)
+    :returns: Signed amount of operation
+    """
+
+    operation = wallet_operations.c.operation
+    delta: sa.sql.ColumnElement = sa.case(
+        [
+            (
+                (operation == sa.literal_column("'WITHDRAWAL'"))
+                & (wallet_operations.c.wallet_from == wallet_id),
+                -wallet_operations.c.amount,
+            ),
+            (
+                (operation == sa.literal_column("'DEPOSIT'"))
+                & (
+                    sa.func.coalesce(wallet_operations.c.wallet_from, wallet_operations.c.wallet_to)
+                    == wallet_id
+                ),
+                wallet_operations.c.amount,
+            ),
+        ],
+        else_=_zero,
+    )
+    return delta
+
+
+import_progress = sa.Table(
+    "import_progress",
+    metadata,
+    sa.Column("import_id", sa.String, primary_key=True, nullable=False),
+    sa.Column("last_line", sa.BigInteger, nullable=False, server_default="0"),
+    sa.Column("imported", sa.BigInteger, nullable=False, server_default="0"),
+    sa.Column("skipped", sa.BigInteger, nullable=False, server_default="0"),
+)
+
+# Responses of successful writes by idempotency keys of requests
+idempotency_keys = sa.Table(
+    "idempotency_keys",
+    metadata,
+    sa.Column("key", sa.String, primary_key=True, nullable=False),
+    sa.Column("request_hash", sa.String, nullable=False),
+    sa.Column("response", sa.Text, nullable=True),
+    sa.Column(
+        "created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+    ),
+    sa.Index("idempotency_keys_created_at_idx", "created_at"),
+)
+
+# Events written in the transactions of the writes and delivered to downstream systems by relay
+outbox = sa.Table(
+    "outbox",
+    metadata,
+    sa.Column("id", sa.BigInteger, primary_key=True, autoincrement=True, nullable=False),
+    sa.Column("event_type", sa.String, nullable=False),
+    sa.Column("payload", JSONB, nullable=False),
+    sa.Column(
+        "created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+    ),
+)
+
+# Sums of wallet operations up to the watermark of the ledger reconciliation
+ledger_totals = sa.Table(
+    "ledger_totals",
+    metadata,
+    sa.Column(
+        "wallet_id",
+        sa.Integer,
+        sa.ForeignKey("wallets.id", ondelete="cascade"),
+        primary_key=True,
+        nullable=False,
+    ),
+    sa.Column("total", sa.Numeric(asdecimal=True), nullable=False, server_default="0"),
+)
+
+# The only row holds ID of the last wallet operation added to the ledger totals
+reconciliation_progress = sa.Table(
+    "reconciliation_progress",
+    metadata,
+    sa.Column("id", sa.Boolean, primary_key=True, nullable=False, server_default=sa.true()),
+    sa.Column("last_operation_id", sa.BigInteger, nullable=False, server_default="0"),
+    sa.Column("processed", sa.BigInteger, nullable=False, server_default="0"),
+    sa.CheckConstraint("id", name="reconciliation_progress_single_row"),
 )
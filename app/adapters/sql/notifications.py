@@ -0,0 +1,119 @@
+import asyncio
+from logging import getLogger
+from typing import Optional
+
+import asyncpg
+
+from app import settings
+from app.adapters.cache import BalanceCache
+
+logger = getLogger(__name__)
+
+# Channel is notified by the trigger on wallets table after commit
+WALLET_CHANGES_CHANNEL = "wallet_changes"
+LISTENER_APPLICATION_NAME = "billing_wallet_changes_listener"
+
+
+class WalletChangesListener:
+    """
+    Listens for notifications about changed wallets and evicts them from the local cache.
+
+    Notifications sent while the listener is disconnected are lost, so the
+    cache is bypassed until the connection is (re)established and flushed then.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        cache: BalanceCache,
+        reconnect_delay: float = settings.BALANCE_CACHE_LISTENER_RECONNECT_DELAY,
+        keepalive: float = settings.BALANCE_CACHE_LISTENER_KEEPALIVE,
+    ):
+        """
+        Overwrites default constructor.
+
+        :param dsn: Database DSN
+        :param cache: Cache of balances
+        :param reconnect_delay: Time (in seconds) to wait before reconnecting
+        :param keepalive: Interval (in seconds) of connection health checks
+        """
+
+        self._dsn = dsn
+        self._cache = cache
+        self._reconnect_delay = reconnect_delay
+        self._keepalive = keepalive
+        self._task: Optional[asyncio.Task] = None
+        # Set while notifications are being received
+        self.connected: Optional[asyncio.Event] = None
+
+    async def start(self):
+        """Start listening in background task."""
+
+        if self._task is None:
+            self.connected = asyncio.Event()
+            self._cache.bypassed = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop listening and close the connection."""
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._cache.bypassed = True
+
+    async def _run(self):
+        """Keep connection listening, reconnect after failures."""
+
+        while True:
+            try:
+                await self._listen()
+            # Cancellation is not an Exception, so it stops the loop
+            except Exception:  # pylint: disable=broad-except
+                logger.exception(
+                    "Wallet changes listener failed, reconnect in %ss", self._reconnect_delay
+                )
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _listen(self):
+        """Listen on a single connection until it is lost."""
+
+        connection = await asyncpg.connect(
+            self._dsn, server_settings={"application_name": LISTENER_APPLICATION_NAME}
+        )
+        closed = asyncio.Event()
+        try:
+            connection.add_termination_listener(lambda _: closed.set())
+            await connection.add_listener(WALLET_CHANGES_CHANNEL, self._on_notification)
+            self._cache.clear()
+            self._cache.bypassed = False
+            self.connected.set()
+            logger.info("Listening for wallet changes")
+            while not closed.is_set():
+                try:
+                    await asyncio.wait_for(closed.wait(), timeout=self._keepalive)
+                except asyncio.TimeoutError:
+                    # Broken network is not noticed until something is sent
+                    await connection.execute("select 1")
+        finally:
+            self.connected.clear()
+            self._cache.bypassed = True
+            self._cache.clear()
+            if not connection.is_closed():
+                connection.terminate()
+
+    def _on_notification(self, _connection, _pid: int, _channel: str, payload: str):
+        """
+        Evict changed wallets from cache.
+
+        :param payload: Comma separated IDs of wallets, empty to flush the whole cache
+        """
+
+        if payload:
+            self._cache.invalidate_wallets(int(wallet_id) for wallet_id in payload.split(","))
+        else:
+            self._cache.clear()
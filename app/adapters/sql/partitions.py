@@ -0,0 +1,187 @@
+from datetime import date, datetime, timezone
+from logging import getLogger
+from typing import List, Optional
+
+import sqlalchemy as sa
+from databases import Database
+from databases.core import Connection
+
+from app import settings
+from app.adapters.sql.tx import LockID
+
+logger = getLogger(__name__)
+
+PARTITIONED_TABLE = "wallet_operations"
+PARTITION_PREFIX = f"{PARTITIONED_TABLE}_p"
+DEFAULT_PARTITION = f"{PARTITIONED_TABLE}_default"
+ARCHIVE_SCHEMA = "archive"
+
+PARTITIONS_QUERY = """
+select child.relname as name
+from pg_inherits
+join pg_class parent on parent.oid = pg_inherits.inhparent
+join pg_class child on child.oid = pg_inherits.inhrelid
+where parent.relname = :table
+order by child.relname
+"""
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Return first day of the month shifted by given number of months.
+
+    :param month: Any day of the month
+    :param months: Number of months to add
+    :returns: First day of the resulting month
+    """
+
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Return name of partition for the month."""
+
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+class PartitionManager:
+    """Maintains monthly partitions of wallet_operations table."""
+
+    def __init__(self, db: Database):
+        """
+        Overwrites default constructor.
+
+        :param db: Instance of Database class
+        """
+
+        self._db = db
+
+    async def create_future_partitions(
+        self, months_ahead: int = settings.WALLET_OPERATIONS_PARTITIONS_AHEAD
+    ) -> List[str]:
+        """
+        Create partitions for the current and the next months (if they do not exist).
+
+        :param months_ahead: Number of months after the current one
+        :returns: Names of created partitions
+        """
+
+        current_month = add_months(datetime.now(timezone.utc).date(), 0)
+        # Statements are executed on the connection of the transaction
+        async with self._db.connection() as connection, connection.transaction():
+            # Several application instances may start at the same time
+            await connection.execute(
+                query=sa.select([sa.func.pg_advisory_xact_lock(LockID.PARTITIONS.value, 1)])
+            )
+            existing = set(await self._list_partitions(connection))
+            created = []
+            for months in range(months_ahead + 1):
+                month = add_months(current_month, months)
+                name = partition_name(month)
+                if name in existing:
+                    continue
+                await self._create_partition(connection, month)
+                created.append(name)
+
+        if created:
+            logger.info("Created partitions: %s", ", ".join(created))
+        return created
+
+    async def archive_partitions(self, before: date) -> List[str]:
+        """
+        Detach partitions of months before given one and move them to the archive schema.
+
+        :param before: First month which is kept in table
+        :returns: Names of archived partitions
+        """
+
+        boundary = partition_name(add_months(before, 0))
+        archived = []
+        async with self._db.connection() as connection, connection.transaction():
+            await connection.execute(query=f"create schema if not exists {ARCHIVE_SCHEMA}")
+            for name in await self._list_partitions(connection):
+                # Names of monthly partitions are ordered as months
+                if not name[len(PARTITION_PREFIX) :].isdigit() or name >= boundary:
+                    continue
+                await connection.execute(
+                    query=f"alter table {PARTITIONED_TABLE} detach partition {name}"
+                )
+                await connection.execute(query=f"alter table {name} set schema {ARCHIVE_SCHEMA}")
+                archived.append(name)
+
+        if archived:
+            logger.info("Archived partitions: %s", ", ".join(archived))
+        return archived
+
+    @staticmethod
+    async def _create_partition(connection: Connection, month: date):
+        """
+        Create partition for the month, moving rows of its range out of the default partition.
+
+        Partition cannot be created while the default one holds rows of its range
+        (e.g. written while the application was down), so they are copied aside
+        and inserted again after the partition is created.
+
+        :param connection: Connection with open transaction
+        :param month: First day of the month
+        """
+
+        name = partition_name(month)
+        # Identifiers and bounds are built from dates only, so formatting is safe
+        since, until = f"'{month} 00:00:00+00'", f"'{add_months(month, 1)} 00:00:00+00'"
+        in_range = f"created_at >= {since} and created_at < {until}"
+        # Rows cannot be written to the default partition until the end of the transaction
+        await connection.execute(
+            query=f"lock table {DEFAULT_PARTITION} in share row exclusive mode"
+        )
+        await connection.execute(
+            query=(
+                f"create temp table moved_operations as "
+                f"select * from {DEFAULT_PARTITION} where {in_range}"
+            )
+        )
+        moved = await connection.fetch_val(query="select count(*) from moved_operations")
+        if moved:
+            await connection.execute(query=f"delete from {DEFAULT_PARTITION} where {in_range}")
+        await connection.execute(
+            query=(
+                f"create table {name} partition of {PARTITIONED_TABLE} "
+                f"for values from ({since}) to ({until})"
+            )
+        )
+        if moved:
+            await connection.execute(
+                query=f"insert into {PARTITIONED_TABLE} select * from moved_operations"
+            )
+            logger.warning("Moved %s operations from %s to %s", moved, DEFAULT_PARTITION, name)
+        await connection.execute(query="drop table moved_operations")
+
+    async def _list_partitions(self, connection: Optional[Connection] = None) -> List[str]:
+        """Return names of partitions of wallet_operations table."""
+
+        rows = await (connection or self._db).fetch_all(
+            query=PARTITIONS_QUERY, values={"table": PARTITIONED_TABLE}
+        )
+        return [row["name"] for row in rows]
+
+
+async def create_partitions(
+    months_ahead: int = settings.WALLET_OPERATIONS_PARTITIONS_AHEAD,
+) -> List[str]:
+    """
+    Create future partitions over a single short-lived connection.
+
+    Used by CLI and on startup of the application working on raw asyncpg pool,
+    so that the shared 'databases' pool is not opened next to it.
+
+    :param months_ahead: Number of months after the current one
+    :returns: Names of created partitions
+    """
+
+    db = Database(settings.BILLING_DB_DSN, min_size=1, max_size=1)
+    await db.connect()
+    try:
+        return await PartitionManager(db=db).create_future_partitions(months_ahead=months_ahead)
+    finally:
+        await db.disconnect()
@@ -0,0 +1,100 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from typing import AsyncGenerator, Optional
+
+import asyncpg
+
+from app import settings
+
+logger = getLogger(__name__)
+
+_current_connection: ContextVar[Optional[asyncpg.Connection]] = ContextVar(
+    "asyncpg_connection", default=None
+)
+
+
+class AsyncpgDatabase:
+    """Thin wrapper of asyncpg pool, which binds connection to the current task."""
+
+    def __init__(self, dsn: str, **pool_options):
+        """
+        Overwrites default constructor.
+
+        :param dsn: Database DSN
+        :param pool_options: Options of asyncpg.create_pool
+        """
+
+        self._dsn = dsn
+        self._pool_options = pool_options
+        self._pool: Optional[asyncpg.Pool] = None
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether the pool is created."""
+
+        return self._pool is not None
+
+    async def connect(self):
+        """Create pool and warm up its connections."""
+
+        if self._pool is not None:
+            return
+
+        self._pool = await asyncpg.create_pool(self._dsn, **self._pool_options)
+        # Every task acquires its own connection from the pool
+        min_size = self._pool_options.get("min_size", 0)
+        await asyncio.gather(*(self._touch() for _ in range(min_size)))
+        logger.info("Connected to database with asyncpg pool")
+
+    async def disconnect(self):
+        """Close pool."""
+
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncGenerator[asyncpg.Connection, None]:
+        """
+        Return connection of the current task, acquire it from the pool if there is none.
+
+        Nested calls within the same task share the connection, so repositories
+        join the transaction started by the transaction manager.
+        """
+
+        connection = _current_connection.get()
+        if connection is not None:
+            yield connection
+            return
+
+        assert self._pool is not None, "Pool is not created"
+        async with self._pool.acquire() as connection:
+            token = _current_connection.set(connection)
+            try:
+                yield connection
+            finally:
+                _current_connection.reset(token)
+
+    async def _touch(self):
+        """Acquire connection and run a trivial query on it."""
+
+        async with self._pool.acquire() as connection:
+            await connection.execute("select 1")
+
+
+_pool_db = AsyncpgDatabase(
+    settings.BILLING_DB_DSN,
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_MAX_SIZE,
+    max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+    statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+    command_timeout=settings.DB_COMMAND_TIMEOUT,
+)
+
+
+def get_pool_db() -> AsyncpgDatabase:
+    """Return asyncpg database instance."""
+
+    return _pool_db
@@ -0,0 +1,362 @@
+import csv
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from logging import getLogger
+from typing import Dict, List, Optional, TextIO
+
+import asyncpg
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from app import settings
+from app.adapters.sql.compiled import CompiledQuery
+from app.adapters.sql.models import (
+    ledger_totals,
+    reconciliation_progress,
+    wallet_balance,
+    wallet_operation_delta,
+    wallet_operations,
+    wallets,
+)
+
+logger = getLogger(__name__)
+
+_zero: sa.sql.ColumnElement = sa.literal_column("0")
+# Wallet whose balance is changed by the operation: deposit of transfer is
+# written with swapped wallets, deposit of enrollment has only 'wallet_to'
+_changed_wallet: sa.sql.ColumnElement = sa.case(
+    [
+        (
+            wallet_operations.c.operation == sa.literal_column("'WITHDRAWAL'"),
+            wallet_operations.c.wallet_from,
+        )
+    ],
+    else_=sa.func.coalesce(wallet_operations.c.wallet_from, wallet_operations.c.wallet_to),
+)
+
+PROGRESS_QUERY = CompiledQuery(
+    sa.select([reconciliation_progress.c.last_operation_id, reconciliation_progress.c.processed])
+)
+# Operations are reconciled only when they are old enough, so the ones with lower
+# ids are committed by then (ids are taken from the sequence before the commit)
+SETTLED_OPERATION_QUERY = CompiledQuery(
+    sa.select(
+        [
+            sa.func.coalesce(
+                sa.func.max(wallet_operations.c.id),
+                sa.bindparam("after_operation_id", type_=sa.BigInteger),
+            )
+        ]
+    ).where(
+        sa.and_(
+            wallet_operations.c.id > sa.bindparam("after_operation_id", type_=sa.BigInteger),
+            wallet_operations.c.created_at
+            < sa.func.now() - sa.cast(sa.bindparam("settle_interval"), sa.Interval),
+        )
+    )
+)
+STREAM_OPERATIONS_QUERY = CompiledQuery(
+    sa.select(
+        [
+            wallet_operations.c.id,
+            _changed_wallet.label("wallet_id"),
+            wallet_operation_delta(_changed_wallet).label("delta"),
+        ]
+    )
+    .where(
+        sa.and_(
+            wallet_operations.c.id > sa.bindparam("after_operation_id", type_=sa.BigInteger),
+            wallet_operations.c.id <= sa.bindparam("until_operation_id", type_=sa.BigInteger),
+        )
+    )
+    .order_by(wallet_operations.c.id)
+)
+
+_totals_rows = (
+    sa.func.unnest(
+        sa.bindparam("wallet_ids", type_=ARRAY(sa.Integer)),
+        sa.bindparam("deltas", type_=ARRAY(sa.Numeric)),
+    )
+    .table_valued("wallet_id", "delta")
+    .render_derived(name="totals")
+)
+_new_totals = insert(ledger_totals).from_select(
+    ["wallet_id", "total"],
+    # Operations of deleted wallets are skipped
+    sa.select([_totals_rows.c.wallet_id, _totals_rows.c.delta])
+    .select_from(_totals_rows.join(wallets, wallets.c.id == _totals_rows.c.wallet_id))
+    .order_by(_totals_rows.c.wallet_id),
+)
+ADD_TOTALS_QUERY = CompiledQuery(
+    _new_totals.on_conflict_do_update(
+        index_elements=[ledger_totals.c.wallet_id],
+        set_={"total": ledger_totals.c.total + _new_totals.excluded.total},
+    )
+)
+# Watermark is compared with the read one, so concurrent runs do not add operations twice
+UPDATE_PROGRESS_QUERY = CompiledQuery(
+    reconciliation_progress.update()
+    .where(
+        reconciliation_progress.c.last_operation_id
+        == sa.bindparam("after_operation_id", type_=sa.BigInteger)
+    )
+    .values(
+        last_operation_id=sa.bindparam("last_operation_id", type_=sa.BigInteger),
+        processed=reconciliation_progress.c.processed
+        + sa.bindparam("operations", type_=sa.BigInteger),
+    )
+    .returning(reconciliation_progress.c.last_operation_id)
+)
+
+
+def _compare_balances_query() -> sa.sql.Select:
+    """
+    Statement which returns balances of the chunk of wallets with their ledger sums.
+
+    Operations after the watermark are added to the ledger totals within the
+    same statement, so both sums are taken from the same snapshot.
+    """
+
+    tail = (
+        sa.select(
+            [
+                sa.func.coalesce(sa.func.sum(wallet_operation_delta(wallets.c.id)), _zero).label(
+                    "delta"
+                )
+            ]
+        )
+        .where(
+            sa.and_(
+                sa.or_(
+                    wallet_operations.c.wallet_from == wallets.c.id,
+                    wallet_operations.c.wallet_to == wallets.c.id,
+                ),
+                wallet_operations.c.id > sa.bindparam("until_operation_id", type_=sa.BigInteger),
+            )
+        )
+        .lateral("tail")
+    )
+    return (
+        sa.select(
+            [
+                wallets.c.id,
+                wallet_balance,
+                (sa.func.coalesce(ledger_totals.c.total, _zero) + tail.c.delta).label("expected"),
+            ]
+        )
+        .select_from(
+            wallets.outerjoin(ledger_totals, ledger_totals.c.wallet_id == wallets.c.id).join(
+                tail, sa.true()
+            )
+        )
+        .where(wallets.c.id > sa.bindparam("after_wallet_id", type_=sa.Integer))
+        .order_by(wallets.c.id)
+        .limit(sa.bindparam("limit", type_=sa.Integer))
+    )
+
+
+COMPARE_BALANCES_QUERY = CompiledQuery(_compare_balances_query())
+
+
+class ReconciliationConflict(Exception):
+    """Exception for watermark moved by another reconciliation."""
+
+
+@dataclass
+class ReconciliationStats:
+    """Statistics of the reconciliation."""
+
+    last_operation_id: int = 0
+    processed: int = 0
+    wallets: int = 0
+    mismatches: int = 0
+
+
+class LedgerReconciler:
+    """
+    Checks balances of wallets against the sums of their operations.
+
+    Operations are streamed with server-side cursor in id order and their
+    sums are added to 'ledger_totals' chunk by chunk together with the
+    watermark, so the next run reads only operations after it.
+    """
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        chunk_size: int = settings.RECONCILIATION_CHUNK_SIZE,
+        settle_interval: timedelta = timedelta(seconds=settings.RECONCILIATION_SETTLE_SECONDS),
+    ):
+        """
+        Overwrites default constructor.
+
+        :param pool: Raw asyncpg pool (cursor and writes use two connections)
+        :param chunk_size: Number of operations added to the totals within one transaction
+        :param settle_interval: Minimal age of reconciled operations
+        """
+
+        self._pool = pool
+        self._chunk_size = chunk_size
+        self._settle_interval = settle_interval
+
+    async def run(self, report: Optional[TextIO] = None) -> ReconciliationStats:
+        """
+        Add new operations to the ledger totals and compare them with balances.
+
+        :param report: Text stream for CSV report of mismatched wallets
+        :returns: Reconciliation statistics
+        """
+
+        stats = await self.add_operations()
+        await self.compare_balances(stats, report)
+        return stats
+
+    async def add_operations(self) -> ReconciliationStats:
+        """
+        Stream operations after the watermark and add them to the ledger totals.
+
+        :returns: Reconciliation statistics
+        :raises ReconciliationConflict: If watermark was moved by another run
+        """
+
+        async with self._pool.acquire() as reader, self._pool.acquire() as writer:
+            row = await writer.fetchrow(PROGRESS_QUERY.sql)
+            stats = ReconciliationStats(**dict(row))
+            until_operation_id = await reader.fetchval(
+                SETTLED_OPERATION_QUERY.sql,
+                *SETTLED_OPERATION_QUERY.args(
+                    {
+                        "after_operation_id": stats.last_operation_id,
+                        "settle_interval": self._settle_interval,
+                    }
+                ),
+            )
+            if until_operation_id > stats.last_operation_id:
+                logger.info(
+                    "Reconciling operations %s..%s", stats.last_operation_id + 1, until_operation_id
+                )
+
+            started_at = time.monotonic()
+            processed = 0
+            async with reader.transaction(readonly=True):
+                cursor = await reader.cursor(
+                    STREAM_OPERATIONS_QUERY.sql,
+                    *STREAM_OPERATIONS_QUERY.args(
+                        {
+                            "after_operation_id": stats.last_operation_id,
+                            "until_operation_id": until_operation_id,
+                        }
+                    ),
+                )
+                while True:
+                    rows = await cursor.fetch(self._chunk_size)
+                    if not rows:
+                        break
+
+                    totals: Dict[int, Decimal] = defaultdict(Decimal)
+                    for operation in rows:
+                        totals[operation["wallet_id"]] += operation["delta"]
+                    await self._add_chunk(writer, totals, rows[-1]["id"], len(rows), stats)
+                    processed += len(rows)
+                    self._report(stats, processed, started_at)
+        return stats
+
+    async def compare_balances(
+        self, stats: ReconciliationStats, report: Optional[TextIO] = None
+    ) -> List[int]:
+        """
+        Compare balances of all wallets with the ledger in chunks of wallets.
+
+        :param stats: Reconciliation statistics to update
+        :param report: Text stream for CSV report of mismatched wallets
+        :returns: IDs of mismatched wallets
+        """
+
+        writer = csv.writer(report) if report else None
+        if writer:
+            writer.writerow(["wallet_id", "balance", "expected"])
+
+        mismatched: List[int] = []
+        after_wallet_id = 0
+        async with self._pool.acquire() as connection:
+            while True:
+                rows = await connection.fetch(
+                    COMPARE_BALANCES_QUERY.sql,
+                    *COMPARE_BALANCES_QUERY.args(
+                        {
+                            "until_operation_id": stats.last_operation_id,
+                            "after_wallet_id": after_wallet_id,
+                            "limit": self._chunk_size,
+                        }
+                    ),
+                )
+                if not rows:
+                    break
+
+                for row in rows:
+                    if row["balance"] != row["expected"]:
+                        mismatched.append(row["id"])
+                        if writer:
+                            writer.writerow([row["id"], row["balance"], row["expected"]])
+                stats.wallets += len(rows)
+                after_wallet_id = rows[-1]["id"]
+
+        stats.mismatches = len(mismatched)
+        logger.info("Checked %s wallets: %s mismatches", stats.wallets, stats.mismatches)
+        return mismatched
+
+    async def _add_chunk(
+        self,
+        connection: asyncpg.Connection,
+        totals: Dict[int, Decimal],
+        last_operation_id: int,
+        operations: int,
+        stats: ReconciliationStats,
+    ):
+        """
+        Add sums of the chunk to the ledger totals and move watermark within one transaction.
+
+        :param connection: Connection for writes
+        :param totals: Sums of operations of the chunk by wallets
+        :param last_operation_id: ID of the last operation of the chunk
+        :param operations: Number of operations of the chunk
+        :param stats: Reconciliation statistics to update
+        :raises ReconciliationConflict: If watermark was moved by another run
+        """
+
+        async with connection.transaction():
+            await connection.execute(
+                ADD_TOTALS_QUERY.sql,
+                *ADD_TOTALS_QUERY.args(
+                    {"wallet_ids": list(totals), "deltas": list(totals.values())}
+                ),
+            )
+            moved = await connection.fetchval(
+                UPDATE_PROGRESS_QUERY.sql,
+                *UPDATE_PROGRESS_QUERY.args(
+                    {
+                        "after_operation_id": stats.last_operation_id,
+                        "last_operation_id": last_operation_id,
+                        "operations": operations,
+                    }
+                ),
+            )
+            if moved is None:
+                raise ReconciliationConflict("Watermark was moved by another reconciliation")
+
+        stats.last_operation_id = last_operation_id
+        stats.processed += operations
+
+    @staticmethod
+    def _report(stats: ReconciliationStats, processed: int, started_at: float):
+        """Log progress of the reconciliation."""
+
+        elapsed = time.monotonic() - started_at
+        logger.info(
+            "Reconciled up to operation %s: %.0f operations/sec",
+            stats.last_operation_id,
+            processed / elapsed if elapsed else 0,
+        )
@@ -0,0 +1,134 @@
+import time
+from logging import getLogger
+from typing import Awaitable, Callable, Optional, TypeVar, Union
+
+import asyncpg
+from databases import Database
+
+from app import settings
+from app.adapters.sql.pool import AsyncpgDatabase
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+# Replica which has replayed everything it received is not behind,
+# no matter how long ago the last transaction was. Primary is never behind.
+LAG_QUERY = """
+select case
+    when not pg_is_in_recovery() then 0
+    when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+    else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+end
+"""
+
+# Errors after which the replica is considered unavailable
+REPLICA_ERRORS = (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+
+class ReplicaMonitor:
+    """
+    Read-only replica of the database, used while its replication lag is acceptable.
+
+    Lag is checked not more often than once in 'check_interval', reads are sent
+    to the primary while the replica is behind, unreachable or not configured.
+    """
+
+    def __init__(
+        self,
+        db: Union[Database, AsyncpgDatabase],
+        max_staleness: float = settings.REPLICA_MAX_STALENESS,
+        check_interval: float = settings.REPLICA_CHECK_INTERVAL,
+    ):
+        """
+        Overwrites default constructor.
+
+        :param db: Replica database instance
+        :param max_staleness: Maximal acceptable replication lag (in seconds)
+        :param check_interval: Time (in seconds) the result of lag check is valid for
+        """
+
+        self._db = db
+        self._max_staleness = max_staleness
+        self._check_interval = check_interval
+        self._is_usable = False
+        self._checked_at: Optional[float] = None
+        self.lag: Optional[float] = None
+
+    async def connect(self):
+        """Connect to the replica, failure is not fatal as reads fall back to the primary."""
+
+        try:
+            await self._db.connect()
+        except REPLICA_ERRORS as err:
+            logger.warning("Replica is unavailable, reading from primary: %s", err)
+
+    async def disconnect(self):
+        """Close connections to the replica."""
+
+        if self._db.is_connected:
+            await self._db.disconnect()
+
+    async def is_usable(self) -> bool:
+        """Whether reads can be sent to the replica."""
+
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self._check_interval:
+            return self._is_usable
+
+        self._checked_at = now
+        try:
+            if not self._db.is_connected:
+                await self._db.connect()
+            self.lag = await self._fetch_lag()
+        except REPLICA_ERRORS as err:
+            logger.warning("Replica is unavailable, reading from primary: %s", err)
+            self._is_usable = False
+            return False
+
+        self._is_usable = self.lag <= self._max_staleness
+        if not self._is_usable:
+            logger.info("Replica is %.3fs behind, reading from primary", self.lag)
+        return self._is_usable
+
+    def mark_failed(self):
+        """Send reads to the primary until the next check."""
+
+        self._is_usable = False
+        self._checked_at = time.monotonic()
+
+    async def read(
+        self,
+        replica_fn: Callable[[], Awaitable[Optional[T]]],
+        primary_fn: Callable[[], Awaitable[Optional[T]]],
+        is_fresh: Optional[Callable[[T], bool]] = None,
+    ) -> Optional[T]:
+        """
+        Execute read on the replica, falling back to the primary.
+
+        Missing result is read from the primary too, as it may be not replicated yet.
+
+        :param replica_fn: Function reading from the replica
+        :param primary_fn: The same function reading from the primary
+        :param is_fresh: Function checking the result of the replica (e.g. the entity was
+            not changed recently), rejected result is read from the primary
+        :returns: Result of the function
+        """
+
+        if await self.is_usable():
+            try:
+                result = await replica_fn()
+                if result is not None and (is_fresh is None or is_fresh(result)):
+                    return result
+            except REPLICA_ERRORS as err:
+                logger.warning("Read from replica failed, reading from primary: %s", err)
+                self.mark_failed()
+        return await primary_fn()
+
+    async def _fetch_lag(self) -> float:
+        """Return replication lag (in seconds)."""
+
+        if isinstance(self._db, AsyncpgDatabase):
+            async with self._db.connection() as connection:
+                return float(await connection.fetchval(LAG_QUERY))
+        return float(await self._db.fetch_val(query=LAG_QUERY))
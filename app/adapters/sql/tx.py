@@ -1,18 +1,66 @@
+import asyncio
+import random
 from abc import ABC, abstractmethod
+from collections import Counter
 from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from enum import Enum
 from logging import getLogger
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Collection, Iterable, List, Tuple, TypeVar
 
+import asyncpg
 import sqlalchemy as sa
+from asyncpg.exceptions import DeadlockDetectedError, LockNotAvailableError, SerializationError
 from databases import Database
+from databases.core import Connection
+
+from app import settings
+from app.adapters.sql.models import wallets
+from app.adapters.sql.pool import AsyncpgDatabase
 
 logger = getLogger(__name__)
 
+T = TypeVar("T")
+
+# Errors after which the whole transaction can be safely executed once again
+RETRYABLE_ERRORS = (SerializationError, DeadlockDetectedError)
+
+# Shared lock is taken only if the wallet is sharded, otherwise no row is returned
+SHARED_WALLET_LOCK_QUERY = (
+    "select pg_advisory_lock_shared($1, $2) from wallets where id = $2 and balance_shards > 0"
+)
+
+
+class LockNotAcquired(Exception):
+    """Exception for advisory lock which was not obtained in time"""
+
+
+class TransactionRetriesExhausted(Exception):
+    """Exception for transaction which kept failing with retryable errors"""
+
+
+@dataclass
+class RetryMetrics:
+    """Counters of transactions executed by the retrying runner."""
+
+    transactions: int = 0
+    retries: Counter = field(default_factory=Counter)
+    exhausted: int = 0
+
+    def as_dict(self) -> dict:
+        """Return counters as plain dictionary."""
+
+        return {
+            "transactions": self.transactions,
+            "retries": dict(self.retries),
+            "exhausted": self.exhausted,
+        }
+
 
 class IsolationLevels(Enum):
     """Represents isolation levels for the database transaction."""
 
+    READ_COMMITTED = "read_committed"
     REPEATABLE_READ = "repeatable_read"
     SERIALIZABLE = "serializable"
 
@@ -25,11 +73,38 @@ class LockID(Enum):
     CREATE_WALLET = 3
     WALLET_ENROLL = 4
     WALLET_TRANSFER = 5
+    WALLET = 6
+    PARTITIONS = 7
+
+
+def _isolation_for_locks(
+    isolation_level: IsolationLevels, locked_keys: List[Tuple[int, int, bool]]
+) -> IsolationLevels:
+    """
+    Return isolation level of transaction holding given advisory locks.
+
+    Concurrent credits of sharded wallet read the same shards, so under
+    serializable isolation they would fail each other. Wallets locked
+    exclusively still have no concurrent writers, which makes
+    repeatable read enough for such transactions.
+
+    :param isolation_level: Requested isolation level
+    :param locked_keys: Lock id, record id and whether lock is shared
+    :returns: Isolation level of transaction
+    """
+
+    if isolation_level is IsolationLevels.SERIALIZABLE and any(
+        shared for _, _, shared in locked_keys
+    ):
+        return IsolationLevels.REPEATABLE_READ
+    return isolation_level
 
 
 class AbstractTransactionManager(ABC):
     """Interface for transaction manager."""
 
+    retry_metrics: RetryMetrics
+
     @abstractmethod
     @asynccontextmanager
     async def advisory_lock(
@@ -47,12 +122,77 @@ class AbstractTransactionManager(ABC):
         """
         yield
 
+    @abstractmethod
+    @asynccontextmanager
+    async def wallet_lock(
+        self,
+        isolation_level: IsolationLevels,
+        wallet_ids: Iterable[int],
+        credited_wallet_ids: Iterable[int] = (),
+    ) -> AsyncGenerator:
+        """
+        Perform postgres advisory locking of the given wallets.
 
-class SQLTransactionManager(AbstractTransactionManager):
-    """Implementation of TransactionManager interface"""
+        Locks are taken in ascending order of wallet id, so operations
+        touching the same wallets can not deadlock each other. Wallets
+        which are only credited are locked in shared mode if their balances
+        are sharded, so credits of hot wallets run concurrently.
 
-    def __init__(self, db: Database):
-        self._db = db
+        :param isolation_level: One of the isolation_levels
+        :param wallet_ids: IDs of wallets to lock
+        :param credited_wallet_ids: IDs of wallets which are only credited
+        """
+        yield
+
+    @abstractmethod
+    @asynccontextmanager
+    async def transaction(self, isolation_level: IsolationLevels) -> AsyncGenerator:
+        """
+        Start transaction without advisory locks.
+
+        :param isolation_level: One of the isolation_levels
+        """
+        yield
+
+    @abstractmethod
+    async def run_with_retries(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Execute transactional function, re-executing it on serialization failures and deadlocks.
+
+        :param fn: Function which opens transaction and performs all of its work
+        :returns: Result of the function
+        :raises TransactionRetriesExhausted: If all of the attempts failed
+        """
+        ...
+
+
+class BaseTransactionManager(AbstractTransactionManager):
+    """Locking and retrying logic shared by the transaction managers of different drivers."""
+
+    def __init__(
+        self,
+        lock_timeout: int = settings.LOCK_TIMEOUT_MS,
+        lock_retries: int = settings.LOCK_RETRIES,
+        tx_retries: int = settings.TX_RETRIES,
+        tx_retry_base_delay: int = settings.TX_RETRY_BASE_DELAY_MS,
+        tx_retry_max_delay: int = settings.TX_RETRY_MAX_DELAY_MS,
+    ):
+        """
+        Overwrites default constructor.
+
+        :param lock_timeout: Time (in milliseconds) to wait for a single lock
+        :param lock_retries: Number of additional attempts to obtain a lock
+        :param tx_retries: Number of additional attempts to execute transaction
+        :param tx_retry_base_delay: Delay (in milliseconds) before the first retry
+        :param tx_retry_max_delay: Maximal delay (in milliseconds) between retries
+        """
+
+        self._lock_timeout = lock_timeout
+        self._lock_retries = lock_retries
+        self._tx_retries = tx_retries
+        self._tx_retry_base_delay = tx_retry_base_delay
+        self._tx_retry_max_delay = tx_retry_max_delay
+        self.retry_metrics = RetryMetrics()
 
     @asynccontextmanager
     async def advisory_lock(
@@ -69,17 +209,298 @@ class SQLTransactionManager(AbstractTransactionManager):
         :param record_id: ID of record
         """
 
-        lock_fn = sa.func.pg_try_advisory_lock
-        unlock_fn = sa.func.pg_advisory_unlock
+        async with self._locked_transaction(
+            isolation_level=isolation_level,
+            keys=[(lock_id.value, 1)],
+        ) as trx:
+            yield trx
+
+    @asynccontextmanager
+    async def wallet_lock(
+        self,
+        isolation_level: IsolationLevels,
+        wallet_ids: Iterable[int],
+        credited_wallet_ids: Iterable[int] = (),
+    ) -> AsyncGenerator:
+        """
+        Perform postgres advisory locking of the given wallets.
+
+        Locks are taken in ascending order of wallet id, so operations
+        touching the same wallets can not deadlock each other. Wallets
+        which are only credited are locked in shared mode if their balances
+        are sharded, so credits of hot wallets run concurrently.
+
+        :param isolation_level: One of the isolation_levels
+        :param wallet_ids: IDs of wallets to lock
+        :param credited_wallet_ids: IDs of wallets which are only credited
+        """
+
+        wallet_ids = set(wallet_ids)
+        credited_wallet_ids = set(credited_wallet_ids) - wallet_ids
+        keys = [
+            (LockID.WALLET.value, wallet_id)
+            for wallet_id in sorted(wallet_ids | credited_wallet_ids)
+        ]
+        shared_keys = {(LockID.WALLET.value, wallet_id) for wallet_id in credited_wallet_ids}
+        async with self._locked_transaction(
+            isolation_level=isolation_level, keys=keys, shared_keys=shared_keys
+        ) as trx:
+            yield trx
+
+    @asynccontextmanager
+    async def transaction(self, isolation_level: IsolationLevels) -> AsyncGenerator:
+        """
+        Start transaction without advisory locks.
+
+        :param isolation_level: One of the isolation_levels
+        """
+
+        async with self._locked_transaction(isolation_level=isolation_level, keys=[]) as trx:
+            yield trx
+
+    async def run_with_retries(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Execute transactional function, re-executing it on serialization failures and deadlocks.
+
+        Delay between attempts grows exponentially (up to 'tx_retry_max_delay')
+        and is randomized, so conflicting transactions do not collide again.
+
+        :param fn: Function which opens transaction and performs all of its work
+        :returns: Result of the function
+        :raises TransactionRetriesExhausted: If all of the attempts failed
+        """
+
+        self.retry_metrics.transactions += 1
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except RETRYABLE_ERRORS as err:
+                if attempt >= self._tx_retries:
+                    self.retry_metrics.exhausted += 1
+                    raise TransactionRetriesExhausted(
+                        f"Transaction failed after {attempt + 1} attempts: {err}"
+                    ) from err
+
+                self.retry_metrics.retries[err.sqlstate] += 1
+                delay = min(self._tx_retry_max_delay, self._tx_retry_base_delay * 2**attempt)
+                attempt += 1
+                logger.info(
+                    "Transaction failed with %s, attempt %s, retry in %sms",
+                    err.sqlstate,
+                    attempt,
+                    delay,
+                )
+                await asyncio.sleep(random.uniform(0, delay) / 1000)
+
+    @abstractmethod
+    @asynccontextmanager
+    async def _locked_transaction(
+        self,
+        isolation_level: IsolationLevels,
+        keys: List[Tuple[int, int]],
+        shared_keys: Collection[Tuple[int, int]] = (),
+    ) -> AsyncGenerator:
+        """
+        Obtain advisory locks by given keys (in given order) and start transaction.
+
+        :param isolation_level: One of the isolation_levels
+        :param keys: Pairs of lock id and record id
+        :param shared_keys: Keys of wallets locked in shared mode if the wallet is sharded
+        """
+        yield
+
+
+class SQLTransactionManager(BaseTransactionManager):
+    """Implementation of TransactionManager interface"""
+
+    def __init__(self, db: Database, **kwargs):
+        """
+        Overwrites default constructor.
+
+        :param db: Instance of Database class
+        :param kwargs: Locking and retrying options of BaseTransactionManager
+        """
+
+        super().__init__(**kwargs)
+        self._db = db
+
+    @asynccontextmanager
+    async def _locked_transaction(
+        self,
+        isolation_level: IsolationLevels,
+        keys: List[Tuple[int, int]],
+        shared_keys: Collection[Tuple[int, int]] = (),
+    ) -> AsyncGenerator:
+        """
+        Obtain advisory locks by given keys (in given order) and start transaction.
+
+        :param isolation_level: One of the isolation_levels
+        :param keys: Pairs of lock id and record id
+        :param shared_keys: Keys of wallets locked in shared mode if the wallet is sharded
+        """
 
         async with self._db.connection() as connection:
-            is_obtained = await connection.execute(query=sa.select([lock_fn(lock_id.value, 1)]))
-            if is_obtained:
+            locked_keys = []
+            try:
+                for lock_id, record_id in keys:
+                    shared = await self._obtain_lock(
+                        connection, lock_id, record_id, (lock_id, record_id) in shared_keys
+                    )
+                    locked_keys.append((lock_id, record_id, shared))
+
                 async with connection.transaction(
-                    isolation=isolation_level.value,
+                    isolation=_isolation_for_locks(isolation_level, locked_keys).value,
                 ) as trx:
                     yield trx
+            finally:
+                for lock_id, record_id, shared in reversed(locked_keys):
+                    unlock_fn = (
+                        sa.func.pg_advisory_unlock_shared if shared else sa.func.pg_advisory_unlock
+                    )
+                    is_released = await connection.execute(
+                        query=sa.select([unlock_fn(lock_id, record_id)])
+                    )
+                    if not is_released:
+                        logger.warning(
+                            "Postgres advisory lock (%s, %s) was not released",
+                            lock_id,
+                            record_id,
+                        )
+
+    async def _obtain_lock(
+        self, connection: Connection, lock_id: int, record_id: int, shared: bool = False
+    ) -> bool:
+        """
+        Wait for advisory lock with 'lock_timeout' for each of the attempts.
+
+        :param connection: Database connection
+        :param lock_id: ID of lock
+        :param record_id: ID of record
+        :param shared: Whether lock is taken in shared mode if the wallet is sharded
+        :returns: Whether shared lock was taken
+        :raises LockNotAcquired: If all of the attempts were timed out
+        """
+
+        lock_fn = sa.func.pg_advisory_lock
+        shared_lock_query = (
+            sa.select([sa.func.pg_advisory_lock_shared(lock_id, record_id)])
+            .where(wallets.c.id == record_id)
+            .where(wallets.c.balance_shards > 0)
+        )
+        set_config_fn = sa.func.set_config
+
+        await connection.execute(
+            query=sa.select([set_config_fn("lock_timeout", f"{self._lock_timeout}ms", False)])
+        )
+        try:
+            for attempt in range(self._lock_retries + 1):
+                try:
+                    if shared and await connection.fetch_one(query=shared_lock_query):
+                        return True
+                    await connection.execute(query=sa.select([lock_fn(lock_id, record_id)]))
+                    return False
+                except LockNotAvailableError:
+                    logger.info(
+                        "Postgres advisory lock (%s, %s) is busy, attempt %s",
+                        lock_id,
+                        record_id,
+                        attempt + 1,
+                    )
+        finally:
+            await connection.execute(query="reset lock_timeout")
+
+        raise LockNotAcquired(f"Lock ({lock_id}, {record_id}) was not obtained in time")
+
+
+class AsyncpgTransactionManager(BaseTransactionManager):
+    """Implementation of TransactionManager interface on top of raw asyncpg pool."""
+
+    def __init__(self, db: AsyncpgDatabase, **kwargs):
+        """
+        Overwrites default constructor.
+
+        :param db: Instance of AsyncpgDatabase class
+        :param kwargs: Locking and retrying options of BaseTransactionManager
+        """
+
+        super().__init__(**kwargs)
+        self._db = db
+
+    @asynccontextmanager
+    async def _locked_transaction(
+        self,
+        isolation_level: IsolationLevels,
+        keys: List[Tuple[int, int]],
+        shared_keys: Collection[Tuple[int, int]] = (),
+    ) -> AsyncGenerator:
+        """
+        Obtain advisory locks by given keys (in given order) and start transaction.
+
+        :param isolation_level: One of the isolation_levels
+        :param keys: Pairs of lock id and record id
+        :param shared_keys: Keys of wallets locked in shared mode if the wallet is sharded
+        """
+
+        async with self._db.connection() as connection:
+            locked_keys = []
+            try:
+                for lock_id, record_id in keys:
+                    shared = await self._obtain_lock(
+                        connection, lock_id, record_id, (lock_id, record_id) in shared_keys
+                    )
+                    locked_keys.append((lock_id, record_id, shared))
+
+                isolation = _isolation_for_locks(isolation_level, locked_keys)
+                async with connection.transaction(isolation=isolation.value) as trx:
+                    yield trx
+            finally:
+                for lock_id, record_id, shared in reversed(locked_keys):
+                    unlock_fn = "pg_advisory_unlock_shared" if shared else "pg_advisory_unlock"
+                    is_released = await connection.fetchval(
+                        f"select {unlock_fn}($1, $2)", lock_id, record_id
+                    )
+                    if not is_released:
+                        logger.warning(
+                            "Postgres advisory lock (%s, %s) was not released",
+                            lock_id,
+                            record_id,
+                        )
+
+    async def _obtain_lock(
+        self, connection: asyncpg.Connection, lock_id: int, record_id: int, shared: bool = False
+    ) -> bool:
+        """
+        Wait for advisory lock with 'lock_timeout' for each of the attempts.
+
+        :param connection: Raw asyncpg connection
+        :param lock_id: ID of lock
+        :param record_id: ID of record
+        :param shared: Whether lock is taken in shared mode if the wallet is sharded
+        :returns: Whether shared lock was taken
+        :raises LockNotAcquired: If all of the attempts were timed out
+        """
+
+        await connection.execute(
+            "select set_config('lock_timeout', $1, false)", f"{self._lock_timeout}ms"
+        )
+        try:
+            for attempt in range(self._lock_retries + 1):
+                try:
+                    if shared and await connection.fetchrow(
+                        SHARED_WALLET_LOCK_QUERY, lock_id, record_id
+                    ):
+                        return True
+                    await connection.execute("select pg_advisory_lock($1, $2)", lock_id, record_id)
+                    return False
+                except LockNotAvailableError:
+                    logger.info(
+                        "Postgres advisory lock (%s, %s) is busy, attempt %s",
+                        lock_id,
+                        record_id,
+                        attempt + 1,
+                    )
+        finally:
+            await connection.execute("reset lock_timeout")
 
-            is_released = await connection.execute(query=sa.select([unlock_fn(lock_id.value, 1)]))
-            if not is_released:
-                logger.warning("Postgres advisory lock %s was not released", lock_id.value)
+        raise LockNotAcquired(f"Lock ({lock_id}, {record_id}) was not obtained in time")
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional
+
+import asyncpg
+
+from app import settings
+from app.adapters.sinks import build_sink
+from app.adapters.sql.db import connect_db, disconnect_db, get_db
+from app.adapters.sql.importer import BalanceImporter, ImportFormats
+from app.adapters.sql.partitions import PartitionManager, create_partitions
+from app.adapters.sql.reconciliation import LedgerReconciler, ReconciliationStats
+from app.adapters.sql.tx import SQLTransactionManager
+from app.repositories.idempotency import IdempotencyKeyRepository
+from app.repositories.outbox import OutboxRepository
+from app.repositories.users import UserRepository
+from app.repositories.wallet import WalletRepository
+from app.repositories.wallet_operations import WalletOperationRepository
+from app.usecases.outbox import OutboxRelay
+from app.usecases.wallet import WalletUsecase
+
+logger = logging.getLogger(__name__)
+
+
+async def import_balances(path: str, file_format: ImportFormats, import_id: str, chunk_size: int):
+    """Import users, wallets and opening balances from file."""
+
+    connection = await asyncpg.connect(settings.BILLING_DB_DSN)
+    try:
+        importer = BalanceImporter(connection=connection, chunk_size=chunk_size)
+        await importer.run(path=path, file_format=file_format, import_id=import_id)
+    finally:
+        await connection.close()
+
+
+async def archive_partitions(before: date):
+    """Detach and archive partitions of wallet operations older than given month."""
+
+    await connect_db()
+    try:
+        await PartitionManager(db=get_db()).archive_partitions(before=before)
+    finally:
+        await disconnect_db()
+
+
+async def prune_idempotency_keys(older_than: timedelta, batch_size: int) -> int:
+    """Delete expired idempotency keys in batches, each batch in its own transaction."""
+
+    await connect_db()
+    try:
+        repo = IdempotencyKeyRepository(db=get_db())
+        before = datetime.now(timezone.utc) - older_than
+        total = 0
+        while True:
+            deleted = await repo.delete_expired(before=before, limit=batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+        logger.info("Deleted %s idempotency keys created before %s", total, before)
+        return total
+    finally:
+        await disconnect_db()
+
+
+async def set_balance_shards(wallet_id: int, shards: int):
+    """Split balance of hot wallet into shards (0 turns sharding off)."""
+
+    await connect_db()
+    try:
+        db = get_db()
+        wallet_usecase = WalletUsecase(
+            tx_manager=SQLTransactionManager(db=db),
+            user_repo=UserRepository(db=db),
+            wallet_repo=WalletRepository(db=db),
+            wallet_operation_repo=WalletOperationRepository(db=db),
+        )
+        wallet = await wallet_usecase.set_balance_shards(wallet_id=wallet_id, shards=shards)
+        logger.info(
+            "Wallet %s has %s balance shards, balance %s", wallet.id, shards, wallet.balance
+        )
+    finally:
+        await disconnect_db()
+
+
+async def relay_outbox(sink: str, batch_size: int, poll_interval: float):
+    """Deliver events of the outbox to the sink until interrupted."""
+
+    await connect_db()
+    try:
+        db = get_db()
+        relay = OutboxRelay(
+            tx_manager=SQLTransactionManager(db=db),
+            outbox_repo=OutboxRepository(db=db),
+            sink=build_sink(sink),
+            batch_size=batch_size,
+            poll_interval=poll_interval,
+        )
+        await relay.run()
+    finally:
+        await disconnect_db()
+
+
+async def take_balance_snapshots(
+    taken_at: datetime, chunk_size: int, settle_interval: timedelta
+) -> int:
+    """Snapshot balances of all wallets in chunks, each chunk in its own transaction."""
+
+    # Operations created shortly before the moment might still be uncommitted
+    # (ids and creation times are taken before the commit), like in reconciliation
+    if taken_at > datetime.now(timezone.utc) - settle_interval:
+        raise ValueError(f"Snapshot can be taken only at least {settle_interval} ago")
+
+    await connect_db()
+    try:
+        repo = WalletRepository(db=get_db())
+        after_wallet_id, total = 0, 0
+        while True:
+            last_wallet_id, snapshots = await repo.take_balance_snapshots(
+                taken_at=taken_at, after_wallet_id=after_wallet_id, limit=chunk_size
+            )
+            if last_wallet_id is None:
+                break
+            after_wallet_id = last_wallet_id
+            total += snapshots
+        logger.info("Took %s balance snapshots at %s", total, taken_at)
+        return total
+    finally:
+        await disconnect_db()
+
+
+async def reconcile_ledger(
+    report: Optional[str], chunk_size: int, settle_interval: timedelta
+) -> ReconciliationStats:
+    """Add new wallet operations to the ledger totals and report mismatched balances."""
+
+    pool = await asyncpg.create_pool(settings.BILLING_DB_DSN, min_size=2, max_size=2)
+    try:
+        reconciler = LedgerReconciler(
+            pool=pool, chunk_size=chunk_size, settle_interval=settle_interval
+        )
+        if report:
+            with open(report, "w", newline="", encoding="utf-8") as report_file:
+                stats = await reconciler.run(report=report_file)
+        else:
+            stats = await reconciler.run(report=sys.stdout)
+        return stats
+    finally:
+        await pool.close()
+
+
+def _moment(value: str) -> datetime:
+    """Parse moment in ISO 8601 format (UTC if offset is omitted)."""
+
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def _month(value: str) -> date:
+    """Parse month in YYYY-MM format."""
+
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build parser of command line arguments."""
+
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser(
+        "import", help="Import users, wallets and opening balances from CSV/NDJSON file"
+    )
+    import_parser.add_argument("path", help="Path to the file with 'email,balance[,currency]'")
+    import_parser.add_argument(
+        "--format",
+        dest="file_format",
+        choices=[file_format.value for file_format in ImportFormats],
+        default=None,
+        help="Format of the file (detected by extension by default)",
+    )
+    import_parser.add_argument(
+        "--import-id", default=None, help="ID for resuming of the import (file name by default)"
+    )
+    import_parser.add_argument(
+        "--chunk-size", type=int, default=10000, help="Number of rows per transaction"
+    )
+
+    partitions_parser = commands.add_parser(
+        "partitions", help="Maintain monthly partitions of wallet operations"
+    )
+    partitions_commands = partitions_parser.add_subparsers(dest="partitions_command", required=True)
+    create_parser = partitions_commands.add_parser(
+        "create", help="Create partitions for the current and the next months"
+    )
+    create_parser.add_argument(
+        "--months-ahead", type=int, default=settings.WALLET_OPERATIONS_PARTITIONS_AHEAD
+    )
+    archive_parser = partitions_commands.add_parser(
+        "archive", help="Detach partitions older than given month and move them to archive schema"
+    )
+    archive_parser.add_argument(
+        "--before", type=_month, required=True, help="First month to keep (YYYY-MM)"
+    )
+
+    idempotency_parser = commands.add_parser("idempotency", help="Maintain idempotency keys")
+    idempotency_commands = idempotency_parser.add_subparsers(
+        dest="idempotency_command", required=True
+    )
+    prune_parser = idempotency_commands.add_parser(
+        "prune", help="Delete idempotency keys older than given number of hours"
+    )
+    prune_parser.add_argument(
+        "--older-than-hours", type=float, default=settings.IDEMPOTENCY_KEY_TTL_HOURS
+    )
+    prune_parser.add_argument(
+        "--batch-size", type=int, default=settings.IDEMPOTENCY_PRUNE_BATCH_SIZE
+    )
+
+    wallets_parser = commands.add_parser("wallets", help="Maintain wallets")
+    wallets_commands = wallets_parser.add_subparsers(dest="wallets_command", required=True)
+    shard_parser = wallets_commands.add_parser(
+        "shard", help="Split balance of hot wallet into shards, so its credits do not contend"
+    )
+    shard_parser.add_argument("wallet_id", type=int)
+    shard_parser.add_argument(
+        "--shards", type=int, required=True, help="Number of shards, 0 turns sharding off"
+    )
+
+    outbox_parser = commands.add_parser("outbox", help="Deliver events to downstream systems")
+    outbox_commands = outbox_parser.add_subparsers(dest="outbox_command", required=True)
+    relay_parser = outbox_commands.add_parser(
+        "relay", help="Run relay worker, several workers can run at once"
+    )
+    relay_parser.add_argument(
+        "--sink", default="stdout", help="'stdout', 'file:<path>' or URL of HTTP endpoint"
+    )
+    relay_parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_RELAY_BATCH_SIZE)
+    relay_parser.add_argument(
+        "--poll-interval", type=float, default=settings.OUTBOX_RELAY_POLL_INTERVAL
+    )
+
+    snapshots_parser = commands.add_parser("snapshots", help="Maintain snapshots of balances")
+    snapshots_commands = snapshots_parser.add_subparsers(dest="snapshots_command", required=True)
+    take_parser = snapshots_commands.add_parser(
+        "take", help="Snapshot balances of wallets changed since their previous snapshots"
+    )
+    take_parser.add_argument(
+        "--at",
+        type=_moment,
+        default=None,
+        help="Moment of the snapshot in ISO 8601 format "
+        "(by default the last midnight UTC older than the settle interval)",
+    )
+    take_parser.add_argument(
+        "--chunk-size", type=int, default=settings.BALANCE_SNAPSHOTS_CHUNK_SIZE
+    )
+    take_parser.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=settings.BALANCE_SNAPSHOTS_SETTLE_SECONDS,
+        help="Minimal age of the snapshot",
+    )
+
+    reconcile_parser = commands.add_parser(
+        "reconcile", help="Check balances of wallets against the sums of their operations"
+    )
+    reconcile_parser.add_argument(
+        "--report", default=None, help="Path to CSV report of mismatches (stdout by default)"
+    )
+    reconcile_parser.add_argument(
+        "--chunk-size", type=int, default=settings.RECONCILIATION_CHUNK_SIZE
+    )
+    reconcile_parser.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=settings.RECONCILIATION_SETTLE_SECONDS,
+        help="Minimal age of reconciled operations",
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point of command line interface."""
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        file_format = args.file_format or (
+            ImportFormats.NDJSON.value
+            if args.path.endswith((".ndjson", ".jsonl"))
+            else ImportFormats.CSV.value
+        )
+        asyncio.run(
+            import_balances(
+                path=args.path,
+                file_format=ImportFormats(file_format),
+                import_id=args.import_id or os.path.basename(args.path),
+                chunk_size=args.chunk_size,
+            )
+        )
+    elif args.command == "partitions" and args.partitions_command == "create":
+        asyncio.run(create_partitions(months_ahead=args.months_ahead))
+    elif args.command == "partitions" and args.partitions_command == "archive":
+        asyncio.run(archive_partitions(before=args.before))
+    elif args.command == "idempotency" and args.idempotency_command == "prune":
+        asyncio.run(
+            prune_idempotency_keys(
+                older_than=timedelta(hours=args.older_than_hours), batch_size=args.batch_size
+            )
+        )
+    elif args.command == "wallets" and args.wallets_command == "shard":
+        asyncio.run(set_balance_shards(wallet_id=args.wallet_id, shards=args.shards))
+    elif args.command == "outbox" and args.outbox_command == "relay":
+        asyncio.run(
+            relay_outbox(
+                sink=args.sink, batch_size=args.batch_size, poll_interval=args.poll_interval
+            )
+        )
+    elif args.command == "snapshots" and args.snapshots_command == "take":
+        settle_interval = timedelta(seconds=args.settle_seconds)
+        settled_at = datetime.now(timezone.utc) - settle_interval
+        taken_at = args.at or datetime.combine(settled_at.date(), time(), tzinfo=timezone.utc)
+        if taken_at > settled_at:
+            parser.error(f"snapshot can be taken only at least {settle_interval} ago")
+        asyncio.run(
+            take_balance_snapshots(
+                taken_at=taken_at, chunk_size=args.chunk_size, settle_interval=settle_interval
+            )
+        )
+    elif args.command == "reconcile":
+        stats = asyncio.run(
+            reconcile_ledger(
+                report=args.report,
+                chunk_size=args.chunk_size,
+                settle_interval=timedelta(seconds=args.settle_seconds),
+            )
+        )
+        if stats.mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class IdempotencyKeyReused(Exception):
+    """Exception for idempotency key sent with different request"""
+
+
+class IdempotencyRecord(BaseModel):
+    """Representation of stored response of the request with idempotency key."""
+
+    key: str
+    request_hash: str
+    response: Optional[str]
@@ -0,0 +1,75 @@
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict
+
+from pydantic import BaseModel
+
+from .user import User
+from .wallet_operation import CreateWalletOperation, Operations
+
+
+class OutboxEventTypes(Enum):
+    """Types of events delivered to downstream systems."""
+
+    USER_CREATED = "USER_CREATED"
+    DEPOSIT = "DEPOSIT"
+    WITHDRAWAL = "WITHDRAWAL"
+
+
+class CreateOutboxEvent(BaseModel):
+    """Event written to outbox within the transaction of the write."""
+
+    event_type: OutboxEventTypes
+    payload: Dict[str, Any]
+
+    @classmethod
+    def from_operation(cls, operation: CreateWalletOperation) -> "CreateOutboxEvent":
+        """
+        Build event of deposit or withdrawal.
+
+        Deposit of transfer is stored with swapped wallets ('wallet_from' is the
+        credited one), so direction is given explicitly by 'credited_wallet_id'
+        and 'debited_wallet_id' (None for enrollment). Amount is kept as string,
+        so it is not rounded by JSON consumers.
+
+        :param operation: Wallet operation
+        :returns: Outbox event
+        """
+
+        if operation.operation == Operations.WITHDRAWAL:
+            credited, debited = operation.wallet_to, operation.wallet_from
+        elif operation.wallet_from is not None:
+            credited, debited = operation.wallet_from, operation.wallet_to
+        else:
+            credited, debited = operation.wallet_to, None
+        return cls(
+            event_type=OutboxEventTypes(operation.operation.value),
+            payload={
+                "wallet_from": operation.wallet_from,
+                "wallet_to": operation.wallet_to,
+                "credited_wallet_id": credited,
+                "debited_wallet_id": debited,
+                "amount": str(operation.amount),
+            },
+        )
+
+    @classmethod
+    def from_user(cls, user: User) -> "CreateOutboxEvent":
+        """
+        Build event of user creation.
+
+        :param user: Created user
+        :returns: Outbox event
+        """
+
+        return cls(
+            event_type=OutboxEventTypes.USER_CREATED,
+            payload={"user_id": user.id, "email": user.email, "wallet_id": user.wallet_id},
+        )
+
+
+class OutboxEvent(CreateOutboxEvent):
+    """Event claimed by relay for delivery."""
+
+    id: int
+    created_at: datetime
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, EmailStr, condecimal
+from typing import List, Optional
+
+from pydantic import BaseModel, EmailStr, condecimal, conlist
 
 from .currency import CurrencyEnum
 
+MAX_BULK_USERS = 1000
+
 
 class UserDoesNotExist(Exception):
     """Exception for user does not exist error"""
@@ -26,3 +30,23 @@ class User(BaseUser):
     wallet_id: int
     balance: condecimal(ge=0)  # type: ignore
     currency: CurrencyEnum
+
+
+class CreateUsers(BaseModel):
+    """Parameters description for bulk user creation."""
+
+    users: conlist(CreateUser, min_items=1, max_items=MAX_BULK_USERS)  # type: ignore
+
+
+class CreateUserResult(BaseModel):
+    """Result of the single user creation from the bulk."""
+
+    email: EmailStr
+    user: Optional[User] = None
+    error: Optional[str] = None
+
+
+class CreateUsersResult(BaseModel):
+    """Representation of bulk user creation results."""
+
+    results: List[CreateUserResult]
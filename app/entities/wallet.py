@@ -1,7 +1,15 @@
-from pydantic import BaseModel, condecimal, root_validator
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, condecimal, conlist, root_validator
 
 from .currency import CurrencyEnum
 
+MAX_BATCH_TRANSFERS = 1000
+MAX_BALANCE_SHARDS = 64
+
 
 class WalletDoesNotExist(Exception):
     """Exception for wallet does not exist error"""
@@ -13,6 +21,13 @@ class WalletEnrollParams(BaseModel):
     amount: condecimal(gt=0)  # type: ignore
 
 
+class WalletDeposit(BaseModel):
+    """Enrollment of user's wallet waiting to be applied within a batch."""
+
+    user_id: int
+    amount: Decimal
+
+
 class WalletTransferParams(BaseModel):
     """JSON schema for wallet transfer parameters."""
 
@@ -32,6 +47,39 @@ class WalletTransferParams(BaseModel):
         return values
 
 
+class TransferBatchModes(Enum):
+    """Possible modes of batch transfer."""
+
+    ATOMIC = "atomic"
+    BEST_EFFORT = "best_effort"
+
+
+class WalletBatchTransferParams(BaseModel):
+    """JSON schema for batch wallet transfer parameters."""
+
+    mode: TransferBatchModes = TransferBatchModes.ATOMIC
+    transfers: conlist(  # type: ignore
+        WalletTransferParams, min_items=1, max_items=MAX_BATCH_TRANSFERS
+    )
+
+
+class WalletTransferResult(BaseModel):
+    """Result of the single transfer from the batch."""
+
+    wallet_from: int
+    wallet_to: int
+    amount: condecimal(ge=0)  # type: ignore
+    success: bool
+    error: Optional[str] = None
+
+
+class WalletBatchTransferResult(BaseModel):
+    """Representation of batch transfer results."""
+
+    mode: TransferBatchModes
+    results: List[WalletTransferResult]
+
+
 class WalletEntity(BaseModel):
     """Representation of wallet entity."""
 
@@ -39,3 +87,11 @@ class WalletEntity(BaseModel):
     user_id: int
     balance: condecimal(ge=0)  # type: ignore
     currency: CurrencyEnum
+
+
+class WalletBalance(BaseModel):
+    """Representation of wallet balance at given moment."""
+
+    wallet_id: int
+    balance: Decimal
+    at: datetime
@@ -1,7 +1,12 @@
+from datetime import datetime
 from enum import Enum
+from typing import List, Optional
 
 from pydantic import BaseModel, condecimal
 
+MAX_OPERATIONS_PAGE_SIZE = 500
+OPERATIONS_EXPORT_CHUNK_SIZE = 1000
+
 
 class Operations(Enum):
     """Possible operations for wallet operation"""
@@ -16,6 +21,23 @@ class WalletOperationEntity(BaseModel):
 
     id: int
     operation: Operations
-    wallet_from: int
-    wallet_to: int
+    wallet_from: Optional[int]
+    wallet_to: Optional[int]
     amount: condecimal(ge=0)  # type: ignore
+    created_at: datetime
+
+
+class CreateWalletOperation(BaseModel):
+    """Parameters description for wallet operation creation."""
+
+    operation: Operations
+    wallet_from: Optional[int]
+    wallet_to: Optional[int]
+    amount: condecimal(ge=0)  # type: ignore
+
+
+class WalletOperationsPage(BaseModel):
+    """Page of wallet operations (newest first)."""
+
+    items: List[WalletOperationEntity]
+    next_cursor: Optional[int] = None
@@ -1,17 +1,32 @@
-from typing import Callable
+from typing import Callable, Optional
 
 import uvicorn
+from databases import Database
 from fastapi import APIRouter, FastAPI
 
 from app import settings
+from app.adapters.cache import BalanceCache, LRUCache
 from app.adapters.sql.db import connect_db, disconnect_db, get_db
-from app.adapters.sql.tx import SQLTransactionManager
-from app.repositories.users import UserRepository
-from app.repositories.wallet import WalletRepository
-from app.repositories.wallet_operations import WalletOperationRepository
+from app.adapters.sql.notifications import WalletChangesListener
+from app.adapters.sql.partitions import PartitionManager, create_partitions
+from app.adapters.sql.pool import AsyncpgDatabase, get_pool_db
+from app.adapters.sql.replica import ReplicaMonitor
+from app.adapters.sql.tx import (
+    AbstractTransactionManager,
+    AsyncpgTransactionManager,
+    SQLTransactionManager,
+)
+from app.repositories.idempotency import AsyncpgIdempotencyKeyRepository, IdempotencyKeyRepository
+from app.repositories.outbox import AsyncpgOutboxRepository, OutboxRepository
+from app.repositories.users import AsyncpgUserRepository, UserRepository
+from app.repositories.wallet import AsyncpgWalletRepository, WalletRepository
+from app.repositories.wallet_operations import (
+    AsyncpgWalletOperationRepository,
+    WalletOperationRepository,
+)
 from app.transport.http import api_router
 from app.usecases.user import AbstractUserUsecase, UserUsecase
-from app.usecases.wallet import AbstractWalletUsecase, WalletUsecase
+from app.usecases.wallet import AbstractWalletUsecase, WalletUsecase, WriteStrategy
 
 
 def init_app(
@@ -20,45 +35,124 @@ def init_app(
     router: APIRouter,
     user_usecase: AbstractUserUsecase,
     wallet_usecase: AbstractWalletUsecase,
+    tx_manager: AbstractTransactionManager,
+    balance_cache: Optional[BalanceCache] = None,
+    cache_listener: Optional[WalletChangesListener] = None,
+    replica: Optional[ReplicaMonitor] = None,
 ) -> FastAPI:
     """Initialize application parameters."""
 
     app = FastAPI(title="Billing system sample")
     app.add_event_handler("startup", connect_db)
     app.add_event_handler("shutdown", disconnect_db)
+    if cache_listener is not None:
+        app.add_event_handler("startup", cache_listener.start)
+        app.add_event_handler("shutdown", cache_listener.stop)
+    if replica is not None:
+        app.add_event_handler("startup", replica.connect)
+        app.add_event_handler("shutdown", replica.disconnect)
     app.include_router(router)
     app.state.user_usecase = user_usecase
     app.state.wallet_usecase = wallet_usecase
+    app.state.tx_manager = tx_manager
+    app.state.balance_cache = balance_cache
     return app
 
 
 def run_app():
     """Run application instance"""
 
-    _db = get_db()
-    tx_manager = SQLTransactionManager(db=_db)
-    user_repo = UserRepository(db=_db)
-    wallet_repo = WalletRepository(db=_db)
-    wallet_operation_repo = WalletOperationRepository(db=_db)
+    # Replica (if configured) serves reads of single users and wallets
+    replica_dsn = settings.BILLING_REPLICA_DB_DSN
+    replica_options = dict(
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        command_timeout=settings.DB_COMMAND_TIMEOUT,
+        server_settings={"default_transaction_read_only": "on"},
+    )
+    replica, replica_user_repo, replica_wallet_repo = None, None, None
+    if settings.DB_DRIVER == "asyncpg":
+        # Repositories work on raw asyncpg pool, partitions are maintained
+        # on startup over a separate single connection
+        pool_db = get_pool_db()
+        tx_manager = AsyncpgTransactionManager(db=pool_db)
+        user_repo = AsyncpgUserRepository(db=pool_db)
+        wallet_repo = AsyncpgWalletRepository(db=pool_db)
+        wallet_operation_repo = AsyncpgWalletOperationRepository(db=pool_db)
+        idempotency_repo = AsyncpgIdempotencyKeyRepository(db=pool_db)
+        outbox_repo = AsyncpgOutboxRepository(db=pool_db)
+        connect, disconnect = pool_db.connect, pool_db.disconnect
+        maintain_partitions = create_partitions
+        if replica_dsn:
+            replica_pool_db = AsyncpgDatabase(replica_dsn, **replica_options)
+            replica = ReplicaMonitor(db=replica_pool_db)
+            replica_user_repo = AsyncpgUserRepository(db=replica_pool_db)
+            replica_wallet_repo = AsyncpgWalletRepository(db=replica_pool_db)
+    else:
+        _db = get_db()
+        tx_manager = SQLTransactionManager(db=_db)
+        user_repo = UserRepository(db=_db)
+        wallet_repo = WalletRepository(db=_db)
+        wallet_operation_repo = WalletOperationRepository(db=_db)
+        idempotency_repo = IdempotencyKeyRepository(db=_db)
+        outbox_repo = OutboxRepository(db=_db)
+        connect, disconnect = connect_db, disconnect_db
+        maintain_partitions = PartitionManager(db=_db).create_future_partitions
+        if replica_dsn:
+            replica_db = Database(replica_dsn, **replica_options)
+            replica = ReplicaMonitor(db=replica_db)
+            replica_user_repo = UserRepository(db=replica_db)
+            replica_wallet_repo = WalletRepository(db=replica_db)
+
+    balance_cache, cache_listener = None, None
+    if settings.BALANCE_CACHE_ENABLED:
+        balance_cache = BalanceCache()
+        # Other workers evict wallets changed by this one through notifications
+        cache_listener = WalletChangesListener(dsn=settings.BILLING_DB_DSN, cache=balance_cache)
     user_usecase = UserUsecase(
         tx_manager=tx_manager,
         user_repo=user_repo,
         wallet_repo=wallet_repo,
         wallet_operation_repo=wallet_operation_repo,
+        cache=balance_cache,
+        replica=replica,
+        replica_user_repo=replica_user_repo,
+        outbox_repo=outbox_repo,
     )
     wallet_usecase = WalletUsecase(
         tx_manager=tx_manager,
         user_repo=user_repo,
         wallet_repo=wallet_repo,
         wallet_operation_repo=wallet_operation_repo,
+        write_strategy=WriteStrategy(settings.WALLET_WRITE_STRATEGY),
+        cache=balance_cache,
+        replica=replica,
+        replica_wallet_repo=replica_wallet_repo,
+        idempotency_repo=idempotency_repo,
+        outbox_repo=outbox_repo,
+        enroll_batch_delay=settings.ENROLL_BATCH_MAX_DELAY_MS,
+        enroll_batch_size=settings.ENROLL_BATCH_MAX_SIZE,
+        # Replays of recent requests are answered without the database
+        idempotency_cache=LRUCache(
+            ttl=settings.IDEMPOTENCY_CACHE_TTL,
+            max_entries=settings.IDEMPOTENCY_CACHE_MAX_ENTRIES,
+            max_bytes=settings.IDEMPOTENCY_CACHE_MAX_BYTES,
+        ),
     )
     app = init_app(
-        connect_db=connect_db,
-        disconnect_db=disconnect_db,
+        connect_db=connect,
+        disconnect_db=disconnect,
         router=api_router,
         user_usecase=user_usecase,
         wallet_usecase=wallet_usecase,
+        tx_manager=tx_manager,
+        balance_cache=balance_cache,
+        cache_listener=cache_listener,
+        replica=replica,
     )
+    app.add_event_handler("startup", maintain_partitions)
     return app
 
 
@@ -0,0 +1,42 @@
+"""create ledger totals and reconciliation progress
+
+Revision ID: 0d6b3e9f2a75
+Revises: 5c9e2a7f4d31
+Create Date: 2026-10-18 20:31:17.508126
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0d6b3e9f2a75"
+down_revision = "5c9e2a7f4d31"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ledger_totals",
+        sa.Column(
+            "wallet_id",
+            sa.Integer,
+            sa.ForeignKey("wallets.id", ondelete="cascade"),
+            primary_key=True,
+            nullable=False,
+        ),
+        sa.Column("total", sa.Numeric, nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "reconciliation_progress",
+        sa.Column("id", sa.Boolean, primary_key=True, nullable=False, server_default=sa.true()),
+        sa.Column("last_operation_id", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("processed", sa.BigInteger, nullable=False, server_default="0"),
+        sa.CheckConstraint("id", name="reconciliation_progress_single_row"),
+    )
+    op.execute("insert into reconciliation_progress default values")
+
+
+def downgrade():
+    op.drop_table("reconciliation_progress")
+    op.drop_table("ledger_totals")
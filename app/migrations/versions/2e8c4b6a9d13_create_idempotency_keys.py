@@ -0,0 +1,36 @@
+"""create idempotency keys
+
+Revision ID: 2e8c4b6a9d13
+Revises: 6f3a1d8b2c57
+Create Date: 2026-10-18 16:02:17.540931
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2e8c4b6a9d13"
+down_revision = "6f3a1d8b2c57"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("key", sa.String, primary_key=True, nullable=False),
+        sa.Column("request_hash", sa.String, nullable=False),
+        sa.Column("response", sa.Text, nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+    op.create_index("idempotency_keys_created_at_idx", "idempotency_keys", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("idempotency_keys_created_at_idx", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
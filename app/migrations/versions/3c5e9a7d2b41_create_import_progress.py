@@ -0,0 +1,29 @@
+"""create import progress
+
+Revision ID: 3c5e9a7d2b41
+Revises: 1af7d2c06855
+Create Date: 2026-10-18 10:12:31.184512
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3c5e9a7d2b41"
+down_revision = "1af7d2c06855"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "import_progress",
+        sa.Column("import_id", sa.String, primary_key=True, nullable=False),
+        sa.Column("last_line", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("imported", sa.BigInteger, nullable=False, server_default="0"),
+        sa.Column("skipped", sa.BigInteger, nullable=False, server_default="0"),
+    )
+
+
+def downgrade():
+    op.drop_table("import_progress")
@@ -0,0 +1,186 @@
+"""split balances of hot wallets into shards
+
+Revision ID: 4a7d9c2e1b86
+Revises: 2e8c4b6a9d13
+Create Date: 2026-10-18 17:11:52.203617
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4a7d9c2e1b86"
+down_revision = "2e8c4b6a9d13"
+branch_labels = None
+depends_on = None
+
+# Balance of the wallet is 'wallets.balance' plus the sum of its shards.
+# Writes of the sharded wallet do not touch its 'wallets' row: credits go
+# to a random shard, debits take a single shard with enough funds if there
+# is one, otherwise funds are collected from several shards.
+# Key share lock of the wallet row does not block concurrent writes of the wallet,
+# but waits for 'set_wallet_balance_shards' (and blocks it), so funds are never
+# written to shards which are being replaced. Share lock would deadlock
+# concurrent writes of not sharded wallet upgrading it to update.
+# Returns new balance of the wallet or null if the wallet does not exist.
+CREATE_CHANGE_FUNCTION = """
+create function change_wallet_balance(p_wallet_id integer, p_delta numeric)
+returns numeric as $$
+declare
+    v_shards smallint;
+    v_shard smallint;
+    v_balance numeric;
+    v_remaining numeric;
+    v_taken numeric;
+begin
+    select balance_shards into v_shards from wallets where id = p_wallet_id for key share;
+    if not found then
+        return null;
+    end if;
+
+    if v_shards = 0 then
+        update wallets set balance = balance + p_delta where id = p_wallet_id
+        returning balance into v_balance;
+        return v_balance;
+    end if;
+
+    if p_delta >= 0 then
+        -- Shard is chosen once, random() in the condition would be evaluated for each row
+        v_shard := floor(random() * v_shards);
+        update wallet_balance_shards set balance = balance + p_delta
+        where wallet_id = p_wallet_id and shard = v_shard;
+    else
+        v_remaining := -p_delta;
+        select shard into v_shard from wallet_balance_shards
+        where wallet_id = p_wallet_id and balance >= v_remaining
+        order by random()
+        limit 1
+        for update skip locked;
+
+        if found then
+            update wallet_balance_shards set balance = balance - v_remaining
+            where wallet_id = p_wallet_id and shard = v_shard;
+        else
+            -- Shards are locked in the same order by all debits
+            for v_shard, v_balance in
+                select shard, balance from wallet_balance_shards
+                where wallet_id = p_wallet_id and balance > 0
+                order by shard
+                for update
+            loop
+                v_taken := least(v_balance, v_remaining);
+                update wallet_balance_shards set balance = balance - v_taken
+                where wallet_id = p_wallet_id and shard = v_shard;
+                v_remaining := v_remaining - v_taken;
+                exit when v_remaining = 0;
+            end loop;
+
+            if v_remaining > 0 then
+                raise exception 'Insufficient funds on sharded wallet %', p_wallet_id
+                    using errcode = 'check_violation',
+                          table = 'wallet_balance_shards',
+                          constraint = 'wallet_shard_positive_balance';
+            end if;
+        end if;
+    end if;
+
+    select balance + coalesce(
+        (select sum(balance) from wallet_balance_shards where wallet_id = p_wallet_id), 0
+    ) into v_balance
+    from wallets where id = p_wallet_id;
+    return v_balance;
+end
+$$ language plpgsql
+"""
+
+# Collects balance of the wallet and puts it into the first of the new shards
+# (or back into 'wallets.balance' if sharding is disabled with 0 shards).
+# The wallet row is locked before its balance is read, so it includes credits
+# committed while waiting for the lock.
+CREATE_SET_SHARDS_FUNCTION = """
+create function set_wallet_balance_shards(p_wallet_id integer, p_shards integer)
+returns numeric as $$
+declare
+    v_balance numeric;
+begin
+    perform from wallets where id = p_wallet_id for update;
+    if not found then
+        return null;
+    end if;
+
+    select balance + coalesce(
+        (select sum(balance) from wallet_balance_shards where wallet_id = p_wallet_id), 0
+    ) into v_balance
+    from wallets where id = p_wallet_id;
+
+    delete from wallet_balance_shards where wallet_id = p_wallet_id;
+    if p_shards > 0 then
+        insert into wallet_balance_shards (wallet_id, shard, balance)
+        select p_wallet_id, shard, case when shard = 0 then v_balance else 0 end
+        from generate_series(0, p_shards - 1) shard;
+        update wallets set balance = 0, balance_shards = p_shards where id = p_wallet_id;
+    else
+        update wallets set balance = v_balance, balance_shards = 0 where id = p_wallet_id;
+    end if;
+    return v_balance;
+end
+$$ language plpgsql
+"""
+
+# Changes of shards are reported to the balance caches as changes of their wallets
+CREATE_NOTIFY_FUNCTION = """
+create function notify_wallet_shard_changes() returns trigger as $$
+declare
+    payload text;
+begin
+    select string_agg(distinct wallet_id::text, ',') into payload from changed_shards;
+    if payload is not null then
+        if length(payload) > 7900 then
+            payload := '';
+        end if;
+        perform pg_notify('wallet_changes', payload);
+    end if;
+    return null;
+end
+$$ language plpgsql
+"""
+
+
+def upgrade():
+    op.add_column(
+        "wallets",
+        sa.Column("balance_shards", sa.SmallInteger, nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "wallet_balance_shards",
+        sa.Column(
+            "wallet_id",
+            sa.Integer,
+            sa.ForeignKey("wallets.id", ondelete="cascade"),
+            primary_key=True,
+            nullable=False,
+        ),
+        sa.Column("shard", sa.SmallInteger, primary_key=True, nullable=False),
+        sa.Column("balance", sa.Numeric(10, 2, asdecimal=True), nullable=False, server_default="0"),
+        sa.CheckConstraint("balance >= 0", name="wallet_shard_positive_balance"),
+    )
+    op.execute(CREATE_CHANGE_FUNCTION)
+    op.execute(CREATE_SET_SHARDS_FUNCTION)
+    op.execute(CREATE_NOTIFY_FUNCTION)
+    op.execute(
+        """
+        create trigger wallet_balance_shards_notify_update
+        after update on wallet_balance_shards
+        referencing old table as changed_shards
+        for each statement execute function notify_wallet_shard_changes()
+        """
+    )
+
+
+def downgrade():
+    op.execute("drop trigger wallet_balance_shards_notify_update on wallet_balance_shards")
+    op.execute("drop function notify_wallet_shard_changes()")
+    op.execute("drop function set_wallet_balance_shards(integer, integer)")
+    op.execute("drop function change_wallet_balance(integer, numeric)")
+    op.drop_table("wallet_balance_shards")
+    op.drop_column("wallets", "balance_shards")
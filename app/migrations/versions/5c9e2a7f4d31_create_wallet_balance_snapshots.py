@@ -0,0 +1,34 @@
+"""create wallet balance snapshots
+
+Revision ID: 5c9e2a7f4d31
+Revises: 8b1f5d3e7a24
+Create Date: 2026-10-18 19:12:06.734519
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c9e2a7f4d31"
+down_revision = "8b1f5d3e7a24"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "wallet_balance_snapshots",
+        sa.Column(
+            "wallet_id",
+            sa.Integer,
+            sa.ForeignKey("wallets.id", ondelete="cascade"),
+            primary_key=True,
+            nullable=False,
+        ),
+        sa.Column("taken_at", sa.DateTime(timezone=True), primary_key=True, nullable=False),
+        sa.Column("balance", sa.Numeric(10, 2, asdecimal=True), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("wallet_balance_snapshots")
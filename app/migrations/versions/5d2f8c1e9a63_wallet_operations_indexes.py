@@ -0,0 +1,57 @@
+"""wallet operations indexes and created_at
+
+Revision ID: 5d2f8c1e9a63
+Revises: 3c5e9a7d2b41
+Create Date: 2026-10-18 11:03:52.716240
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d2f8c1e9a63"
+down_revision = "3c5e9a7d2b41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # now() is not volatile, so postgres (11+) adds column without table rewrite
+    op.add_column(
+        "wallet_operations",
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+    # Indexes are built without blocking writes, which is not allowed inside transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "wallet_operations_wallet_to_id_idx",
+            "wallet_operations",
+            ["wallet_to", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "wallet_operations_wallet_from_id_idx",
+            "wallet_operations",
+            ["wallet_from", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "wallet_operations_wallet_from_id_idx",
+            table_name="wallet_operations",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "wallet_operations_wallet_to_id_idx",
+            table_name="wallet_operations",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("wallet_operations", "created_at")
@@ -0,0 +1,54 @@
+"""notify about changed wallets
+
+Revision ID: 6f3a1d8b2c57
+Revises: 9e4b7a3c1f08
+Create Date: 2026-10-18 15:20:44.118203
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6f3a1d8b2c57"
+down_revision = "9e4b7a3c1f08"
+branch_labels = None
+depends_on = None
+
+# Notifications are delivered only after commit, one per changing statement.
+# Payload is a comma separated list of wallet ids, empty payload (too many wallets
+# to fit into the notification) asks listeners to flush the whole cache.
+CREATE_FUNCTION = """
+create function notify_wallet_changes() returns trigger as $$
+declare
+    payload text;
+begin
+    select string_agg(distinct id::text, ',') into payload from changed_wallets;
+    if payload is not null then
+        if length(payload) > 7900 then
+            payload := '';
+        end if;
+        perform pg_notify('wallet_changes', payload);
+    end if;
+    return null;
+end
+$$ language plpgsql
+"""
+
+
+def upgrade():
+    op.execute(CREATE_FUNCTION)
+    # Transition table can be declared only for a single event
+    for event in ("update", "delete"):
+        op.execute(
+            f"""
+            create trigger wallets_notify_{event}
+            after {event} on wallets
+            referencing old table as changed_wallets
+            for each statement execute function notify_wallet_changes()
+            """
+        )
+
+
+def downgrade():
+    for event in ("update", "delete"):
+        op.execute(f"drop trigger wallets_notify_{event} on wallets")
+    op.execute("drop function notify_wallet_changes()")
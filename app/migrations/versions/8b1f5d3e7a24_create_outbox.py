@@ -0,0 +1,35 @@
+"""create outbox of wallet events
+
+Revision ID: 8b1f5d3e7a24
+Revises: 4a7d9c2e1b86
+Create Date: 2026-10-18 18:05:41.318264
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "8b1f5d3e7a24"
+down_revision = "4a7d9c2e1b86"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.BigInteger, primary_key=True, autoincrement=True, nullable=False),
+        sa.Column("event_type", sa.String, nullable=False),
+        sa.Column("payload", postgresql.JSONB, nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.func.now(),
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("outbox")
@@ -0,0 +1,121 @@
+"""partition wallet operations by month
+
+Revision ID: 9e4b7a3c1f08
+Revises: 5d2f8c1e9a63
+Create Date: 2026-10-18 12:41:09.305117
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9e4b7a3c1f08"
+down_revision = "5d2f8c1e9a63"
+branch_labels = None
+depends_on = None
+
+# Monthly partitions are created for existing rows and for the next months,
+# later months are created by app.adapters.sql.partitions on application startup
+# (or by 'python -m app.cli partitions create').
+CREATE_PARTITIONS = """
+do $$
+declare
+    month timestamptz;
+begin
+    for month in
+        select generate_series(
+            date_trunc('month', coalesce(min(created_at), now()) at time zone 'UTC'),
+            date_trunc('month', now() at time zone 'UTC') + interval '3 months',
+            interval '1 month'
+        ) at time zone 'UTC'
+        from wallet_operations_legacy
+    loop
+        execute format(
+            'create table %I partition of wallet_operations for values from (%L) to (%L)',
+            'wallet_operations_p' || to_char(month at time zone 'UTC', 'YYYYMM'),
+            month,
+            month + interval '1 month'
+        );
+    end loop;
+end
+$$
+"""
+
+
+def upgrade():
+    op.execute("alter table wallet_operations rename to wallet_operations_legacy")
+    op.execute(
+        "alter table wallet_operations_legacy "
+        "rename constraint wallet_operations_pkey to wallet_operations_legacy_pkey"
+    )
+    op.execute("alter sequence wallet_operations_id_seq owned by none")
+    op.execute(
+        "alter index wallet_operations_wallet_to_id_idx rename to wallet_operations_legacy_to"
+    )
+    op.execute(
+        "alter index wallet_operations_wallet_from_id_idx rename to wallet_operations_legacy_from"
+    )
+    # Primary key of partitioned table has to include partitioning column
+    op.execute(
+        """
+        create table wallet_operations (
+            id integer not null default nextval('wallet_operations_id_seq'),
+            operation varchar,
+            wallet_from integer,
+            wallet_to integer,
+            amount numeric(10, 2) not null default 0,
+            created_at timestamptz not null default now(),
+            constraint operations_positive_amount check (amount >= 0),
+            primary key (id, created_at)
+        ) partition by range (created_at)
+        """
+    )
+    op.execute("alter sequence wallet_operations_id_seq owned by wallet_operations.id")
+    op.execute(
+        "create index wallet_operations_wallet_to_id_idx on wallet_operations (wallet_to, id)"
+    )
+    op.execute(
+        "create index wallet_operations_wallet_from_id_idx on wallet_operations (wallet_from, id)"
+    )
+    op.execute(CREATE_PARTITIONS)
+    # Rows out of created ranges are stored here instead of failing inserts
+    op.execute("create table wallet_operations_default partition of wallet_operations default")
+    op.execute("insert into wallet_operations select * from wallet_operations_legacy")
+    op.execute("drop table wallet_operations_legacy")
+
+
+def downgrade():
+    op.execute("alter table wallet_operations rename to wallet_operations_partitioned")
+    op.execute(
+        "alter table wallet_operations_partitioned "
+        "rename constraint wallet_operations_pkey to wallet_operations_partitioned_pkey"
+    )
+    op.execute("alter sequence wallet_operations_id_seq owned by none")
+    op.execute(
+        "alter index wallet_operations_wallet_to_id_idx rename to wallet_operations_partitioned_to"
+    )
+    op.execute(
+        "alter index wallet_operations_wallet_from_id_idx "
+        "rename to wallet_operations_partitioned_from"
+    )
+    op.execute(
+        """
+        create table wallet_operations (
+            id integer primary key default nextval('wallet_operations_id_seq'),
+            operation varchar,
+            wallet_from integer,
+            wallet_to integer,
+            amount numeric(10, 2) not null default 0,
+            created_at timestamptz not null default now(),
+            constraint operations_positive_amount check (amount >= 0)
+        )
+        """
+    )
+    op.execute("alter sequence wallet_operations_id_seq owned by wallet_operations.id")
+    op.execute(
+        "create index wallet_operations_wallet_to_id_idx on wallet_operations (wallet_to, id)"
+    )
+    op.execute(
+        "create index wallet_operations_wallet_from_id_idx on wallet_operations (wallet_from, id)"
+    )
+    op.execute("insert into wallet_operations select * from wallet_operations_partitioned")
+    op.execute("drop table wallet_operations_partitioned cascade")
@@ -1,5 +1,11 @@
+from typing import Any, AsyncIterator, List, Optional
+
+from asyncpg import Record
 from databases import Database
 
+from app.adapters.sql.compiled import CompiledQuery
+from app.adapters.sql.pool import AsyncpgDatabase
+
 
 class BaseRepository:
     """Represents base repository class."""
@@ -8,3 +14,137 @@ class BaseRepository:
         """Overwrites default constructor."""
 
         self._db = db
+
+    async def _fetch_one_compiled(self, query: CompiledQuery, **values: Any) -> Optional[Record]:
+        """
+        Execute precompiled query as prepared statement and return the first row.
+
+        Raw connection is taken from 'databases', so the query joins
+        the transaction of the current task.
+
+        :param query: Precompiled query
+        :param values: Values of bind parameters
+        :returns: Row or None
+        """
+
+        async with self._db.connection() as connection:
+            return await connection.raw_connection.fetchrow(query.sql, *query.args(values))
+
+    async def _fetch_all_compiled(self, query: CompiledQuery, **values: Any) -> List[Record]:
+        """
+        Execute precompiled query as prepared statement and return all rows.
+
+        :param query: Precompiled query
+        :param values: Values of bind parameters
+        :returns: List of rows
+        """
+
+        async with self._db.connection() as connection:
+            rows: List[Record] = await connection.raw_connection.fetch(
+                query.sql, *query.args(values)
+            )
+            return rows
+
+    async def _fetch_val_compiled(self, query: CompiledQuery, **values: Any) -> Any:
+        """
+        Execute precompiled query as prepared statement and return the first column of the first row.
+
+        :param query: Precompiled query
+        :param values: Values of bind parameters
+        :returns: Value or None
+        """
+
+        async with self._db.connection() as connection:
+            return await connection.raw_connection.fetchval(query.sql, *query.args(values))
+
+    async def _iterate_compiled(
+        self, query: CompiledQuery, chunk_size: int, **values: Any
+    ) -> AsyncIterator[List[Record]]:
+        """
+        Execute precompiled query with server-side cursor and yield its rows in chunks.
+
+        Cursor needs a transaction (savepoint within the transaction of the
+        current task), so the connection is held until the iteration ends.
+
+        :param query: Precompiled query
+        :param chunk_size: Number of rows fetched at once
+        :param values: Values of bind parameters
+        :returns: Iterator over lists of rows
+        """
+
+        async with self._db.connection() as connection:
+            raw_connection = connection.raw_connection
+            async with raw_connection.transaction():
+                cursor = await raw_connection.cursor(query.sql, *query.args(values))
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        return
+                    yield rows
+
+
+class BaseAsyncpgRepository:
+    """Represents base class of repositories working on raw asyncpg pool."""
+
+    def __init__(self, db: AsyncpgDatabase):
+        """Overwrites default constructor."""
+
+        self._db = db
+
+    async def _fetch_one(self, query: CompiledQuery, **values: Any) -> Optional[Record]:
+        """
+        Execute precompiled query and return the first row.
+
+        :param query: Precompiled query
+        :param values: Values of bind parameters
+        :returns: Row or None
+        """
+
+        async with self._db.connection() as connection:
+            return await connection.fetchrow(query.sql, *query.args(values))
+
+    async def _fetch_all(self, query: CompiledQuery, **values: Any) -> List[Record]:
+        """
+        Execute precompiled query and return all rows.
+
+        :param query: Precompiled query
+        :param values: Values of bind parameters
+        :returns: List of rows
+        """
+
+        async with self._db.connection() as connection:
+            rows: List[Record] = await connection.fetch(query.sql, *query.args(values))
+            return rows
+
+    async def _fetch_val(self, query: CompiledQuery, **values: Any) -> Any:
+        """
+        Execute precompiled query and return the first column of the first row.
+
+        :param query: Precompiled query
+        :param values: Values of bind parameters
+        :returns: Value or None
+        """
+
+        async with self._db.connection() as connection:
+            return await connection.fetchval(query.sql, *query.args(values))
+
+    async def _iterate(
+        self, query: CompiledQuery, chunk_size: int, **values: Any
+    ) -> AsyncIterator[List[Record]]:
+        """
+        Execute precompiled query with server-side cursor and yield its rows in chunks.
+
+        :param query: Precompiled query
+        :param chunk_size: Number of rows fetched at once
+        :param values: Values of bind parameters
+        :returns: Iterator over lists of rows
+        """
+
+        async with self._db.connection() as connection:
+            async with connection.transaction():
+                cursor = await connection.cursor(query.sql, *query.args(values))
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        return
+                    yield rows
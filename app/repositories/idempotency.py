@@ -0,0 +1,169 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+from app.adapters.sql.compiled import CompiledQuery
+from app.adapters.sql.models import idempotency_keys
+from app.entities.idempotency import IdempotencyRecord
+
+from .base import BaseAsyncpgRepository, BaseRepository
+
+CLAIM_KEY_QUERY = CompiledQuery(
+    insert(idempotency_keys)
+    .values({"key": sa.bindparam("key"), "request_hash": sa.bindparam("request_hash")})
+    .on_conflict_do_nothing(index_elements=[idempotency_keys.c.key])
+    .returning(idempotency_keys.c.key)
+)
+KEY_QUERY = CompiledQuery(
+    sa.select(
+        [idempotency_keys.c.key, idempotency_keys.c.request_hash, idempotency_keys.c.response]
+    ).where(idempotency_keys.c.key == sa.bindparam("key"))
+)
+SAVE_RESPONSE_QUERY = CompiledQuery(
+    idempotency_keys.update()
+    .where(idempotency_keys.c.key == sa.bindparam("key"))
+    .values(response=sa.bindparam("response"))
+)
+# Keys are deleted in small batches ordered by index, skipping rows
+# locked by the writes, so pruning does not block requests. Locking subquery
+# is a CTE, since a rescanned subquery may lock more rows than the limit.
+_expired_keys = (
+    sa.select([idempotency_keys.c.key])
+    .where(idempotency_keys.c.created_at < sa.bindparam("before"))
+    .order_by(idempotency_keys.c.created_at)
+    .limit(sa.bindparam("limit", type_=sa.Integer))
+    .with_for_update(skip_locked=True)
+    .cte("expired_keys")
+)
+DELETE_EXPIRED_QUERY = CompiledQuery(
+    idempotency_keys.delete()
+    .where(idempotency_keys.c.key.in_(sa.select([_expired_keys.c.key])))
+    .returning(idempotency_keys.c.key)
+)
+
+
+class AbstractIdempotencyKeyRepository(ABC):
+    """Abstract class for idempotency keys repository"""
+
+    @abstractmethod
+    async def claim(self, key: str, request_hash: str) -> Optional[IdempotencyRecord]:
+        """
+        Store new idempotency key (without response).
+
+        :param key: Idempotency key
+        :param request_hash: Fingerprint of the request
+        :returns: Already stored record or None if the key is new
+        """
+        ...
+
+    @abstractmethod
+    async def save_response(self, key: str, response: str):
+        """
+        Store response of the request with the claimed key.
+
+        :param key: Idempotency key
+        :param response: Serialized response
+        """
+        ...
+
+    @abstractmethod
+    async def delete_expired(self, before: datetime, limit: int) -> int:
+        """
+        Delete batch of keys created before given time.
+
+        :param before: Creation time of the oldest key to keep
+        :param limit: Maximum number of deleted keys
+        :returns: Number of deleted keys
+        """
+        ...
+
+
+class IdempotencyKeyRepository(BaseRepository, AbstractIdempotencyKeyRepository):
+    """Implementation of AbstractIdempotencyKeyRepository interface."""
+
+    async def claim(self, key: str, request_hash: str) -> Optional[IdempotencyRecord]:
+        """
+        Store new idempotency key (without response).
+
+        :param key: Idempotency key
+        :param request_hash: Fingerprint of the request
+        :returns: Already stored record or None if the key is new
+        """
+
+        # Conflicting key may be pruned before it is read, then it is claimed again
+        while True:
+            if await self._fetch_val_compiled(CLAIM_KEY_QUERY, key=key, request_hash=request_hash):
+                return None
+
+            row = await self._fetch_one_compiled(KEY_QUERY, key=key)
+            if row is not None:
+                return IdempotencyRecord(**row)
+
+    async def save_response(self, key: str, response: str):
+        """
+        Store response of the request with the claimed key.
+
+        :param key: Idempotency key
+        :param response: Serialized response
+        """
+
+        await self._fetch_val_compiled(SAVE_RESPONSE_QUERY, key=key, response=response)
+
+    async def delete_expired(self, before: datetime, limit: int) -> int:
+        """
+        Delete batch of keys created before given time.
+
+        :param before: Creation time of the oldest key to keep
+        :param limit: Maximum number of deleted keys
+        :returns: Number of deleted keys
+        """
+
+        rows = await self._fetch_all_compiled(DELETE_EXPIRED_QUERY, before=before, limit=limit)
+        return len(rows)
+
+
+class AsyncpgIdempotencyKeyRepository(BaseAsyncpgRepository, AbstractIdempotencyKeyRepository):
+    """Implementation of AbstractIdempotencyKeyRepository interface on raw asyncpg pool."""
+
+    async def claim(self, key: str, request_hash: str) -> Optional[IdempotencyRecord]:
+        """
+        Store new idempotency key (without response).
+
+        :param key: Idempotency key
+        :param request_hash: Fingerprint of the request
+        :returns: Already stored record or None if the key is new
+        """
+
+        # Conflicting key may be pruned before it is read, then it is claimed again
+        while True:
+            if await self._fetch_val(CLAIM_KEY_QUERY, key=key, request_hash=request_hash):
+                return None
+
+            row = await self._fetch_one(KEY_QUERY, key=key)
+            if row is not None:
+                return IdempotencyRecord(**row)
+
+    async def save_response(self, key: str, response: str):
+        """
+        Store response of the request with the claimed key.
+
+        :param key: Idempotency key
+        :param response: Serialized response
+        """
+
+        await self._fetch_val(SAVE_RESPONSE_QUERY, key=key, response=response)
+
+    async def delete_expired(self, before: datetime, limit: int) -> int:
+        """
+        Delete batch of keys created before given time.
+
+        :param before: Creation time of the oldest key to keep
+        :param limit: Maximum number of deleted keys
+        :returns: Number of deleted keys
+        """
+
+        rows = await self._fetch_all(DELETE_EXPIRED_QUERY, before=before, limit=limit)
+        return len(rows)
@@ -0,0 +1,163 @@
+import json
+from abc import ABC, abstractmethod
+from typing import List
+
+import sqlalchemy as sa
+from asyncpg import Record
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+
+from app.adapters.sql.compiled import CompiledQuery
+from app.adapters.sql.models import outbox
+from app.entities.outbox import CreateOutboxEvent, OutboxEvent
+
+from .base import BaseAsyncpgRepository, BaseRepository
+
+# Payloads are passed as JSON text and cast to jsonb by the database
+_events_rows = (
+    sa.func.unnest(
+        sa.bindparam("event_types", type_=ARRAY(sa.String)),
+        sa.bindparam("payloads", type_=ARRAY(sa.Text)),
+    )
+    .table_valued("event_type", "payload")
+    .render_derived(name="events")
+)
+ADD_EVENTS_QUERY = CompiledQuery(
+    outbox.insert().from_select(
+        ["event_type", "payload"],
+        sa.select([_events_rows.c.event_type, sa.cast(_events_rows.c.payload, JSONB)]),
+    )
+)
+# Events locked by other relays are skipped, so relays claim different batches
+CLAIM_EVENTS_QUERY = CompiledQuery(
+    sa.select([outbox])
+    .order_by(outbox.c.id)
+    .limit(sa.bindparam("limit", type_=sa.Integer))
+    .with_for_update(skip_locked=True)
+)
+DELETE_EVENTS_QUERY = CompiledQuery(
+    outbox.delete().where(outbox.c.id == sa.any_(sa.bindparam("ids", type_=ARRAY(sa.BigInteger))))
+)
+
+
+def _add_events_values(events: List[CreateOutboxEvent]) -> dict:
+    """Return columns of outbox events as arrays."""
+
+    return {
+        "event_types": [event.event_type.value for event in events],
+        "payloads": [json.dumps(event.payload) for event in events],
+    }
+
+
+def _event_from_row(row: Record) -> OutboxEvent:
+    """Build outbox event from the row (jsonb is returned by asyncpg as text)."""
+
+    return OutboxEvent(
+        id=row["id"],
+        event_type=row["event_type"],
+        payload=json.loads(row["payload"]),
+        created_at=row["created_at"],
+    )
+
+
+class AbstractOutboxRepository(ABC):
+    """Abstract class for outbox repository"""
+
+    @abstractmethod
+    async def add_many(self, events: List[CreateOutboxEvent]):
+        """
+        Write events with one statement.
+
+        :param events: Events to deliver
+        """
+        ...
+
+    @abstractmethod
+    async def claim(self, limit: int) -> List[OutboxEvent]:
+        """
+        Lock the oldest events, which are not locked by other relays.
+
+        Events stay locked until the end of the current transaction.
+
+        :param limit: Maximum number of events
+        :returns: Events ordered by id
+        """
+        ...
+
+    @abstractmethod
+    async def delete(self, ids: List[int]):
+        """
+        Delete delivered events.
+
+        :param ids: IDs of events
+        """
+        ...
+
+
+class OutboxRepository(BaseRepository, AbstractOutboxRepository):
+    """Implementation of AbstractOutboxRepository interface."""
+
+    async def add_many(self, events: List[CreateOutboxEvent]):
+        """
+        Write events with one statement.
+
+        :param events: Events to deliver
+        """
+
+        if events:
+            await self._fetch_val_compiled(ADD_EVENTS_QUERY, **_add_events_values(events))
+
+    async def claim(self, limit: int) -> List[OutboxEvent]:
+        """
+        Lock the oldest events, which are not locked by other relays.
+
+        :param limit: Maximum number of events
+        :returns: Events ordered by id
+        """
+
+        rows = await self._fetch_all_compiled(CLAIM_EVENTS_QUERY, limit=limit)
+        return [_event_from_row(row) for row in rows]
+
+    async def delete(self, ids: List[int]):
+        """
+        Delete delivered events.
+
+        :param ids: IDs of events
+        """
+
+        if ids:
+            await self._fetch_val_compiled(DELETE_EVENTS_QUERY, ids=ids)
+
+
+class AsyncpgOutboxRepository(BaseAsyncpgRepository, AbstractOutboxRepository):
+    """Implementation of AbstractOutboxRepository interface on top of raw asyncpg pool."""
+
+    async def add_many(self, events: List[CreateOutboxEvent]):
+        """
+        Write events with one statement.
+
+        :param events: Events to deliver
+        """
+
+        if events:
+            await self._fetch_val(ADD_EVENTS_QUERY, **_add_events_values(events))
+
+    async def claim(self, limit: int) -> List[OutboxEvent]:
+        """
+        Lock the oldest events, which are not locked by other relays.
+
+        :param limit: Maximum number of events
+        :returns: Events ordered by id
+        """
+
+        rows = await self._fetch_all(CLAIM_EVENTS_QUERY, limit=limit)
+        return [_event_from_row(row) for row in rows]
+
+    async def delete(self, ids: List[int]):
+        """
+        Delete delivered events.
+
+        :param ids: IDs of events
+        """
+
+        if ids:
+            await self._fetch_val(DELETE_EVENTS_QUERY, ids=ids)
@@ -1,12 +1,46 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import List, Optional
 
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.sql import select
 
-from app.adapters.sql.models import users, wallets
-from app.entities.user import User
-
-from .base import BaseRepository
+from app.adapters.sql.compiled import CompiledQuery
+from app.adapters.sql.models import users, wallet_balance, wallets
+from app.entities.user import BaseUser, User
+
+from .base import BaseAsyncpgRepository, BaseRepository
+
+_user_with_wallet = select(
+    [
+        users.c.id,
+        users.c.email,
+        wallets.c.id.label("wallet_id"),
+        wallet_balance,
+        wallets.c.currency,
+    ]
+).select_from(users.join(wallets, users.c.id == wallets.c.user_id, isouter=True))
+
+USER_BY_ID_QUERY = CompiledQuery(_user_with_wallet.where(users.c.id == sa.bindparam("user_id")))
+USER_BY_WALLET_ID_QUERY = CompiledQuery(
+    _user_with_wallet.where(wallets.c.id == sa.bindparam("wallet_id"))
+)
+USERS_BY_IDS_QUERY = CompiledQuery(
+    _user_with_wallet.where(
+        users.c.id == sa.any_(sa.bindparam("user_ids", type_=ARRAY(sa.Integer)))
+    )
+)
+CREATE_USER_QUERY = CompiledQuery(
+    users.insert().values({"email": sa.bindparam("email")}).returning(users.c.id)
+)
+CREATE_USERS_QUERY = CompiledQuery(
+    insert(users)
+    .from_select(
+        ["email"], sa.select([sa.func.unnest(sa.bindparam("emails", type_=ARRAY(sa.String)))])
+    )
+    .on_conflict_do_nothing(constraint="unique_email")
+    .returning(users.c.id, users.c.email)
+)
 
 
 class AbstractUserRepository(ABC):
@@ -21,6 +55,16 @@ class AbstractUserRepository(ABC):
         """
         ...
 
+    @abstractmethod
+    async def get_by_ids(self, user_ids: List[int]) -> List[User]:
+        """
+        Receive User entities by their ids
+
+        :param user_ids: IDs of users
+        :returns: List of existing users
+        """
+        ...
+
     @abstractmethod
     async def create(self, email: str) -> int:
         """
@@ -41,6 +85,17 @@ class AbstractUserRepository(ABC):
         """
         ...
 
+    @abstractmethod
+    async def create_many(self, emails: List[str]) -> List[BaseUser]:
+        """
+        Create several users with one statement.
+        Emails which are already taken are skipped.
+
+        :param emails: Emails of new users
+        :returns: List of created users
+        """
+        ...
+
 
 class UserRepository(BaseRepository, AbstractUserRepository):
     """Implementation of user repository"""
@@ -52,26 +107,94 @@ class UserRepository(BaseRepository, AbstractUserRepository):
         :returns: User entity
         """
 
-        j = users.join(wallets, users.c.id == wallets.c.user_id, isouter=True)
-        query = (
-            select(
-                [
-                    users.c.id,
-                    users.c.email,
-                    wallets.c.id.label("wallet_id"),
-                    wallets.c.balance,
-                    wallets.c.currency,
-                ]
-            )
-            .select_from(j)
-            .where(users.c.id == user_id)
-        )
-        user = await self._db.fetch_one(query)
+        user = await self._fetch_one_compiled(USER_BY_ID_QUERY, user_id=user_id)
+        if user:
+            return User(**user)
+
+        return None
+
+    async def get_by_ids(self, user_ids: List[int]) -> List[User]:
+        """
+        Receive User entities by their ids
+
+        :param user_ids: IDs of users
+        :returns: List of existing users
+        """
+
+        rows = await self._fetch_all_compiled(USERS_BY_IDS_QUERY, user_ids=list(user_ids))
+        return [User(**row) for row in rows]
+
+    async def get_by_wallet_id(self, wallet_id: int) -> Optional[User]:
+        """
+        Receive User entity by its wallet id
+
+        :param wallet_id: ID of user's wallet
+        :returns: User entity
+        """
+        user = await self._fetch_one_compiled(USER_BY_WALLET_ID_QUERY, wallet_id=wallet_id)
+        if user:
+            return User(**user)
+
+        return None
+
+    async def create(self, email: str) -> int:
+        """
+        Create user instance.
+
+        :param email: New user email
+        :returns: Base user schema entity
+        """
+
+        if not email:
+            raise ValueError("email is empty")
+        user_id: int = await self._fetch_val_compiled(CREATE_USER_QUERY, email=email)
+        return user_id
+
+    async def create_many(self, emails: List[str]) -> List[BaseUser]:
+        """
+        Create several users with one statement.
+        Emails which are already taken are skipped.
+
+        :param emails: Emails of new users
+        :returns: List of created users
+        """
+
+        if not emails:
+            return []
+        if not all(emails):
+            raise ValueError("email is empty")
+
+        rows = await self._fetch_all_compiled(CREATE_USERS_QUERY, emails=emails)
+        return [BaseUser(**row) for row in rows]
+
+
+class AsyncpgUserRepository(BaseAsyncpgRepository, AbstractUserRepository):
+    """Implementation of user repository on raw asyncpg pool."""
+
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        """
+        Receive User entity by its id
+        :param user_id: ID of user
+        :returns: User entity
+        """
+
+        user = await self._fetch_one(USER_BY_ID_QUERY, user_id=user_id)
         if user:
             return User(**user)
 
         return None
 
+    async def get_by_ids(self, user_ids: List[int]) -> List[User]:
+        """
+        Receive User entities by their ids
+
+        :param user_ids: IDs of users
+        :returns: List of existing users
+        """
+
+        rows = await self._fetch_all(USERS_BY_IDS_QUERY, user_ids=list(user_ids))
+        return [User(**row) for row in rows]
+
     async def get_by_wallet_id(self, wallet_id: int) -> Optional[User]:
         """
         Receive User entity by its wallet id
@@ -79,21 +202,8 @@ class UserRepository(BaseRepository, AbstractUserRepository):
         :param wallet_id: ID of user's wallet
         :returns: User entity
         """
-        j = users.join(wallets, users.c.id == wallets.c.user_id, isouter=True)
-        query = (
-            select(
-                [
-                    users.c.id,
-                    users.c.email,
-                    wallets.c.id.label("wallet_id"),
-                    wallets.c.balance,
-                    wallets.c.currency,
-                ]
-            )
-            .select_from(j)
-            .where(wallets.c.id == wallet_id)
-        )
-        user = await self._db.fetch_one(query)
+
+        user = await self._fetch_one(USER_BY_WALLET_ID_QUERY, wallet_id=wallet_id)
         if user:
             return User(**user)
 
@@ -109,5 +219,22 @@ class UserRepository(BaseRepository, AbstractUserRepository):
 
         if not email:
             raise ValueError("email is empty")
-        user_id: int = await self._db.execute(query=users.insert(), values={"email": email})
+        user_id: int = await self._fetch_val(CREATE_USER_QUERY, email=email)
         return user_id
+
+    async def create_many(self, emails: List[str]) -> List[BaseUser]:
+        """
+        Create several users with one statement.
+        Emails which are already taken are skipped.
+
+        :param emails: Emails of new users
+        :returns: List of created users
+        """
+
+        if not emails:
+            return []
+        if not all(emails):
+            raise ValueError("email is empty")
+
+        rows = await self._fetch_all(CREATE_USERS_QUERY, emails=emails)
+        return [BaseUser(**row) for row in rows]
@@ -1,11 +1,401 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
 from decimal import Decimal
-from typing import Optional
-
-from app.adapters.sql.models import wallets
-from app.entities.wallet import WalletEntity
-
-from .base import BaseRepository
+from typing import Dict, List, Optional, Tuple
+
+import sqlalchemy as sa
+from asyncpg import Record
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from app.adapters.sql.compiled import CompiledQuery
+from app.adapters.sql.models import (
+    users,
+    wallet_balance,
+    wallet_balance_snapshots,
+    wallet_operation_delta,
+    wallet_operations,
+    wallets,
+)
+from app.entities.user import User
+from app.entities.wallet import WalletDoesNotExist, WalletEntity
+from app.entities.wallet_operation import Operations
+
+from .base import BaseAsyncpgRepository, BaseRepository
+
+# Balances are read with their shards and written by 'change_wallet_balance' function
+_wallet_columns = [wallets.c.id, wallets.c.user_id, wallet_balance, wallets.c.currency]
+_change_balance = sa.func.change_wallet_balance
+
+WALLET_BY_ID_QUERY = CompiledQuery(
+    sa.select(_wallet_columns).where(wallets.c.id == sa.bindparam("wallet_id"))
+)
+WALLETS_BY_IDS_QUERY = CompiledQuery(
+    sa.select(_wallet_columns).where(
+        wallets.c.id == sa.any_(sa.bindparam("wallet_ids", type_=ARRAY(sa.Integer)))
+    )
+)
+WALLET_BY_USER_ID_QUERY = CompiledQuery(
+    sa.select(_wallet_columns).where(wallets.c.user_id == sa.bindparam("user_id"))
+)
+CREATE_WALLET_QUERY = CompiledQuery(
+    wallets.insert().values({"user_id": sa.bindparam("user_id")}).returning(wallets.c.id)
+)
+CREATE_WALLETS_QUERY = CompiledQuery(
+    wallets.insert()
+    .from_select(
+        ["user_id"], sa.select([sa.func.unnest(sa.bindparam("user_ids", type_=ARRAY(sa.Integer)))])
+    )
+    .returning(wallets.c.id)
+)
+_deltas = (
+    sa.func.unnest(
+        sa.bindparam("wallet_ids", type_=ARRAY(sa.Integer)),
+        sa.bindparam("deltas", type_=ARRAY(wallets.c.balance.type)),
+    )
+    .table_valued("id", "delta")
+    .render_derived(name="deltas")
+)
+UPDATE_BALANCES_QUERY = CompiledQuery(
+    sa.select(
+        [
+            _deltas.c.id,
+            _change_balance(_deltas.c.id, _deltas.c.delta, type_=wallets.c.balance.type).label(
+                "balance"
+            ),
+        ]
+    ).order_by(_deltas.c.id)
+)
+# Returns new balance of the wallet or NULL if it does not exist
+CHANGE_BALANCE_QUERY = CompiledQuery(
+    sa.select(
+        [
+            _change_balance(
+                sa.bindparam("wallet_id", type_=sa.Integer),
+                sa.bindparam("delta", type_=wallets.c.balance.type),
+                type_=wallets.c.balance.type,
+            )
+        ]
+    )
+)
+SET_BALANCE_SHARDS_QUERY = CompiledQuery(
+    sa.select(
+        [
+            sa.func.set_wallet_balance_shards(
+                sa.bindparam("wallet_id", type_=sa.Integer),
+                sa.bindparam("shards", type_=sa.Integer),
+                type_=wallets.c.balance.type,
+            )
+        ]
+    )
+)
+
+_snapshots = wallet_balance_snapshots
+_zero: sa.sql.ColumnElement = sa.literal_column("0")
+_min_time: sa.sql.ColumnElement = sa.literal_column("'-infinity'::timestamptz")
+
+
+def _operations_delta(
+    wallet_id: sa.sql.ColumnElement,
+    since: sa.sql.ColumnElement,
+    until: sa.sql.ColumnElement,
+    until_inclusive: bool,
+) -> sa.sql.Select:
+    """
+    Statement which sums changes of the wallet balance made by operations within time range.
+
+    :param wallet_id: ID of wallet
+    :param since: Minimal creation time of operation (inclusive)
+    :param until: Maximal creation time of operation
+    :param until_inclusive: Whether operations created at 'until' are included
+    """
+
+    created_at = wallet_operations.c.created_at
+    return sa.select(
+        [
+            sa.func.coalesce(sa.func.sum(wallet_operation_delta(wallet_id)), _zero).label("delta"),
+            sa.func.count().label("operations"),
+        ]
+    ).where(
+        sa.and_(
+            sa.or_(
+                wallet_operations.c.wallet_from == wallet_id,
+                wallet_operations.c.wallet_to == wallet_id,
+            ),
+            created_at >= since,
+            created_at <= until if until_inclusive else created_at < until,
+        )
+    )
+
+
+def _balance_at_query() -> sa.sql.Select:
+    """Statement which adds operations since the nearest snapshot to its balance."""
+
+    at_param = sa.bindparam("at", type_=sa.DateTime(timezone=True))
+    previous = (
+        sa.select([_snapshots.c.balance, _snapshots.c.taken_at])
+        .where(_snapshots.c.wallet_id == wallets.c.id)
+        .where(_snapshots.c.taken_at <= at_param)
+        .order_by(_snapshots.c.taken_at.desc())
+        .limit(1)
+        .lateral("previous")
+    )
+    delta = _operations_delta(
+        wallets.c.id,
+        since=sa.func.coalesce(previous.c.taken_at, _min_time),
+        until=at_param,
+        until_inclusive=True,
+    ).lateral("delta")
+    return (
+        sa.select([(sa.func.coalesce(previous.c.balance, _zero) + delta.c.delta).label("balance")])
+        .select_from(wallets.outerjoin(previous, sa.true()).join(delta, sa.true()))
+        .where(wallets.c.id == sa.bindparam("wallet_id", type_=sa.Integer))
+    )
+
+
+def _take_snapshots_query() -> sa.sql.Select:
+    """
+    Statement which snapshots balances of the chunk of wallets.
+
+    Balance is the previous snapshot plus operations created since it, so
+    only new operations are read. Snapshot is written only for wallets
+    changed since the previous one (or without one).
+    """
+
+    taken_at_param = sa.bindparam("taken_at", type_=sa.DateTime(timezone=True))
+    chunk = (
+        sa.select([wallets.c.id])
+        .where(wallets.c.id > sa.bindparam("after_wallet_id", type_=sa.Integer))
+        .order_by(wallets.c.id)
+        .limit(sa.bindparam("limit", type_=sa.Integer))
+        .cte("chunk")
+    )
+    previous = (
+        sa.select([_snapshots.c.balance, _snapshots.c.taken_at])
+        .where(_snapshots.c.wallet_id == chunk.c.id)
+        .where(_snapshots.c.taken_at < taken_at_param)
+        .order_by(_snapshots.c.taken_at.desc())
+        .limit(1)
+        .lateral("previous")
+    )
+    delta = _operations_delta(
+        chunk.c.id,
+        since=sa.func.coalesce(previous.c.taken_at, _min_time),
+        until=taken_at_param,
+        until_inclusive=False,
+    ).lateral("delta")
+    inserted = (
+        insert(_snapshots)
+        .from_select(
+            ["wallet_id", "taken_at", "balance"],
+            sa.select(
+                [
+                    chunk.c.id,
+                    taken_at_param,
+                    sa.func.coalesce(previous.c.balance, _zero) + delta.c.delta,
+                ]
+            )
+            .select_from(chunk.outerjoin(previous, sa.true()).join(delta, sa.true()))
+            .where(sa.or_(previous.c.taken_at.is_(None), delta.c.operations > _zero)),
+        )
+        .on_conflict_do_nothing()
+        .returning(_snapshots.c.wallet_id)
+        .cte("inserted")
+    )
+    return sa.select(
+        [
+            sa.func.max(chunk.c.id).label("last_wallet_id"),
+            sa.select([sa.func.count()])
+            .select_from(inserted)
+            .scalar_subquery()  # type: ignore[attr-defined]  # stubs lack SQLAlchemy 1.4 API
+            .label("snapshots"),
+        ]
+    )
+
+
+BALANCE_AT_QUERY = CompiledQuery(_balance_at_query())
+TAKE_SNAPSHOTS_QUERY = CompiledQuery(_take_snapshots_query())
+
+
+def _enroll_with_operation_query() -> sa.sql.Select:
+    """Statement which credits user's wallet and writes wallet operation."""
+
+    amount_param = sa.bindparam("amount", type_=wallets.c.balance.type)
+    credit = (
+        sa.select(
+            [
+                wallets.c.id,
+                wallets.c.user_id,
+                _change_balance(wallets.c.id, amount_param, type_=wallets.c.balance.type).label(
+                    "balance"
+                ),
+                wallets.c.currency,
+            ]
+        )
+        .where(wallets.c.user_id == sa.bindparam("user_id", type_=sa.Integer))
+        .cte("credit")
+    )
+    operation = (
+        wallet_operations.insert()
+        .from_select(
+            ["operation", "wallet_from", "wallet_to", "amount"],
+            sa.select(
+                [
+                    sa.cast(sa.literal_column(f"'{Operations.DEPOSIT.value}'"), sa.String),
+                    sa.cast(sa.null(), sa.Integer),
+                    credit.c.id,
+                    sa.cast(amount_param, wallet_operations.c.amount.type),
+                ]
+            ),
+        )
+        .returning(wallet_operations.c.id)
+        .cte("operation")
+    )
+    # See '_transfer_with_operations_query' for the reason of labels and reference to operation
+    query = (
+        sa.select(
+            [
+                users.c.id.label("owner_id"),
+                users.c.email.label("owner_email"),
+                credit.c.id.label("wallet_id"),
+                credit.c.balance.label("wallet_balance"),
+                credit.c.currency.label("wallet_currency"),
+            ]
+        )
+        .select_from(credit.join(users, users.c.id == credit.c.user_id))
+        .where(sa.exists(sa.select([operation.c.id])))
+    )
+    return query
+
+
+def _transfer_with_operations_query() -> sa.sql.Select:
+    """Statement which checks balance, updates both wallets and writes wallet operations."""
+
+    amount_param = sa.bindparam("amount", type_=wallets.c.balance.type)
+    source_param = sa.bindparam("source_wallet_id", type_=sa.Integer)
+    destination_param = sa.bindparam("destination_wallet_id", type_=sa.Integer)
+    source = (
+        sa.select([wallets.c.id, wallet_balance])
+        .where(wallets.c.id == source_param)
+        .with_for_update()
+        .cte("source")
+    )
+    # Credit of sharded wallet does not update its row, so the row is only
+    # protected from deletion and concurrent credits do not wait for each other
+    destination = (
+        sa.select([wallets.c.id])
+        .where(wallets.c.id == destination_param)
+        .with_for_update(read=True, key_share=True)
+        .cte("destination")
+    )
+    checked = (
+        sa.select([source.c.id])
+        .select_from(source.join(destination, sa.true()))
+        .where(source.c.balance >= amount_param)
+        .cte("checked")
+    )
+    debit = (
+        sa.select(
+            [
+                wallets.c.id,
+                wallets.c.user_id,
+                _change_balance(wallets.c.id, -amount_param, type_=wallets.c.balance.type).label(
+                    "balance"
+                ),
+                wallets.c.currency,
+            ]
+        )
+        .where(wallets.c.id == checked.c.id)
+        .cte("debit")
+    )
+    credit = (
+        sa.select(
+            [
+                _change_balance(
+                    destination_param, amount_param, type_=wallets.c.balance.type
+                ).label("balance")
+            ]
+        )
+        .where(sa.exists(sa.select([debit.c.id])))
+        .cte("credit")
+    )
+
+    def operation_row(
+        operation: Operations, wallet_from: sa.sql.ClauseElement, wallet_to: sa.sql.ClauseElement
+    ) -> sa.sql.Select:
+        return sa.select(
+            [
+                sa.cast(sa.literal_column(f"'{operation.value}'"), sa.String),
+                sa.cast(wallet_from, sa.Integer),
+                sa.cast(wallet_to, sa.Integer),
+                sa.cast(amount_param, wallet_operations.c.amount.type),
+            ]
+        ).where(sa.exists(sa.select([credit.c.balance])))
+
+    operations = (
+        wallet_operations.insert()
+        .from_select(
+            ["operation", "wallet_from", "wallet_to", "amount"],
+            sa.union_all(
+                operation_row(Operations.WITHDRAWAL, source_param, destination_param),
+                operation_row(Operations.DEPOSIT, destination_param, source_param),
+            ),
+        )
+        .returning(wallet_operations.c.id)
+        .cte("operations")
+    )
+    # SQLAlchemy renders only referenced CTEs, so the data-modifying one is
+    # referenced by 'operations_written' column. It also adds RETURNING columns of
+    # the CTEs to the result columns, so labels of the result must not clash with them.
+    query = sa.select(
+        [
+            sa.exists(sa.select([source.c.id])).label("source_exists"),
+            sa.exists(sa.select([destination.c.id])).label("destination_exists"),
+            sa.exists(sa.select([operations.c.id])).label("operations_written"),
+            users.c.id.label("owner_id"),
+            users.c.email.label("owner_email"),
+            debit.c.id.label("wallet_id"),
+            debit.c.balance.label("wallet_balance"),
+            debit.c.currency.label("wallet_currency"),
+        ]
+    ).select_from(
+        sa.select([sa.literal_column("1")])
+        .subquery("one")  # type: ignore[attr-defined]  # stubs lack SQLAlchemy 1.4 API
+        .outerjoin(debit, sa.true())
+        .outerjoin(users, users.c.id == debit.c.user_id)
+    )
+    return query
+
+
+ENROLL_WITH_OPERATION_QUERY = CompiledQuery(_enroll_with_operation_query())
+TRANSFER_WITH_OPERATIONS_QUERY = CompiledQuery(_transfer_with_operations_query())
+
+
+def _owner_from_result(result: Record) -> User:
+    """Build owner of the wallet from the result of single statement operation."""
+
+    return User(
+        id=result["owner_id"],
+        email=result["owner_email"],
+        wallet_id=result["wallet_id"],
+        balance=result["wallet_balance"],
+        currency=result["wallet_currency"],
+    )
+
+
+def _check_transfer_result(result: Record):
+    """
+    Raise error if single statement transfer was not performed.
+
+    :raises WalletDoesNotExist: If one of the wallets does not exist
+    :raises ValueError: If there are insufficient funds on source wallet
+    """
+
+    if not result["source_exists"]:
+        raise WalletDoesNotExist("Source wallet does not exists")
+    if not result["destination_exists"]:
+        raise WalletDoesNotExist("Destination wallet does not exists")
+    if not result["operations_written"]:
+        raise ValueError("Insufficient funds")
 
 
 class AbstractWalletRepository(ABC):
@@ -21,6 +411,16 @@ class AbstractWalletRepository(ABC):
         """
         ...
 
+    @abstractmethod
+    async def get_by_ids(self, wallet_ids: List[int]) -> List[WalletEntity]:
+        """
+        Retrieve wallet records by wallet ids.
+
+        :param wallet_ids: IDs of wallets
+        :returns: List of existing wallets
+        """
+        ...
+
     @abstractmethod
     async def get_by_user_id(self, user_id: int) -> Optional[WalletEntity]:
         """
@@ -42,13 +442,45 @@ class AbstractWalletRepository(ABC):
         ...
 
     @abstractmethod
-    async def enroll(self, wallet_id: int, amount: Decimal) -> int:
+    async def create_many(self, user_ids: List[int]) -> List[int]:
+        """
+        Create wallets for several users with one statement.
+
+        :param user_ids: IDs of users
+        :returns: IDs of new wallets
+        """
+        ...
+
+    @abstractmethod
+    async def enroll(self, wallet_id: int, amount: Decimal) -> Optional[int]:
         """
         Put given funds on wallet
 
         :param wallet_id: ID of wallet
         :param amount: Initial funds
-        :returns: ID of updated wallet
+        :returns: ID of updated wallet or None if it does not exist
+        """
+        ...
+
+    @abstractmethod
+    async def update_balances(self, deltas: Dict[int, Decimal]) -> List[int]:
+        """
+        Change balances of several wallets with one statement.
+
+        :param deltas: Mapping of wallet id to the balance change
+        :returns: IDs of updated wallets
+        """
+        ...
+
+    @abstractmethod
+    async def enroll_with_operation(self, user_id: int, amount: Decimal) -> Optional[User]:
+        """
+        Put given funds on user's wallet and write wallet operation
+        within a single statement.
+
+        :param user_id: ID of wallet's owner
+        :param amount: Funds for enrollment
+        :returns: User entity or None if user's wallet does not exist
         """
         ...
 
@@ -66,6 +498,68 @@ class AbstractWalletRepository(ABC):
         """
         ...
 
+    @abstractmethod
+    async def transfer_with_operations(
+        self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
+    ) -> User:
+        """
+        Transfer amount of currency between wallets and write wallet operations
+        within a single statement.
+
+        :param source_wallet_id: ID of source wallet
+        :param destination_wallet_id: ID of wallet recepients
+        :param amount: Amount of currency
+        :returns: Owner of source wallet
+        """
+        ...
+
+    @abstractmethod
+    async def set_balance_shards(self, wallet_id: int, shards: int) -> Optional[Decimal]:
+        """
+        Split balance of the wallet into given number of shards.
+
+        Credits of sharded wallet go to a random shard, so they do not
+        contend for the same row. The whole balance is moved to the first
+        shard, zero shards turns sharding off.
+
+        :param wallet_id: ID of wallet
+        :param shards: Number of shards
+        :returns: Balance of the wallet or None if it does not exist
+        """
+        ...
+
+    @abstractmethod
+    async def get_balance_at(self, wallet_id: int, at: datetime) -> Optional[Decimal]:
+        """
+        Compute balance of the wallet at given moment.
+
+        Balance is the nearest snapshot taken before the moment plus
+        operations created since it.
+
+        :param wallet_id: ID of wallet
+        :param at: Moment of time (operations created at it are included)
+        :returns: Balance or None if wallet does not exist
+        """
+        ...
+
+    @abstractmethod
+    async def take_balance_snapshots(
+        self, taken_at: datetime, after_wallet_id: int, limit: int
+    ) -> Tuple[Optional[int], int]:
+        """
+        Snapshot balances of the chunk of wallets ordered by id.
+
+        Snapshot includes operations created before 'taken_at'. Wallets
+        without operations since their previous snapshot are skipped.
+
+        :param taken_at: Moment of the snapshot
+        :param after_wallet_id: Chunk starts after the wallet with this ID
+        :param limit: Size of the chunk
+        :returns: ID of the last wallet of the chunk (None if there are no wallets left)
+            and number of written snapshots
+        """
+        ...
+
 
 class WalletRepository(BaseRepository, AbstractWalletRepository):
     """Implementation of wallet repository."""
@@ -78,13 +572,23 @@ class WalletRepository(BaseRepository, AbstractWalletRepository):
         :returns: Wallet schema
         """
 
-        wallet_query = wallets.select().where(wallets.c.id == wallet_id)
-        wallet = await self._db.fetch_one(wallet_query)
+        wallet = await self._fetch_one_compiled(WALLET_BY_ID_QUERY, wallet_id=wallet_id)
         if wallet:
             return WalletEntity(**wallet)
 
         return None
 
+    async def get_by_ids(self, wallet_ids: List[int]) -> List[WalletEntity]:
+        """
+        Retrieve wallet records by wallet ids.
+
+        :param wallet_ids: IDs of wallets
+        :returns: List of existing wallets
+        """
+
+        rows = await self._fetch_all_compiled(WALLETS_BY_IDS_QUERY, wallet_ids=list(wallet_ids))
+        return [WalletEntity(**row) for row in rows]
+
     async def get_by_user_id(self, user_id: int) -> Optional[WalletEntity]:
         """
         Retrieve wallet record by user id.
@@ -92,8 +596,7 @@ class WalletRepository(BaseRepository, AbstractWalletRepository):
         :param user_id: ID of use
         :returns: Wallet schema
         """
-        wallet_query = wallets.select().where(wallets.c.user_id == user_id)
-        wallet = await self._db.fetch_one(wallet_query)
+        wallet = await self._fetch_one_compiled(WALLET_BY_USER_ID_QUERY, user_id=user_id)
         if wallet:
             return WalletEntity(**wallet)
 
@@ -107,27 +610,70 @@ class WalletRepository(BaseRepository, AbstractWalletRepository):
         :returns: ID of new wallet
         """
 
-        wallet_query = wallets.insert().values({"user_id": user_id})
-        wallet_id: int = await self._db.execute(wallet_query)
+        wallet_id: int = await self._fetch_val_compiled(CREATE_WALLET_QUERY, user_id=user_id)
         return wallet_id
 
-    async def enroll(self, wallet_id: int, amount: Decimal) -> int:
+    async def create_many(self, user_ids: List[int]) -> List[int]:
+        """
+        Create wallets for several users with one statement.
+
+        :param user_ids: IDs of users
+        :returns: IDs of new wallets
+        """
+
+        if not user_ids:
+            return []
+
+        rows = await self._fetch_all_compiled(CREATE_WALLETS_QUERY, user_ids=user_ids)
+        return [row["id"] for row in rows]
+
+    async def enroll(self, wallet_id: int, amount: Decimal) -> Optional[int]:
         """
         Put given funds on wallet
 
         :param wallet_id: ID of wallet
         :param amount: Initial funds
-        :returns: ID of updated wallet
+        :returns: ID of updated wallet or None if it does not exist
+        """
+
+        balance = await self._fetch_val_compiled(
+            CHANGE_BALANCE_QUERY, wallet_id=wallet_id, delta=amount
+        )
+        return wallet_id if balance is not None else None
+
+    async def update_balances(self, deltas: Dict[int, Decimal]) -> List[int]:
+        """
+        Change balances of several wallets with one statement.
+
+        :param deltas: Mapping of wallet id to the balance change
+        :returns: IDs of updated wallets
+        """
+
+        if not deltas:
+            return []
+
+        rows = await self._fetch_all_compiled(
+            UPDATE_BALANCES_QUERY, wallet_ids=list(deltas), deltas=list(deltas.values())
+        )
+        return [row["id"] for row in rows if row["balance"] is not None]
+
+    async def enroll_with_operation(self, user_id: int, amount: Decimal) -> Optional[User]:
+        """
+        Put given funds on user's wallet and write wallet operation
+        within a single statement.
+
+        :param user_id: ID of wallet's owner
+        :param amount: Funds for enrollment
+        :returns: User entity or None if user's wallet does not exist
         """
 
-        query = (
-            wallets.update()
-            .where(wallets.c.id == wallet_id)
-            .values({"balance": wallets.c.balance + amount})
-            .returning(wallets.c.id)
+        result = await self._fetch_one_compiled(
+            ENROLL_WITH_OPERATION_QUERY, user_id=user_id, amount=amount
         )
-        w_id: int = await self._db.execute(query)
-        return w_id
+        if not result:
+            return None
+
+        return _owner_from_result(result)
 
     async def transfer(
         self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
@@ -141,19 +687,286 @@ class WalletRepository(BaseRepository, AbstractWalletRepository):
         :returns: Source wallet id
         """
 
-        source_query = (
-            wallets.update()
-            .where(wallets.c.id == source_wallet_id)
-            .values({"balance": wallets.c.balance - amount})
-            .returning(wallets.c.id)
+        balance = await self._fetch_val_compiled(
+            CHANGE_BALANCE_QUERY, wallet_id=source_wallet_id, delta=-amount
         )
-        target_query = (
-            wallets.update()
-            .where(wallets.c.id == destination_wallet_id)
-            .values({"balance": wallets.c.balance + amount})
-        )
-        wallet_id: int = await self._db.execute(source_query)
-        if not wallet_id:
+        if balance is None:
             raise ValueError("Source wallet id does not exist")
-        await self._db.execute(target_query)
+        await self._fetch_val_compiled(
+            CHANGE_BALANCE_QUERY, wallet_id=destination_wallet_id, delta=amount
+        )
+        return source_wallet_id
+
+    async def transfer_with_operations(
+        self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
+    ) -> User:
+        """
+        Transfer amount of currency between wallets and write wallet operations
+        within a single statement.
+
+        :param source_wallet_id: ID of source wallet
+        :param destination_wallet_id: ID of wallet recepients
+        :param amount: Amount of currency
+        :returns: Owner of source wallet
+        """
+
+        if source_wallet_id == destination_wallet_id:
+            raise ValueError("Source and destination wallets must not be equal")
+
+        result = await self._fetch_one_compiled(
+            TRANSFER_WITH_OPERATIONS_QUERY,
+            source_wallet_id=source_wallet_id,
+            destination_wallet_id=destination_wallet_id,
+            amount=amount,
+        )
+        _check_transfer_result(result)
+        return _owner_from_result(result)
+
+    async def set_balance_shards(self, wallet_id: int, shards: int) -> Optional[Decimal]:
+        """
+        Split balance of the wallet into given number of shards.
+
+        :param wallet_id: ID of wallet
+        :param shards: Number of shards
+        :returns: Balance of the wallet or None if it does not exist
+        """
+
+        balance: Optional[Decimal] = await self._fetch_val_compiled(
+            SET_BALANCE_SHARDS_QUERY, wallet_id=wallet_id, shards=shards
+        )
+        return balance
+
+    async def get_balance_at(self, wallet_id: int, at: datetime) -> Optional[Decimal]:
+        """
+        Compute balance of the wallet at given moment.
+
+        :param wallet_id: ID of wallet
+        :param at: Moment of time (operations created at it are included)
+        :returns: Balance or None if wallet does not exist
+        """
+
+        balance: Optional[Decimal] = await self._fetch_val_compiled(
+            BALANCE_AT_QUERY, wallet_id=wallet_id, at=at
+        )
+        return balance
+
+    async def take_balance_snapshots(
+        self, taken_at: datetime, after_wallet_id: int, limit: int
+    ) -> Tuple[Optional[int], int]:
+        """
+        Snapshot balances of the chunk of wallets ordered by id.
+
+        :param taken_at: Moment of the snapshot
+        :param after_wallet_id: Chunk starts after the wallet with this ID
+        :param limit: Size of the chunk
+        :returns: ID of the last wallet of the chunk and number of written snapshots
+        """
+
+        result = await self._fetch_one_compiled(
+            TAKE_SNAPSHOTS_QUERY, taken_at=taken_at, after_wallet_id=after_wallet_id, limit=limit
+        )
+        assert result is not None, "Aggregate query returns a row"
+        return result["last_wallet_id"], result["snapshots"]
+
+
+class AsyncpgWalletRepository(BaseAsyncpgRepository, AbstractWalletRepository):
+    """Implementation of wallet repository on raw asyncpg pool."""
+
+    async def get_by_id(self, wallet_id: int) -> Optional[WalletEntity]:
+        """
+        Retrieve wallet record by wallet id.
+
+        :param wallet_id: ID of use
+        :returns: Wallet schema
+        """
+
+        wallet = await self._fetch_one(WALLET_BY_ID_QUERY, wallet_id=wallet_id)
+        if wallet:
+            return WalletEntity(**wallet)
+
+        return None
+
+    async def get_by_ids(self, wallet_ids: List[int]) -> List[WalletEntity]:
+        """
+        Retrieve wallet records by wallet ids.
+
+        :param wallet_ids: IDs of wallets
+        :returns: List of existing wallets
+        """
+
+        rows = await self._fetch_all(WALLETS_BY_IDS_QUERY, wallet_ids=list(wallet_ids))
+        return [WalletEntity(**row) for row in rows]
+
+    async def get_by_user_id(self, user_id: int) -> Optional[WalletEntity]:
+        """
+        Retrieve wallet record by user id.
+
+        :param user_id: ID of use
+        :returns: Wallet schema
+        """
+
+        wallet = await self._fetch_one(WALLET_BY_USER_ID_QUERY, user_id=user_id)
+        if wallet:
+            return WalletEntity(**wallet)
+
+        return None
+
+    async def create(self, user_id: int) -> int:
+        """
+        Create new wallet with user ID
+
+        :param user_id: ID of user
+        :returns: ID of new wallet
+        """
+
+        wallet_id: int = await self._fetch_val(CREATE_WALLET_QUERY, user_id=user_id)
         return wallet_id
+
+    async def create_many(self, user_ids: List[int]) -> List[int]:
+        """
+        Create wallets for several users with one statement.
+
+        :param user_ids: IDs of users
+        :returns: IDs of new wallets
+        """
+
+        if not user_ids:
+            return []
+
+        rows = await self._fetch_all(CREATE_WALLETS_QUERY, user_ids=user_ids)
+        return [row["id"] for row in rows]
+
+    async def enroll(self, wallet_id: int, amount: Decimal) -> Optional[int]:
+        """
+        Put given funds on wallet
+
+        :param wallet_id: ID of wallet
+        :param amount: Initial funds
+        :returns: ID of updated wallet or None if it does not exist
+        """
+
+        balance = await self._fetch_val(CHANGE_BALANCE_QUERY, wallet_id=wallet_id, delta=amount)
+        return wallet_id if balance is not None else None
+
+    async def update_balances(self, deltas: Dict[int, Decimal]) -> List[int]:
+        """
+        Change balances of several wallets with one statement.
+
+        :param deltas: Mapping of wallet id to the balance change
+        :returns: IDs of updated wallets
+        """
+
+        if not deltas:
+            return []
+
+        rows = await self._fetch_all(
+            UPDATE_BALANCES_QUERY, wallet_ids=list(deltas), deltas=list(deltas.values())
+        )
+        return [row["id"] for row in rows if row["balance"] is not None]
+
+    async def enroll_with_operation(self, user_id: int, amount: Decimal) -> Optional[User]:
+        """
+        Put given funds on user's wallet and write wallet operation
+        within a single statement.
+
+        :param user_id: ID of wallet's owner
+        :param amount: Funds for enrollment
+        :returns: User entity or None if user's wallet does not exist
+        """
+
+        result = await self._fetch_one(ENROLL_WITH_OPERATION_QUERY, user_id=user_id, amount=amount)
+        if not result:
+            return None
+
+        return _owner_from_result(result)
+
+    async def transfer(
+        self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
+    ) -> int:
+        """
+        Transfer amount of currency between wallets.
+
+        :param source_wallet_id: ID of source wallet
+        :param destination_wallet_id: ID of wallet recepients
+        :param amount: Amount of currency
+        :returns: Source wallet id
+        """
+
+        balance = await self._fetch_val(
+            CHANGE_BALANCE_QUERY, wallet_id=source_wallet_id, delta=-amount
+        )
+        if balance is None:
+            raise ValueError("Source wallet id does not exist")
+        await self._fetch_val(CHANGE_BALANCE_QUERY, wallet_id=destination_wallet_id, delta=amount)
+        return source_wallet_id
+
+    async def transfer_with_operations(
+        self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
+    ) -> User:
+        """
+        Transfer amount of currency between wallets and write wallet operations
+        within a single statement.
+
+        :param source_wallet_id: ID of source wallet
+        :param destination_wallet_id: ID of wallet recepients
+        :param amount: Amount of currency
+        :returns: Owner of source wallet
+        """
+
+        if source_wallet_id == destination_wallet_id:
+            raise ValueError("Source and destination wallets must not be equal")
+
+        result = await self._fetch_one(
+            TRANSFER_WITH_OPERATIONS_QUERY,
+            source_wallet_id=source_wallet_id,
+            destination_wallet_id=destination_wallet_id,
+            amount=amount,
+        )
+        _check_transfer_result(result)
+        return _owner_from_result(result)
+
+    async def set_balance_shards(self, wallet_id: int, shards: int) -> Optional[Decimal]:
+        """
+        Split balance of the wallet into given number of shards.
+
+        :param wallet_id: ID of wallet
+        :param shards: Number of shards
+        :returns: Balance of the wallet or None if it does not exist
+        """
+
+        balance: Optional[Decimal] = await self._fetch_val(
+            SET_BALANCE_SHARDS_QUERY, wallet_id=wallet_id, shards=shards
+        )
+        return balance
+
+    async def get_balance_at(self, wallet_id: int, at: datetime) -> Optional[Decimal]:
+        """
+        Compute balance of the wallet at given moment.
+
+        :param wallet_id: ID of wallet
+        :param at: Moment of time (operations created at it are included)
+        :returns: Balance or None if wallet does not exist
+        """
+
+        balance: Optional[Decimal] = await self._fetch_val(
+            BALANCE_AT_QUERY, wallet_id=wallet_id, at=at
+        )
+        return balance
+
+    async def take_balance_snapshots(
+        self, taken_at: datetime, after_wallet_id: int, limit: int
+    ) -> Tuple[Optional[int], int]:
+        """
+        Snapshot balances of the chunk of wallets ordered by id.
+
+        :param taken_at: Moment of the snapshot
+        :param after_wallet_id: Chunk starts after the wallet with this ID
+        :param limit: Size of the chunk
+        :returns: ID of the last wallet of the chunk and number of written snapshots
+        """
+
+        result = await self._fetch_one(
+            TAKE_SNAPSHOTS_QUERY, taken_at=taken_at, after_wallet_id=after_wallet_id, limit=limit
+        )
+        assert result is not None, "Aggregate query returns a row"
+        return result["last_wallet_id"], result["snapshots"]
@@ -1,11 +1,178 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional
 
+import sqlalchemy as sa
+from asyncpg import Record
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.adapters.sql.compiled import CompiledQuery
 from app.adapters.sql.models import wallet_operations
-from app.entities.wallet_operation import Operations
+from app.entities.wallet_operation import CreateWalletOperation, Operations, WalletOperationEntity
+
+from .base import BaseAsyncpgRepository, BaseRepository
+
+CREATE_OPERATION_QUERY = CompiledQuery(
+    wallet_operations.insert()
+    .values(
+        {
+            "operation": sa.bindparam("operation"),
+            "wallet_from": sa.bindparam("wallet_from"),
+            "wallet_to": sa.bindparam("wallet_to"),
+            "amount": sa.bindparam("amount"),
+        }
+    )
+    .returning(wallet_operations.c.id)
+)
+_operations_rows = (
+    sa.func.unnest(
+        sa.bindparam("operations", type_=ARRAY(sa.String)),
+        sa.bindparam("wallets_from", type_=ARRAY(sa.Integer)),
+        sa.bindparam("wallets_to", type_=ARRAY(sa.Integer)),
+        sa.bindparam("amounts", type_=ARRAY(wallet_operations.c.amount.type)),
+    )
+    .table_valued("operation", "wallet_from", "wallet_to", "amount")
+    .render_derived(name="operations")
+)
+CREATE_OPERATIONS_QUERY = CompiledQuery(
+    wallet_operations.insert()
+    .from_select(
+        ["operation", "wallet_from", "wallet_to", "amount"],
+        sa.select(
+            [
+                _operations_rows.c.operation,
+                _operations_rows.c.wallet_from,
+                _operations_rows.c.wallet_to,
+                _operations_rows.c.amount,
+            ]
+        ),
+    )
+    .returning(wallet_operations.c.id)
+)
+
+
+def _create_operations_values(operations: List[CreateWalletOperation]) -> dict:
+    """Return columns of wallet operations as arrays."""
+
+    return {
+        "operations": [operation.operation.value for operation in operations],
+        "wallets_from": [operation.wallet_from for operation in operations],
+        "wallets_to": [operation.wallet_to for operation in operations],
+        "amounts": [operation.amount for operation in operations],
+    }
+
+
+# Conditions of the optional filters by names of their bind parameters
+_FILTERS = {
+    "cursor": lambda param: wallet_operations.c.id < param,
+    "operation": lambda param: wallet_operations.c.operation == param,
+    "amount_min": lambda param: wallet_operations.c.amount >= param,
+    "amount_max": lambda param: wallet_operations.c.amount <= param,
+    # Time range lets postgres skip partitions of other months
+    "created_from": lambda param: wallet_operations.c.created_at >= param,
+    "created_to": lambda param: wallet_operations.c.created_at < param,
+}
+
+
+def _by_wallet(wallet_id: sa.sql.ColumnElement) -> sa.sql.ColumnElement:
+    """Return condition of operations of the wallet."""
+
+    return sa.or_(
+        wallet_operations.c.wallet_from == wallet_id, wallet_operations.c.wallet_to == wallet_id
+    )
+
+
+@lru_cache(maxsize=None)
+def _list_by_wallet_query(filters: frozenset) -> CompiledQuery:
+    """
+    Return compiled query of wallet operations with given filters.
+
+    Only the set of filters changes the SQL, so there is one query per combination.
+
+    :param filters: Names of filters (bind parameters) used by the query
+    :returns: Compiled query
+    """
+
+    wallet_id = sa.bindparam("wallet_id", type_=sa.Integer)
+    query = (
+        wallet_operations.select()
+        .where(_by_wallet(wallet_id))
+        .order_by(wallet_operations.c.id.desc())
+        .limit(sa.bindparam("limit", type_=sa.Integer))
+    )
+    for name, condition in _FILTERS.items():
+        if name in filters:
+            query = query.where(condition(sa.bindparam(name)))
+    return CompiledQuery(query)
 
-from .base import BaseRepository
+
+@lru_cache(maxsize=None)
+def _export_by_wallet_query(filters: frozenset) -> CompiledQuery:
+    """
+    Return compiled query of all wallet operations within time range, from oldest to newest.
+
+    :param filters: Names of time filters (bind parameters) used by the query
+    :returns: Compiled query
+    """
+
+    query = (
+        wallet_operations.select()
+        .where(_by_wallet(sa.bindparam("wallet_id", type_=sa.Integer)))
+        .order_by(wallet_operations.c.id)
+    )
+    for name in ("created_from", "created_to"):
+        if name in filters:
+            query = query.where(_FILTERS[name](sa.bindparam(name)))
+    return CompiledQuery(query)
+
+
+def _export_by_wallet_values(
+    wallet_id: int, created_from: Optional[datetime], created_to: Optional[datetime]
+) -> dict:
+    """Return values of the time filters which are set."""
+
+    filters = {"created_from": created_from, "created_to": created_to}
+    values = {name: value for name, value in filters.items() if value is not None}
+    return {"wallet_id": wallet_id, **values}
+
+
+def _operation_from_row(row: Record) -> WalletOperationEntity:
+    """Build wallet operation from the row without validation (rows of the table are valid)."""
+
+    return WalletOperationEntity.construct(
+        id=row["id"],
+        operation=Operations(row["operation"]),
+        wallet_from=row["wallet_from"],
+        wallet_to=row["wallet_to"],
+        amount=row["amount"],
+        created_at=row["created_at"],
+    )
+
+
+def _list_by_wallet_values(
+    wallet_id: int,
+    limit: int,
+    cursor: Optional[int],
+    operation: Optional[Operations],
+    amount_min: Optional[Decimal],
+    amount_max: Optional[Decimal],
+    created_from: Optional[datetime],
+    created_to: Optional[datetime],
+) -> dict:
+    """Return values of the filters which are set."""
+
+    filters = {
+        "cursor": cursor,
+        "operation": operation.value if operation is not None else None,
+        "amount_min": amount_min,
+        "amount_max": amount_max,
+        "created_from": created_from,
+        "created_to": created_to,
+    }
+    values = {name: value for name, value in filters.items() if value is not None}
+    return {"wallet_id": wallet_id, "limit": limit, **values}
 
 
 class AbstractWalletOperationRepository(ABC):
@@ -31,6 +198,66 @@ class AbstractWalletOperationRepository(ABC):
         """
         ...
 
+    @abstractmethod
+    async def create_many(self, operations: List[CreateWalletOperation]) -> List[int]:
+        """
+        Creates several wallet operations with one statement.
+
+        :param operations: Parameters of wallet operations
+        :returns: IDs of new SQL rows
+        """
+        ...
+
+    @abstractmethod
+    async def list_by_wallet(
+        self,
+        wallet_id: int,
+        *,
+        limit: int,
+        cursor: Optional[int] = None,
+        operation: Optional[Operations] = None,
+        amount_min: Optional[Decimal] = None,
+        amount_max: Optional[Decimal] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> List[WalletOperationEntity]:
+        """
+        Receive operations of the wallet, ordered from newest to oldest.
+
+        :param wallet_id: ID of wallet
+        :param limit: Maximum number of operations
+        :param cursor: ID of operation to continue after (exclusive)
+        :param operation: Name of operation
+        :param amount_min: Minimal amount of operation (inclusive)
+        :param amount_max: Maximal amount of operation (inclusive)
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: List of wallet operations
+        """
+        ...
+
+    @abstractmethod
+    def iterate_by_wallet(
+        self,
+        wallet_id: int,
+        *,
+        chunk_size: int,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> AsyncIterator[List[WalletOperationEntity]]:
+        """
+        Stream all operations of the wallet in chunks, ordered from oldest to newest.
+
+        Rows are read with server-side cursor, so only one chunk is kept in memory.
+
+        :param wallet_id: ID of wallet
+        :param chunk_size: Number of operations fetched at once
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: Iterator over lists of wallet operations
+        """
+        ...
+
 
 class WalletOperationRepository(BaseRepository, AbstractWalletOperationRepository):
     """Implementation of AbstractWalletOperationRepository interface."""
@@ -53,17 +280,200 @@ class WalletOperationRepository(BaseRepository, AbstractWalletOperationRepositor
         :returns: ID of new SQL row
         """
 
-        operations_query = (
-            wallet_operations.insert()
-            .values(
-                {
-                    "operation": operation.value,
-                    "wallet_from": wallet_from,
-                    "wallet_to": wallet_to,
-                    "amount": amount,
-                }
-            )
-            .returning(wallet_operations.c.id)
+        wallet_operation_id: int = await self._fetch_val_compiled(
+            CREATE_OPERATION_QUERY,
+            operation=operation.value,
+            wallet_from=wallet_from,
+            wallet_to=wallet_to,
+            amount=amount,
         )
-        wallet_operation_id: int = await self._db.execute(operations_query)
         return wallet_operation_id
+
+    async def create_many(self, operations: List[CreateWalletOperation]) -> List[int]:
+        """
+        Creates several wallet operations with one statement.
+
+        :param operations: Parameters of wallet operations
+        :returns: IDs of new SQL rows
+        """
+
+        if not operations:
+            return []
+
+        rows = await self._fetch_all_compiled(
+            CREATE_OPERATIONS_QUERY, **_create_operations_values(operations)
+        )
+        return [row["id"] for row in rows]
+
+    async def list_by_wallet(
+        self,
+        wallet_id: int,
+        *,
+        limit: int,
+        cursor: Optional[int] = None,
+        operation: Optional[Operations] = None,
+        amount_min: Optional[Decimal] = None,
+        amount_max: Optional[Decimal] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> List[WalletOperationEntity]:
+        """
+        Receive operations of the wallet, ordered from newest to oldest.
+
+        :param wallet_id: ID of wallet
+        :param limit: Maximum number of operations
+        :param cursor: ID of operation to continue after (exclusive)
+        :param operation: Name of operation
+        :param amount_min: Minimal amount of operation (inclusive)
+        :param amount_max: Maximal amount of operation (inclusive)
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: List of wallet operations
+        """
+
+        values = _list_by_wallet_values(
+            wallet_id,
+            limit,
+            cursor,
+            operation,
+            amount_min,
+            amount_max,
+            created_from,
+            created_to,
+        )
+        query = _list_by_wallet_query(frozenset(values))
+        rows = await self._fetch_all_compiled(query, **values)
+        return [WalletOperationEntity(**row) for row in rows]
+
+    async def iterate_by_wallet(
+        self,
+        wallet_id: int,
+        *,
+        chunk_size: int,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> AsyncIterator[List[WalletOperationEntity]]:
+        """
+        Stream all operations of the wallet in chunks, ordered from oldest to newest.
+
+        :param wallet_id: ID of wallet
+        :param chunk_size: Number of operations fetched at once
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: Iterator over lists of wallet operations
+        """
+
+        values = _export_by_wallet_values(wallet_id, created_from, created_to)
+        query = _export_by_wallet_query(frozenset(values))
+        async for rows in self._iterate_compiled(query, chunk_size, **values):
+            yield [_operation_from_row(row) for row in rows]
+
+
+class AsyncpgWalletOperationRepository(BaseAsyncpgRepository, AbstractWalletOperationRepository):
+    """Implementation of AbstractWalletOperationRepository interface on raw asyncpg pool."""
+
+    async def create(
+        self,
+        *,
+        operation: Operations,
+        amount: Decimal,
+        wallet_from: int = None,
+        wallet_to: int = None,
+    ) -> int:
+        """
+        Creates new wallet operation instance.
+
+        :param operation: Name of operation
+        :param amount: Funds value
+        :param wallet_from: ID of source wallet
+        :param wallet_to: ID of target wallet
+        :returns: ID of new SQL row
+        """
+
+        wallet_operation_id: int = await self._fetch_val(
+            CREATE_OPERATION_QUERY,
+            operation=operation.value,
+            wallet_from=wallet_from,
+            wallet_to=wallet_to,
+            amount=amount,
+        )
+        return wallet_operation_id
+
+    async def create_many(self, operations: List[CreateWalletOperation]) -> List[int]:
+        """
+        Creates several wallet operations with one statement.
+
+        :param operations: Parameters of wallet operations
+        :returns: IDs of new SQL rows
+        """
+
+        if not operations:
+            return []
+
+        rows = await self._fetch_all(
+            CREATE_OPERATIONS_QUERY, **_create_operations_values(operations)
+        )
+        return [row["id"] for row in rows]
+
+    async def list_by_wallet(
+        self,
+        wallet_id: int,
+        *,
+        limit: int,
+        cursor: Optional[int] = None,
+        operation: Optional[Operations] = None,
+        amount_min: Optional[Decimal] = None,
+        amount_max: Optional[Decimal] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> List[WalletOperationEntity]:
+        """
+        Receive operations of the wallet, ordered from newest to oldest.
+
+        :param wallet_id: ID of wallet
+        :param limit: Maximum number of operations
+        :param cursor: ID of operation to continue after (exclusive)
+        :param operation: Name of operation
+        :param amount_min: Minimal amount of operation (inclusive)
+        :param amount_max: Maximal amount of operation (inclusive)
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: List of wallet operations
+        """
+
+        values = _list_by_wallet_values(
+            wallet_id,
+            limit,
+            cursor,
+            operation,
+            amount_min,
+            amount_max,
+            created_from,
+            created_to,
+        )
+        query = _list_by_wallet_query(frozenset(values))
+        rows = await self._fetch_all(query, **values)
+        return [WalletOperationEntity(**row) for row in rows]
+
+    async def iterate_by_wallet(
+        self,
+        wallet_id: int,
+        *,
+        chunk_size: int,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> AsyncIterator[List[WalletOperationEntity]]:
+        """
+        Stream all operations of the wallet in chunks, ordered from oldest to newest.
+
+        :param wallet_id: ID of wallet
+        :param chunk_size: Number of operations fetched at once
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: Iterator over lists of wallet operations
+        """
+
+        values = _export_by_wallet_values(wallet_id, created_from, created_to)
+        query = _export_by_wallet_query(frozenset(values))
+        async for rows in self._iterate(query, chunk_size, **values):
+            yield [_operation_from_row(row) for row in rows]
@@ -5,4 +5,41 @@ APP_PORT = int(os.environ.get("APP_PORT", 8080))
 APP_HOME = str(os.environ.get("APP_HOME", "."))
 APP_RELOAD = bool(int(os.environ.get("APP_RELOAD", "1")))
 BILLING_DB_DSN = os.environ.get("BILLING_DB_DSN", "")
+BILLING_REPLICA_DB_DSN = os.environ.get("BILLING_REPLICA_DB_DSN", "")
+REPLICA_MAX_STALENESS = float(os.environ.get("REPLICA_MAX_STALENESS", 1))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", 1))
+DB_DRIVER = os.environ.get("DB_DRIVER", "databases")
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 10))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.environ.get("DB_POOL_MAX_INACTIVE_LIFETIME", 300))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+DB_COMMAND_TIMEOUT = float(os.environ.get("DB_COMMAND_TIMEOUT", 0)) or None
 FORCE_ROLLBACK_TRANSACTION = bool(int(os.environ.get("FORCE_ROLLBACK_TRANSACTION", 0)))
+LOCK_TIMEOUT_MS = int(os.environ.get("LOCK_TIMEOUT_MS", 5000))
+LOCK_RETRIES = int(os.environ.get("LOCK_RETRIES", 2))
+TX_RETRIES = int(os.environ.get("TX_RETRIES", 3))
+TX_RETRY_BASE_DELAY_MS = int(os.environ.get("TX_RETRY_BASE_DELAY_MS", 10))
+TX_RETRY_MAX_DELAY_MS = int(os.environ.get("TX_RETRY_MAX_DELAY_MS", 500))
+WALLET_WRITE_STRATEGY = os.environ.get("WALLET_WRITE_STRATEGY", "queries")
+ENROLL_BATCH_MAX_DELAY_MS = int(os.environ.get("ENROLL_BATCH_MAX_DELAY_MS", 0))
+ENROLL_BATCH_MAX_SIZE = int(os.environ.get("ENROLL_BATCH_MAX_SIZE", 100))
+WALLET_OPERATIONS_PARTITIONS_AHEAD = int(os.environ.get("WALLET_OPERATIONS_PARTITIONS_AHEAD", 3))
+BALANCE_CACHE_ENABLED = bool(int(os.environ.get("BALANCE_CACHE_ENABLED", 0)))
+BALANCE_CACHE_TTL = float(os.environ.get("BALANCE_CACHE_TTL", 5))
+BALANCE_CACHE_MAX_ENTRIES = int(os.environ.get("BALANCE_CACHE_MAX_ENTRIES", 10000))
+BALANCE_CACHE_MAX_BYTES = int(os.environ.get("BALANCE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+BALANCE_CACHE_LISTENER_RECONNECT_DELAY = float(
+    os.environ.get("BALANCE_CACHE_LISTENER_RECONNECT_DELAY", 1)
+)
+BALANCE_CACHE_LISTENER_KEEPALIVE = float(os.environ.get("BALANCE_CACHE_LISTENER_KEEPALIVE", 30))
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+IDEMPOTENCY_PRUNE_BATCH_SIZE = int(os.environ.get("IDEMPOTENCY_PRUNE_BATCH_SIZE", 1000))
+IDEMPOTENCY_CACHE_TTL = float(os.environ.get("IDEMPOTENCY_CACHE_TTL", 300))
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_CACHE_MAX_ENTRIES", 10000))
+IDEMPOTENCY_CACHE_MAX_BYTES = int(os.environ.get("IDEMPOTENCY_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+OUTBOX_RELAY_BATCH_SIZE = int(os.environ.get("OUTBOX_RELAY_BATCH_SIZE", 500))
+OUTBOX_RELAY_POLL_INTERVAL = float(os.environ.get("OUTBOX_RELAY_POLL_INTERVAL", 1))
+BALANCE_SNAPSHOTS_CHUNK_SIZE = int(os.environ.get("BALANCE_SNAPSHOTS_CHUNK_SIZE", 1000))
+BALANCE_SNAPSHOTS_SETTLE_SECONDS = float(os.environ.get("BALANCE_SNAPSHOTS_SETTLE_SECONDS", 60))
+RECONCILIATION_CHUNK_SIZE = int(os.environ.get("RECONCILIATION_CHUNK_SIZE", 10000))
+RECONCILIATION_SETTLE_SECONDS = float(os.environ.get("RECONCILIATION_SETTLE_SECONDS", 60))
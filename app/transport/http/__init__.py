@@ -1,7 +1,10 @@
 from fastapi import APIRouter
 
-from .api import users_routes, wallets_routes
+from .api import metrics_routes, users_routes, wallets_routes
+from .responses import FastJSONResponse
 
-api_router = APIRouter(prefix="/api")
+# Models returned by handlers are rendered by orjson without revalidation
+api_router = APIRouter(prefix="/api", default_response_class=FastJSONResponse)
 api_router.include_router(users_routes)
 api_router.include_router(wallets_routes)
+api_router.include_router(metrics_routes)
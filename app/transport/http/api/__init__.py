@@ -1,4 +1,5 @@
+from .metrics import router as metrics_routes
 from .users import router as users_routes
 from .wallet import router as wallets_routes
 
-__all__ = ["users_routes", "wallets_routes"]
+__all__ = ["metrics_routes", "users_routes", "wallets_routes"]
@@ -0,0 +1,34 @@
+from typing import Optional
+
+from fastapi import APIRouter, Request, status
+
+from app.adapters.cache import BalanceCache
+from app.adapters.sql.tx import AbstractTransactionManager
+from app.transport.http.responses import ModelRoute
+from app.usecases.wallet import WalletUsecase
+
+router = APIRouter(prefix="/metrics", tags=["metrics"], route_class=ModelRoute)
+
+
+@router.get("/transactions", status_code=status.HTTP_200_OK)
+async def transactions_metrics(request: Request) -> dict:
+    """Counters of retried transactions (by SQLSTATE of the failure)."""
+
+    tx_manager: AbstractTransactionManager = request.app.state.tx_manager
+    return tx_manager.retry_metrics.as_dict()
+
+
+@router.get("/cache", status_code=status.HTTP_200_OK)
+async def cache_metrics(request: Request) -> dict:
+    """Counters and sizes of the balance cache (empty if cache is disabled)."""
+
+    balance_cache: Optional[BalanceCache] = request.app.state.balance_cache
+    return balance_cache.metrics() if balance_cache else {}
+
+
+@router.get("/enrollments", status_code=status.HTTP_200_OK)
+async def enrollments_metrics(request: Request) -> dict:
+    """Counters of batched enrollments (empty if batching is disabled)."""
+
+    usecase: WalletUsecase = request.app.state.wallet_usecase
+    return usecase.coalescer.metrics.as_dict() if usecase.coalescer else {}
@@ -1,13 +1,18 @@
+from typing import Optional
+
 import asyncpg
-from fastapi import APIRouter, HTTPException, Request, status
+from fastapi import APIRouter, Header, HTTPException, Request, status
 from pydantic.error_wrappers import ValidationError
 
-from app.entities.user import CreateUser, User, UserDoesNotExist
+from app.adapters.sql.tx import LockNotAcquired, TransactionRetriesExhausted
+from app.entities.idempotency import IdempotencyKeyReused
+from app.entities.user import CreateUser, CreateUsers, CreateUsersResult, User, UserDoesNotExist
 from app.entities.wallet import WalletEnrollParams
+from app.transport.http.responses import ModelRoute
 from app.usecases.user import UserUsecase
 from app.usecases.wallet import WalletUsecase
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=ModelRoute)
 
 
 @router.post("", response_model=User, status_code=status.HTTP_201_CREATED)
@@ -28,10 +33,40 @@ async def create_user(request: Request, params: CreateUser) -> User:
         raise (
             HTTPException(status_code=400, detail="Error of wallet's creation.")
         ) from not_null_exception
+    except (LockNotAcquired, TransactionRetriesExhausted) as busy_err:
+        raise HTTPException(status_code=503, detail=str(busy_err)) from busy_err
+
+
+@router.get("/{user_id}", response_model=User, status_code=status.HTTP_200_OK)
+async def get_user(request: Request, user_id: int) -> User:
+    """Receives user with balance of its wallet (possibly from replica)."""
+
+    try:
+        usecase: UserUsecase = request.app.state.user_usecase
+        return await usecase.get(user_id)
+    except UserDoesNotExist as user_not_exist:
+        raise HTTPException(status_code=404, detail="User does not exists") from user_not_exist
+
+
+@router.post(":bulk", response_model=CreateUsersResult, status_code=status.HTTP_200_OK)
+async def create_users(request: Request, params: CreateUsers) -> CreateUsersResult:
+    """Creates several users and their wallets."""
+
+    try:
+        usecase: UserUsecase = request.app.state.user_usecase
+        results = await usecase.create_many([user.email for user in params.users])
+        return CreateUsersResult(results=results)
+    except (LockNotAcquired, TransactionRetriesExhausted) as busy_err:
+        raise HTTPException(status_code=503, detail=str(busy_err)) from busy_err
 
 
 @router.put("/{user_id}/enroll", response_model=User, status_code=status.HTTP_200_OK)
-async def enroll(request: Request, user_id: int, params: WalletEnrollParams):
+async def enroll(
+    request: Request,
+    user_id: int,
+    params: WalletEnrollParams,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
     """API handler for enrollment of wallet."""
 
     try:
@@ -39,10 +74,15 @@ async def enroll(request: Request, user_id: int, params: WalletEnrollParams):
         user = await usecase.enroll(
             user_id=user_id,
             amount=params.amount,
+            idempotency_key=idempotency_key,
         )
         return user
     except UserDoesNotExist as user_not_exist:
         raise HTTPException(status_code=404, detail="User does not exists") from user_not_exist
+    except IdempotencyKeyReused as key_reused:
+        raise HTTPException(status_code=422, detail=str(key_reused)) from key_reused
+    except (LockNotAcquired, TransactionRetriesExhausted) as busy_err:
+        raise HTTPException(status_code=503, detail=str(busy_err)) from busy_err
     except AssertionError as assert_err:
         raise HTTPException(status_code=400, detail="Balance was not updated") from assert_err
     except ValidationError as validation_err:
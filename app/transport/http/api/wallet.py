@@ -1,14 +1,35 @@
-from fastapi import APIRouter, HTTPException, Request, status
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
 
+from fastapi import APIRouter, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.adapters.export import MEDIA_TYPES, ExportFormats, gzip_stream, serialize_operations
+from app.adapters.sql.tx import LockNotAcquired, TransactionRetriesExhausted
+from app.entities.idempotency import IdempotencyKeyReused
 from app.entities.user import User, UserDoesNotExist
-from app.entities.wallet import WalletDoesNotExist, WalletTransferParams
+from app.entities.wallet import (
+    WalletBalance,
+    WalletBatchTransferParams,
+    WalletBatchTransferResult,
+    WalletDoesNotExist,
+    WalletEntity,
+    WalletTransferParams,
+)
+from app.entities.wallet_operation import MAX_OPERATIONS_PAGE_SIZE, Operations, WalletOperationsPage
+from app.transport.http.responses import ModelRoute
 from app.usecases.wallet import WalletUsecase
 
-router = APIRouter(prefix="/wallets", tags=["wallets"])
+router = APIRouter(prefix="/wallets", tags=["wallets"], route_class=ModelRoute)
 
 
 @router.post("/transfer", response_model=User, status_code=status.HTTP_200_OK)
-async def transfer(request: Request, params: WalletTransferParams):
+async def transfer(
+    request: Request,
+    params: WalletTransferParams,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
     """Handler for routing of funds from one wallet to another."""
 
     try:
@@ -17,6 +38,7 @@ async def transfer(request: Request, params: WalletTransferParams):
             source_wallet_id=params.wallet_from,
             destination_wallet_id=params.wallet_to,
             amount=params.amount,
+            idempotency_key=idempotency_key,
         )
         return user
     except UserDoesNotExist as user_not_exist:
@@ -29,5 +51,123 @@ async def transfer(request: Request, params: WalletTransferParams):
             status_code=404,
             detail=f"Wallet does not exists. Full error: {wallet_not_exist}",
         ) from wallet_not_exist
+    except IdempotencyKeyReused as key_reused:
+        raise HTTPException(status_code=422, detail=str(key_reused)) from key_reused
+    except (LockNotAcquired, TransactionRetriesExhausted) as busy_err:
+        raise HTTPException(status_code=503, detail=str(busy_err)) from busy_err
     except Exception as err:
         raise HTTPException(status_code=400, detail=str(err)) from err
+
+
+@router.post(
+    "/transfers:batch",
+    response_model=WalletBatchTransferResult,
+    status_code=status.HTTP_200_OK,
+)
+async def transfer_batch(request: Request, params: WalletBatchTransferParams):
+    """Handler for routing of funds between several pairs of wallets."""
+
+    try:
+        usecase: WalletUsecase = request.app.state.wallet_usecase
+        results = await usecase.transfer_many(transfers=params.transfers, mode=params.mode)
+        return WalletBatchTransferResult(mode=params.mode, results=results)
+    except (LockNotAcquired, TransactionRetriesExhausted) as busy_err:
+        raise HTTPException(status_code=503, detail=str(busy_err)) from busy_err
+
+
+@router.get("/{wallet_id}", response_model=WalletEntity, status_code=status.HTTP_200_OK)
+async def get_wallet(request: Request, wallet_id: int):
+    """Handler for receiving of wallet with its balance (possibly from replica)."""
+
+    try:
+        usecase: WalletUsecase = request.app.state.wallet_usecase
+        return await usecase.get_wallet(wallet_id)
+    except WalletDoesNotExist as wallet_not_exist:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Wallet does not exists. Full error: {wallet_not_exist}",
+        ) from wallet_not_exist
+
+
+@router.get("/{wallet_id}/balance", response_model=WalletBalance, status_code=status.HTTP_200_OK)
+async def get_balance_at(request: Request, wallet_id: int, at: datetime):
+    """Handler for receiving of wallet balance at given moment (UTC if offset is omitted)."""
+
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    try:
+        usecase: WalletUsecase = request.app.state.wallet_usecase
+        return await usecase.get_balance_at(wallet_id, at)
+    except WalletDoesNotExist as wallet_not_exist:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Wallet does not exists. Full error: {wallet_not_exist}",
+        ) from wallet_not_exist
+
+
+@router.get(
+    "/{wallet_id}/operations",
+    response_model=WalletOperationsPage,
+    status_code=status.HTTP_200_OK,
+)
+async def list_operations(
+    request: Request,
+    wallet_id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=MAX_OPERATIONS_PAGE_SIZE),
+    operation: Optional[Operations] = None,
+    amount_min: Optional[Decimal] = Query(None, ge=0),
+    amount_max: Optional[Decimal] = Query(None, ge=0),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    """Handler for receiving of wallet operations history (newest first)."""
+
+    try:
+        usecase: WalletUsecase = request.app.state.wallet_usecase
+        return await usecase.list_operations(
+            wallet_id,
+            limit=limit,
+            cursor=cursor,
+            operation=operation,
+            amount_min=amount_min,
+            amount_max=amount_max,
+            created_from=created_from,
+            created_to=created_to,
+        )
+    except WalletDoesNotExist as wallet_not_exist:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Wallet does not exists. Full error: {wallet_not_exist}",
+        ) from wallet_not_exist
+
+
+@router.get("/{wallet_id}/operations/export", response_class=StreamingResponse)
+async def export_operations(
+    request: Request,
+    wallet_id: int,
+    export_format: ExportFormats = Query(ExportFormats.CSV, alias="format"),
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """Handler for streaming export of wallet operations (oldest first) as CSV or NDJSON."""
+
+    try:
+        usecase: WalletUsecase = request.app.state.wallet_usecase
+        chunks = await usecase.export_operations(
+            wallet_id, created_from=created_from, created_to=created_to
+        )
+    except WalletDoesNotExist as wallet_not_exist:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Wallet does not exists. Full error: {wallet_not_exist}",
+        ) from wallet_not_exist
+
+    body = serialize_operations(chunks, export_format)
+    filename = f"wallet-{wallet_id}-operations.{export_format.value}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if accept_encoding and "gzip" in accept_encoding:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[export_format], headers=headers)
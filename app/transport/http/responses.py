@@ -0,0 +1,116 @@
+import asyncio
+import functools
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Coroutine, Type
+
+import orjson
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def _default(value: Any) -> Any:
+    """
+    Convert value which is not supported by JSON encoder.
+
+    Models are converted to their fields only (nested models are converted
+    by the encoder calling this function again). Decimals are rendered as
+    numbers, like FastAPI does, but with all their digits instead of going
+    through float.
+    """
+
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    if isinstance(value, Decimal):
+        return orjson.Fragment(str(value))
+    # Natively supported by orjson
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize content (including pydantic models) to JSON with orjson.
+
+    :param content: Content of the response
+    :returns: Encoded JSON
+    """
+
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ModelRoute(APIRoute):
+    """
+    Route rendering returned instance of its response model without revalidation.
+
+    FastAPI converts returned model to dict, validates it against the response
+    model again and walks the result with 'jsonable_encoder'. Entities returned by
+    usecases are valid already, so instances of exactly the response model are
+    passed to FastJSONResponse as they are, anything else goes the default way.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+
+        model = self.response_model
+        call = self.dependant.call
+        if (
+            isinstance(model, type)
+            and issubclass(model, BaseModel)
+            and isinstance(response_class, type)
+            and issubclass(response_class, FastJSONResponse)
+            and call is not None
+            and asyncio.iscoroutinefunction(call)
+            and self.response_model_include is None
+            and self.response_model_exclude is None
+            and not self.response_model_exclude_unset
+            and not self.response_model_exclude_defaults
+            and not self.response_model_exclude_none
+        ):
+            self.dependant.call = self._render_model(call, model, response_class)
+        return super().get_route_handler()
+
+    def _render_model(
+        self,
+        call: Callable[..., Any],
+        model: Type[BaseModel],
+        response_class: Type[FastJSONResponse],
+    ) -> Callable[..., Any]:
+        """
+        Wrap endpoint to return its model instances as rendered responses.
+
+        :param call: Endpoint coroutine function
+        :param model: Response model of the route
+        :param response_class: Class of the response
+        :returns: Wrapped endpoint
+        """
+
+        status_code = self.status_code
+
+        @functools.wraps(call)
+        async def endpoint(**values: Any) -> Any:
+            content = await call(**values)
+            if type(content) is model:  # pylint: disable=unidiomatic-typecheck
+                if status_code is None:
+                    return response_class(content)
+                return response_class(content, status_code=status_code)
+            return content
+
+        return endpoint
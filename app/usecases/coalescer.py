@@ -0,0 +1,116 @@
+import asyncio
+from dataclasses import dataclass
+from decimal import Decimal
+from logging import getLogger
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.entities.user import User, UserDoesNotExist
+from app.entities.wallet import WalletDeposit
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class CoalescerMetrics:
+    """Counters of the batched enrollments."""
+
+    batches: int = 0
+    deposits: int = 0
+    max_batch_size: int = 0
+
+    def as_dict(self) -> dict:
+        """Return counters as plain dictionary."""
+
+        return dict(self.__dict__)
+
+
+class EnrollCoalescer:
+    """
+    Collects concurrent enrollments and applies them in batches.
+
+    Batch is applied when 'max_size' deposits are collected or 'max_delay'
+    passed since the first of them, whichever happens first.
+    """
+
+    def __init__(
+        self,
+        apply: Callable[[List[WalletDeposit]], Awaitable[List[Optional[User]]]],
+        max_delay: int,
+        max_size: int,
+    ):
+        """
+        Overwrites default constructor.
+
+        :param apply: Function which applies deposits within one transaction
+            and returns state of the user after each of them (None if user does not exist)
+        :param max_delay: Maximal time (in milliseconds) deposit waits for the batch
+        :param max_size: Maximal number of deposits in the batch
+        """
+
+        self._apply = apply
+        self._max_delay = max_delay
+        self._max_size = max_size
+        self._pending: List[Tuple[WalletDeposit, "asyncio.Future[User]"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # References to running batches, so they are not garbage collected
+        self._batches: Set[asyncio.Task] = set()
+        self.metrics = CoalescerMetrics()
+
+    async def enroll(self, user_id: int, amount: Decimal) -> User:
+        """
+        Enroll user's wallet within the next batch.
+
+        :param user_id: ID of user
+        :param amount: Funds for enrollment
+        :returns: User entity right after this enrollment
+        """
+
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[User]" = loop.create_future()
+        self._pending.append((WalletDeposit(user_id=user_id, amount=amount), future))
+        if len(self._pending) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        """Start applying of the pending deposits."""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._apply_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _apply_batch(self, batch: List[Tuple[WalletDeposit, "asyncio.Future[User]"]]):
+        """
+        Apply deposits and resolve futures of their callers.
+
+        :param batch: Deposits and futures of their callers
+        """
+
+        self.metrics.batches += 1
+        self.metrics.deposits += len(batch)
+        self.metrics.max_batch_size = max(self.metrics.max_batch_size, len(batch))
+        try:
+            users = await self._apply([deposit for deposit, _ in batch])
+        except Exception as err:  # pylint: disable=broad-except
+            logger.info("Batch of %s enrollments failed: %s", len(batch), err)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        for (_, future), user in zip(batch, users):
+            if future.done():
+                # Caller was cancelled, but its deposit is applied
+                continue
+            if user is None:
+                future.set_exception(UserDoesNotExist("User does not exists"))
+            else:
+                future.set_result(user)
@@ -0,0 +1,105 @@
+import asyncio
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Optional
+
+from app import settings
+from app.adapters.sinks import AbstractEventSink
+from app.adapters.sql.tx import AbstractTransactionManager, IsolationLevels
+from app.repositories.outbox import AbstractOutboxRepository
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class RelayMetrics:
+    """Counters of the outbox relay."""
+
+    batches: int = 0
+    events: int = 0
+    failures: int = 0
+
+    def as_dict(self) -> dict:
+        """Return counters as plain dictionary."""
+
+        return dict(self.__dict__)
+
+
+class OutboxRelay:
+    """
+    Delivers events of the outbox to the sink in batches.
+
+    Batch is locked with 'skip locked', delivered and deleted within one
+    transaction, so several relays share the outbox without waiting
+    for each other. Delivery is at least once: batch is delivered again
+    if the transaction fails after the sink accepted it.
+    """
+
+    def __init__(
+        self,
+        tx_manager: AbstractTransactionManager,
+        outbox_repo: AbstractOutboxRepository,
+        sink: AbstractEventSink,
+        batch_size: int = settings.OUTBOX_RELAY_BATCH_SIZE,
+        poll_interval: float = settings.OUTBOX_RELAY_POLL_INTERVAL,
+    ):
+        """
+        Overwrites default constructor.
+
+        :param tx_manager: Transaction manager
+        :param outbox_repo: Outbox repository
+        :param sink: Receiver of events
+        :param batch_size: Maximal number of events delivered at once
+        :param poll_interval: Time (in seconds) to wait when outbox is drained
+        """
+
+        self.tx_manager = tx_manager
+        self.outbox_repo = outbox_repo
+        self.sink = sink
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self.metrics = RelayMetrics()
+
+    async def relay_batch(self) -> int:
+        """
+        Deliver one batch of events and delete them.
+
+        :returns: Number of delivered events
+        """
+
+        async with self.tx_manager.transaction(isolation_level=IsolationLevels.READ_COMMITTED):
+            events = await self.outbox_repo.claim(limit=self._batch_size)
+            if not events:
+                return 0
+
+            await self.sink.deliver(events)
+            await self.outbox_repo.delete(ids=[event.id for event in events])
+
+        self.metrics.batches += 1
+        self.metrics.events += len(events)
+        return len(events)
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """
+        Deliver events until stopped, waiting for new ones when outbox is drained.
+
+        :param stop: Event which stops the relay
+        """
+
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            try:
+                delivered = await self.relay_batch()
+            except Exception:  # pylint: disable=broad-except
+                self.metrics.failures += 1
+                logger.exception(
+                    "Outbox batch was not delivered, retry in %ss", self._poll_interval
+                )
+                delivered = 0
+
+            # Full batch means there are more events waiting
+            if delivered < self._batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
@@ -1,9 +1,15 @@
 from abc import ABC, abstractmethod
 from decimal import Decimal
+from functools import partial
+from typing import Dict, List, Optional
 
+from app.adapters.cache import BalanceCache
+from app.adapters.sql.replica import ReplicaMonitor
 from app.adapters.sql.tx import AbstractTransactionManager, IsolationLevels, LockID
-from app.entities.user import User, UserDoesNotExist
-from app.entities.wallet_operation import Operations
+from app.entities.outbox import CreateOutboxEvent
+from app.entities.user import CreateUserResult, User, UserDoesNotExist
+from app.entities.wallet_operation import CreateWalletOperation, Operations
+from app.repositories.outbox import AbstractOutboxRepository
 from app.repositories.users import AbstractUserRepository
 from app.repositories.wallet import AbstractWalletRepository
 from app.repositories.wallet_operations import AbstractWalletOperationRepository
@@ -22,6 +28,26 @@ class AbstractUserUsecase(ABC):
         """
         ...
 
+    @abstractmethod
+    async def get(self, user_id: int) -> User:
+        """
+        Receive user by its id.
+
+        :param user_id: ID of user
+        :returns: User entity
+        """
+        ...
+
+    @abstractmethod
+    async def create_many(self, emails: List[str]) -> List[CreateUserResult]:
+        """
+        Creates several users (and their wallets).
+
+        :param emails: Emails of users
+        :returns: Result for each of the emails
+        """
+        ...
+
 
 class UserUsecase(AbstractUserUsecase):
     """Implementation of user usecases."""
@@ -33,11 +59,41 @@ class UserUsecase(AbstractUserUsecase):
         user_repo: AbstractUserRepository,
         wallet_repo: AbstractWalletRepository,
         wallet_operation_repo: AbstractWalletOperationRepository,
+        cache: Optional[BalanceCache] = None,
+        replica: Optional[ReplicaMonitor] = None,
+        replica_user_repo: Optional[AbstractUserRepository] = None,
+        outbox_repo: Optional[AbstractOutboxRepository] = None,
     ):
         self.tx_manager = tx_manager
         self.user_repo = user_repo
         self.wallet_repo = wallet_repo
         self.wallet_operation_repo = wallet_operation_repo
+        self.cache = cache
+        self.replica = replica
+        self.replica_user_repo = replica_user_repo
+        self.outbox_repo = outbox_repo
+
+    async def get(self, user_id: int) -> User:
+        """
+        Receive user by its id (from cache or replica, if they are enabled).
+
+        :param user_id: ID of user
+        :returns: User entity
+        """
+
+        loader = partial(self.user_repo.get_by_id, user_id=user_id)
+        if self.replica and self.replica_user_repo:
+            # See 'WalletUsecase.get_wallet' for the reason of freshness check
+            loader = partial(
+                self.replica.read,
+                partial(self.replica_user_repo.get_by_id, user_id=user_id),
+                loader,
+                is_fresh=self._is_fresh,
+            )
+        user = await (self.cache.get_user(user_id, loader) if self.cache else loader())
+        if not user:
+            raise UserDoesNotExist("User does not exists")
+        return user
 
     async def create(self, email: str) -> User:
         """
@@ -47,6 +103,41 @@ class UserUsecase(AbstractUserUsecase):
         :returns: User entity
         """
 
+        return await self.tx_manager.run_with_retries(partial(self._create, email=email))
+
+    async def create_many(self, emails: List[str]) -> List[CreateUserResult]:
+        """
+        Creates several users (and their wallets).
+
+        :param emails: Emails of users
+        :returns: Result for each of the emails
+        """
+
+        unique_emails = list(dict.fromkeys(emails))
+        users = await self.tx_manager.run_with_retries(
+            partial(self._create_many, emails=unique_emails)
+        )
+
+        users_by_email: Dict[str, User] = {user.email: user for user in users}
+        results = []
+        for email in emails:
+            user = users_by_email.pop(email, None)
+            if user:
+                results.append(CreateUserResult(email=email, user=user))
+            else:
+                results.append(
+                    CreateUserResult(email=email, error="User with this email already exists.")
+                )
+        return results
+
+    async def _create(self, email: str) -> User:
+        """
+        Creates new user (and wallet) within one transaction.
+
+        :param email: User's email
+        :returns: User entity
+        """
+
         async with self.tx_manager.advisory_lock(
             lock_id=LockID.CREATE_USER,
             isolation_level=IsolationLevels.SERIALIZABLE,
@@ -65,4 +156,55 @@ class UserUsecase(AbstractUserUsecase):
             user = await self.user_repo.get_by_id(user_id=user_id)
             if not user:
                 raise UserDoesNotExist("User does not exists")
+            await self._publish([user])
             return user
+
+    async def _create_many(self, emails: List[str]) -> List[User]:
+        """
+        Creates several users (and their wallets) within one transaction.
+
+        :param emails: Unique emails of users
+        :returns: Created users
+        """
+
+        async with self.tx_manager.advisory_lock(
+            lock_id=LockID.CREATE_USER,
+            isolation_level=IsolationLevels.SERIALIZABLE,
+        ):
+            # Creates new users, already taken emails are skipped
+            created_users = await self.user_repo.create_many(emails=emails)
+            user_ids = [user.id for user in created_users]
+            # Creates wallets for users
+            wallet_ids = await self.wallet_repo.create_many(user_ids=user_ids)
+            # Creates wallet operation instances for 'Create' operation
+            await self.wallet_operation_repo.create_many(
+                operations=[
+                    CreateWalletOperation(
+                        operation=Operations.CREATE,
+                        wallet_from=None,
+                        wallet_to=wallet_id,
+                        amount=Decimal("0"),
+                    )
+                    for wallet_id in wallet_ids
+                ]
+            )
+            users = await self.user_repo.get_by_ids(user_ids=user_ids)
+            await self._publish(users)
+            return users
+
+    async def _publish(self, users: List[User]):
+        """
+        Write events of created users to outbox within the transaction of the write.
+
+        :param users: Created users
+        """
+
+        if self.outbox_repo:
+            await self.outbox_repo.add_many(
+                events=[CreateOutboxEvent.from_user(user) for user in users]
+            )
+
+    def _is_fresh(self, user: User) -> bool:
+        """Whether user read from replica can be used (and cached)."""
+
+        return not (self.cache and self.cache.changed_recently(user.wallet_id))
@@ -1,42 +1,188 @@
+import hashlib
+import json
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
 from decimal import Decimal
+from enum import Enum
+from functools import partial
+from typing import AsyncIterator, DefaultDict, Dict, Iterable, List, Optional
 
-from app.adapters.sql.tx import AbstractTransactionManager, IsolationLevels, LockID
+from app.adapters.cache import BalanceCache, LRUCache
+from app.adapters.sql.replica import ReplicaMonitor
+from app.adapters.sql.tx import AbstractTransactionManager, IsolationLevels
+from app.entities.idempotency import IdempotencyKeyReused, IdempotencyRecord
+from app.entities.outbox import CreateOutboxEvent
 from app.entities.user import User, UserDoesNotExist
-from app.entities.wallet import WalletDoesNotExist
-from app.entities.wallet_operation import Operations
+from app.entities.wallet import (
+    MAX_BALANCE_SHARDS,
+    TransferBatchModes,
+    WalletBalance,
+    WalletDeposit,
+    WalletDoesNotExist,
+    WalletEntity,
+    WalletTransferParams,
+    WalletTransferResult,
+)
+from app.entities.wallet_operation import (
+    MAX_OPERATIONS_PAGE_SIZE,
+    OPERATIONS_EXPORT_CHUNK_SIZE,
+    CreateWalletOperation,
+    Operations,
+    WalletOperationEntity,
+    WalletOperationsPage,
+)
+from app.repositories.idempotency import AbstractIdempotencyKeyRepository
+from app.repositories.outbox import AbstractOutboxRepository
 from app.repositories.users import AbstractUserRepository
 from app.repositories.wallet import AbstractWalletRepository
 from app.repositories.wallet_operations import AbstractWalletOperationRepository
+from app.usecases.coalescer import EnrollCoalescer
+
+
+class WriteStrategy(Enum):
+    """Possible implementations of wallet writes (enroll and transfer)."""
+
+    QUERIES = "queries"
+    STATEMENT = "statement"
 
 
 class AbstractWalletUsecase(ABC):
     """Interface for wallet usecases"""
 
     @abstractmethod
-    async def enroll(self, user_id: int, amount: Decimal) -> User:
+    async def enroll(
+        self, user_id: int, amount: Decimal, idempotency_key: Optional[str] = None
+    ) -> User:
         """
         Enroll user's wallet.
 
         :param user_id: ID of user
         :param amount: Funds for enrollment
+        :param idempotency_key: Key of the request, repeated requests return the same response
         :returns: User entity
         """
         ...
 
+    @abstractmethod
+    async def enroll_many(self, deposits: List[WalletDeposit]) -> List[Optional[User]]:
+        """
+        Enroll wallets of several users within one transaction.
+
+        :param deposits: Users and their funds, the same user may be enrolled several times
+        :returns: User entity right after each of the deposits (None if user does not exist)
+        """
+        ...
+
     @abstractmethod
     async def transfer(
-        self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
+        self,
+        source_wallet_id: int,
+        destination_wallet_id: int,
+        amount: Decimal,
+        idempotency_key: Optional[str] = None,
     ) -> User:
         """
         Transferfunds between wallets
 
         :param source_wallet_id: ID of source wallet
         :param destination_wallet_id: ID of destination wallet
+        :param idempotency_key: Key of the request, repeated requests return the same response
         :returns: User entity
         """
         ...
 
+    @abstractmethod
+    async def transfer_many(
+        self, transfers: List[WalletTransferParams], mode: TransferBatchModes
+    ) -> List[WalletTransferResult]:
+        """
+        Transfer funds between several pairs of wallets.
+
+        :param transfers: List of transfers
+        :param mode: Atomic (all or nothing) or best effort
+        :returns: Result for each of the transfers
+        """
+        ...
+
+    @abstractmethod
+    async def set_balance_shards(self, wallet_id: int, shards: int) -> WalletEntity:
+        """
+        Split balance of hot wallet into shards (0 turns sharding off).
+
+        :param wallet_id: ID of wallet
+        :param shards: Number of shards
+        :returns: Wallet entity
+        """
+        ...
+
+    @abstractmethod
+    async def get_wallet(self, wallet_id: int) -> WalletEntity:
+        """
+        Receive wallet by its id.
+
+        :param wallet_id: ID of wallet
+        :returns: Wallet entity
+        """
+        ...
+
+    @abstractmethod
+    async def get_balance_at(self, wallet_id: int, at: datetime) -> WalletBalance:
+        """
+        Receive balance of wallet at given moment.
+
+        :param wallet_id: ID of wallet
+        :param at: Moment of time
+        :returns: Wallet balance
+        """
+        ...
+
+    @abstractmethod
+    async def list_operations(
+        self,
+        wallet_id: int,
+        *,
+        limit: int,
+        cursor: Optional[int] = None,
+        operation: Optional[Operations] = None,
+        amount_min: Optional[Decimal] = None,
+        amount_max: Optional[Decimal] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> WalletOperationsPage:
+        """
+        Receive page of wallet operations, ordered from newest to oldest.
+
+        :param wallet_id: ID of wallet
+        :param limit: Size of page
+        :param cursor: Cursor from the previous page
+        :param operation: Name of operation
+        :param amount_min: Minimal amount of operation (inclusive)
+        :param amount_max: Maximal amount of operation (inclusive)
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: Page of wallet operations
+        """
+        ...
+
+    @abstractmethod
+    async def export_operations(
+        self,
+        wallet_id: int,
+        *,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> AsyncIterator[List[WalletOperationEntity]]:
+        """
+        Receive stream of all wallet operations within time range, ordered from oldest to newest.
+
+        :param wallet_id: ID of wallet
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: Iterator over chunks of wallet operations
+        """
+        ...
+
 
 class WalletUsecase(AbstractWalletUsecase):
     """Implementation of wallet usecase."""
@@ -48,94 +194,826 @@ class WalletUsecase(AbstractWalletUsecase):
         user_repo: AbstractUserRepository,
         wallet_repo: AbstractWalletRepository,
         wallet_operation_repo: AbstractWalletOperationRepository,
+        write_strategy: WriteStrategy = WriteStrategy.QUERIES,
+        cache: Optional[BalanceCache] = None,
+        replica: Optional[ReplicaMonitor] = None,
+        replica_wallet_repo: Optional[AbstractWalletRepository] = None,
+        idempotency_repo: Optional[AbstractIdempotencyKeyRepository] = None,
+        idempotency_cache: Optional[LRUCache[str, IdempotencyRecord]] = None,
+        outbox_repo: Optional[AbstractOutboxRepository] = None,
+        enroll_batch_delay: int = 0,
+        enroll_batch_size: int = 100,
     ):
         self.tx_manager = tx_manager
         self.user_repo = user_repo
         self.wallet_repo = wallet_repo
         self.wallet_operation_repo = wallet_operation_repo
+        self.write_strategy = write_strategy
+        self.cache = cache
+        self.replica = replica
+        self.replica_wallet_repo = replica_wallet_repo
+        self.idempotency_repo = idempotency_repo
+        self.idempotency_cache = idempotency_cache
+        self.outbox_repo = outbox_repo
+        # Concurrent enrollments are applied in batches if delay is set
+        self.coalescer = (
+            EnrollCoalescer(
+                self.enroll_many, max_delay=enroll_batch_delay, max_size=enroll_batch_size
+            )
+            if enroll_batch_delay > 0
+            else None
+        )
 
-    async def enroll(self, user_id: int, amount: Decimal) -> User:
+    async def enroll(
+        self, user_id: int, amount: Decimal, idempotency_key: Optional[str] = None
+    ) -> User:
         """
         Enroll user's wallet.
 
         :param user_id: ID of user
         :param amount: Funds for enrollment
+        :param idempotency_key: Key of the request, repeated requests return the same response
         :returns: User entity
         """
 
-        async with self.tx_manager.advisory_lock(
-            lock_id=LockID.WALLET_ENROLL,
-            isolation_level=IsolationLevels.SERIALIZABLE,
-        ):
-            # Find user
-            user = await self.user_repo.get_by_id(user_id=user_id)
-            if not user:
-                raise UserDoesNotExist("User does not exists")
+        request_hash = (
+            self._request_hash("enroll", user_id=user_id, amount=amount) if idempotency_key else ""
+        )
+        replay = self._cached_response(idempotency_key, request_hash)
+        if replay:
+            return replay
+
+        if self.coalescer and not idempotency_key:
+            return await self.coalescer.enroll(user_id=user_id, amount=amount)
+
+        # Idempotency key has to be stored in the same transaction as the write
+        if self.write_strategy == WriteStrategy.STATEMENT and not idempotency_key:
+            # Update of the wallet and wallet operation are performed by one statement,
+            # row lock of the wallet is enough to keep it consistent (sharded wallet
+            # is locked by 'change_wallet_balance' against concurrent resharding)
+            if self.outbox_repo:
+                # Event is written to outbox in the same transaction
+                async with self.tx_manager.transaction(
+                    isolation_level=IsolationLevels.READ_COMMITTED
+                ):
+                    user = await self._enroll_statement(user_id=user_id, amount=amount)
+            else:
+                user = await self._enroll_statement(user_id=user_id, amount=amount)
+            self._invalidate([user.wallet_id])
+            return user
+
+        # Find user (wallet of the user never changes, so it is safe
+        # to resolve it before the wallet is locked, even from cache)
+        owner = await self._get_user(user_id)
+        if not owner:
+            raise UserDoesNotExist("User does not exists")
+
+        try:
+            user = await self.tx_manager.run_with_retries(
+                partial(
+                    self._enroll,
+                    user_id=user_id,
+                    wallet_id=owner.wallet_id,
+                    amount=amount,
+                    idempotency_key=idempotency_key,
+                    request_hash=request_hash,
+                )
+            )
+        finally:
+            self._invalidate([owner.wallet_id])
+
+        self._remember_response(idempotency_key, request_hash, user)
+        return user
+
+    async def enroll_many(self, deposits: List[WalletDeposit]) -> List[Optional[User]]:
+        """
+        Enroll wallets of several users within one transaction.
+
+        Balance of each wallet is changed by one summed update, state of the user
+        after each deposit is restored from the final balance.
 
-            # Enroll user's wallet
-            wallet_id = await self.wallet_repo.enroll(wallet_id=user.wallet_id, amount=amount)
+        :param deposits: Users and their funds, the same user may be enrolled several times
+        :returns: User entity right after each of the deposits (None if user does not exist)
+        """
+
+        owners: Dict[int, User] = {}
+        for user_id in dict.fromkeys(deposit.user_id for deposit in deposits):
+            user = await self._get_user(user_id)
+            if user:
+                owners[user_id] = user
+        existing = [deposit for deposit in deposits if deposit.user_id in owners]
+        if not existing:
+            return [None] * len(deposits)
+
+        wallet_ids = [owners[user_id].wallet_id for user_id in owners]
+
+        try:
+            users = await self.tx_manager.run_with_retries(
+                partial(self._enroll_many, deposits=existing, owners=owners)
+            )
+        finally:
+            self._invalidate(wallet_ids)
+
+        # Deposits are applied in the given order, so the state after each of them
+        # is the final state without the later deposits of the same user
+        balances = {user.id: user.balance for user in users}
+        results: List[Optional[User]] = []
+        for deposit in reversed(deposits):
+            user = owners.get(deposit.user_id)
+            if user is None:
+                results.append(None)
+                continue
+            results.append(user.copy(update={"balance": balances[deposit.user_id]}))
+            balances[deposit.user_id] -= deposit.amount
+        return results[::-1]
+
+    async def transfer(
+        self,
+        source_wallet_id: int,
+        destination_wallet_id: int,
+        amount: Decimal,
+        idempotency_key: Optional[str] = None,
+    ) -> User:
+        """
+        Transferfunds between wallets
+
+        :param source_wallet_id: ID of source wallet
+        :param destination_wallet_id: ID of destination wallet
+        :param idempotency_key: Key of the request, repeated requests return the same response
+        :returns: User entity
+        """
 
-            # Create wallet operation for 'debit'
-            await self.wallet_operation_repo.create(
-                operation=Operations.DEPOSIT,
-                wallet_from=None,
-                wallet_to=wallet_id,
+        request_hash = (
+            self._request_hash(
+                "transfer",
+                source_wallet_id=source_wallet_id,
+                destination_wallet_id=destination_wallet_id,
                 amount=amount,
             )
+            if idempotency_key
+            else ""
+        )
+        replay = self._cached_response(idempotency_key, request_hash)
+        if replay:
+            return replay
+
+        try:
+            user = await self.tx_manager.run_with_retries(
+                partial(
+                    self._transfer,
+                    source_wallet_id=source_wallet_id,
+                    destination_wallet_id=destination_wallet_id,
+                    amount=amount,
+                    idempotency_key=idempotency_key,
+                    request_hash=request_hash,
+                )
+            )
+        finally:
+            self._invalidate([source_wallet_id, destination_wallet_id])
+
+        self._remember_response(idempotency_key, request_hash, user)
+        return user
+
+    async def transfer_many(
+        self, transfers: List[WalletTransferParams], mode: TransferBatchModes
+    ) -> List[WalletTransferResult]:
+        """
+        Transfer funds between several pairs of wallets.
+
+        :param transfers: List of transfers
+        :param mode: Atomic (all or nothing) or best effort
+        :returns: Result for each of the transfers
+        """
+
+        try:
+            return await self.tx_manager.run_with_retries(
+                partial(self._transfer_many, transfers=transfers, mode=mode)
+            )
+        finally:
+            self._invalidate(
+                wallet_id
+                for transfer in transfers
+                for wallet_id in (transfer.wallet_from, transfer.wallet_to)
+            )
+
+    async def set_balance_shards(self, wallet_id: int, shards: int) -> WalletEntity:
+        """
+        Split balance of hot wallet into shards (0 turns sharding off).
+
+        Wallet is locked exclusively, so no credit is in flight while
+        its balance is moved between the shards.
+
+        :param wallet_id: ID of wallet
+        :param shards: Number of shards
+        :returns: Wallet entity
+        """
+
+        if not 0 <= shards <= MAX_BALANCE_SHARDS:
+            raise ValueError(f"Number of shards must be between 0 and {MAX_BALANCE_SHARDS}")
+
+        async def set_shards() -> Optional[WalletEntity]:
+            async with self.tx_manager.wallet_lock(
+                wallet_ids=[wallet_id],
+                isolation_level=IsolationLevels.SERIALIZABLE,
+            ):
+                balance = await self.wallet_repo.set_balance_shards(
+                    wallet_id=wallet_id, shards=shards
+                )
+                if balance is None:
+                    return None
+                return await self.wallet_repo.get_by_id(wallet_id=wallet_id)
+
+        try:
+            wallet = await self.tx_manager.run_with_retries(set_shards)
+        finally:
+            self._invalidate([wallet_id])
+
+        if not wallet:
+            raise WalletDoesNotExist("Wallet does not exists")
+        return wallet
+
+    async def get_wallet(self, wallet_id: int) -> WalletEntity:
+        """
+        Receive wallet by its id (from cache or replica, if they are enabled).
+
+        :param wallet_id: ID of wallet
+        :returns: Wallet entity
+        """
+
+        loader = partial(self.wallet_repo.get_by_id, wallet_id=wallet_id)
+        if self.replica and self.replica_wallet_repo:
+            # Wallet changed recently may be not replicated yet, then it would be
+            # cached with the old balance
+            loader = partial(
+                self.replica.read,
+                partial(self.replica_wallet_repo.get_by_id, wallet_id=wallet_id),
+                loader,
+                is_fresh=self._is_fresh,
+            )
+        wallet = await (self.cache.get_wallet(wallet_id, loader) if self.cache else loader())
+        if not wallet:
+            raise WalletDoesNotExist("Wallet does not exists")
+        return wallet
+
+    async def get_balance_at(self, wallet_id: int, at: datetime) -> WalletBalance:
+        """
+        Receive balance of wallet at given moment from the nearest balance snapshot.
+
+        :param wallet_id: ID of wallet
+        :param at: Moment of time
+        :returns: Wallet balance
+        """
+
+        balance = await self.wallet_repo.get_balance_at(wallet_id, at)
+        if balance is None:
+            raise WalletDoesNotExist("Wallet does not exists")
+        return WalletBalance(wallet_id=wallet_id, balance=balance, at=at)
+
+    async def list_operations(
+        self,
+        wallet_id: int,
+        *,
+        limit: int,
+        cursor: Optional[int] = None,
+        operation: Optional[Operations] = None,
+        amount_min: Optional[Decimal] = None,
+        amount_max: Optional[Decimal] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> WalletOperationsPage:
+        """
+        Receive page of wallet operations, ordered from newest to oldest.
+
+        :param wallet_id: ID of wallet
+        :param limit: Size of page
+        :param cursor: Cursor from the previous page
+        :param operation: Name of operation
+        :param amount_min: Minimal amount of operation (inclusive)
+        :param amount_max: Maximal amount of operation (inclusive)
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: Page of wallet operations
+        """
+
+        # Wallets are never deleted, so cached wallet proves its existence
+        await self.get_wallet(wallet_id)
 
-            # Find user
-            user = await self.user_repo.get_by_id(user_id=user_id)
+        limit = min(limit, MAX_OPERATIONS_PAGE_SIZE)
+        # One extra row shows whether the next page exists
+        items = await self.wallet_operation_repo.list_by_wallet(
+            wallet_id,
+            limit=limit + 1,
+            cursor=cursor,
+            operation=operation,
+            amount_min=amount_min,
+            amount_max=amount_max,
+            created_from=created_from,
+            created_to=created_to,
+        )
+        next_cursor = items[limit - 1].id if len(items) > limit else None
+        return WalletOperationsPage(items=items[:limit], next_cursor=next_cursor)
+
+    async def export_operations(
+        self,
+        wallet_id: int,
+        *,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> AsyncIterator[List[WalletOperationEntity]]:
+        """
+        Receive stream of all wallet operations within time range, ordered from oldest to newest.
+
+        Existence of wallet is checked before the stream is returned,
+        so the error is raised before the response is started.
+
+        :param wallet_id: ID of wallet
+        :param created_from: Minimal creation time of operation (inclusive)
+        :param created_to: Maximal creation time of operation (exclusive)
+        :returns: Iterator over chunks of wallet operations
+        """
+
+        await self.get_wallet(wallet_id)
+        return self.wallet_operation_repo.iterate_by_wallet(
+            wallet_id,
+            chunk_size=OPERATIONS_EXPORT_CHUNK_SIZE,
+            created_from=created_from,
+            created_to=created_to,
+        )
+
+    async def _get_user(self, user_id: int) -> Optional[User]:
+        """
+        Receive user by its id (from cache, if it is enabled).
+
+        :param user_id: ID of user
+        :returns: User entity or None
+        """
+
+        loader = partial(self.user_repo.get_by_id, user_id=user_id)
+        return await (self.cache.get_user(user_id, loader) if self.cache else loader())
+
+    @staticmethod
+    def _request_hash(endpoint: str, **params) -> str:
+        """
+        Return fingerprint of the request, which detects reuse of idempotency key.
+
+        :param endpoint: Name of the operation
+        :param params: Parameters of the request
+        :returns: Hex digest
+        """
+
+        def _normalize(value):
+            return format(value.normalize(), "f") if isinstance(value, Decimal) else str(value)
+
+        payload = json.dumps({"endpoint": endpoint, **params}, sort_keys=True, default=_normalize)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _check_record(record: IdempotencyRecord, request_hash: str) -> User:
+        """
+        Return stored response of the same request.
+
+        :param record: Stored record of idempotency key
+        :param request_hash: Fingerprint of the current request
+        :returns: User entity
+        :raises IdempotencyKeyReused: If the key was sent with different request or is incomplete
+        """
+
+        if record.request_hash != request_hash:
+            raise IdempotencyKeyReused(f"Idempotency key {record.key} was used by other request")
+        # Key is claimed and its response is saved within the same transaction
+        if record.response is None:
+            raise IdempotencyKeyReused(
+                f"Request with idempotency key {record.key} is not completed"
+            )
+        return User.parse_raw(record.response)
+
+    def _cached_response(self, idempotency_key: Optional[str], request_hash: str) -> Optional[User]:
+        """
+        Return response of the replayed request from memory.
+
+        :param idempotency_key: Key of the request
+        :param request_hash: Fingerprint of the request
+        :returns: User entity or None
+        """
+
+        if not idempotency_key or self.idempotency_cache is None:
+            return None
+
+        record = self.idempotency_cache.get(idempotency_key)
+        return self._check_record(record, request_hash) if record else None
+
+    def _remember_response(self, idempotency_key: Optional[str], request_hash: str, user: User):
+        """
+        Keep response in memory (called when transaction is committed).
+
+        :param idempotency_key: Key of the request
+        :param request_hash: Fingerprint of the request
+        :param user: Response of the request
+        """
+
+        if idempotency_key and self.idempotency_repo and self.idempotency_cache is not None:
+            self.idempotency_cache.put(
+                idempotency_key,
+                IdempotencyRecord(
+                    key=idempotency_key, request_hash=request_hash, response=user.json()
+                ),
+            )
+
+    async def _claim_key(self, idempotency_key: Optional[str], request_hash: str) -> Optional[User]:
+        """
+        Store idempotency key within the transaction of the write.
+
+        Requests with the same key are serialized by the wallet lock, otherwise
+        conflicting insert fails with serialization error and the transaction is retried.
+
+        :param idempotency_key: Key of the request
+        :param request_hash: Fingerprint of the request
+        :returns: Stored response or None if the request is new
+        """
+
+        if not idempotency_key or not self.idempotency_repo:
+            return None
+
+        record = await self.idempotency_repo.claim(key=idempotency_key, request_hash=request_hash)
+        return self._check_record(record, request_hash) if record else None
+
+    async def _save_response(self, idempotency_key: Optional[str], user: User):
+        """
+        Store response of the request within the transaction of the write.
+
+        :param idempotency_key: Key of the request
+        :param user: Response of the request
+        """
+
+        if idempotency_key and self.idempotency_repo:
+            await self.idempotency_repo.save_response(key=idempotency_key, response=user.json())
+
+    async def _publish(self, operations: List[CreateWalletOperation]):
+        """
+        Write events of wallet operations to outbox within the transaction of the write.
+
+        :param operations: Deposits and withdrawals
+        """
+
+        if self.outbox_repo:
+            await self.outbox_repo.add_many(
+                events=[CreateOutboxEvent.from_operation(operation) for operation in operations]
+            )
+
+    def _is_fresh(self, wallet: WalletEntity) -> bool:
+        """Whether wallet read from replica can be used (and cached)."""
+
+        return not (self.cache and self.cache.changed_recently(wallet.id))
+
+    def _invalidate(self, wallet_ids: Iterable[int]):
+        """
+        Remove changed wallets from cache (called when transaction is finished).
+
+        :param wallet_ids: IDs of wallets
+        """
+
+        if self.cache:
+            self.cache.invalidate_wallets(wallet_ids)
+
+    async def _enroll(
+        self,
+        user_id: int,
+        wallet_id: int,
+        amount: Decimal,
+        idempotency_key: Optional[str] = None,
+        request_hash: str = "",
+    ) -> User:
+        """
+        Enroll user's wallet within one transaction.
+
+        :param user_id: ID of user
+        :param wallet_id: ID of user's wallet
+        :param amount: Funds for enrollment
+        :param idempotency_key: Key of the request
+        :param request_hash: Fingerprint of the request
+        :returns: User entity
+        """
+
+        async with self.tx_manager.wallet_lock(
+            wallet_ids=[],
+            credited_wallet_ids=[wallet_id],
+            isolation_level=IsolationLevels.SERIALIZABLE,
+        ):
+            replay = await self._claim_key(idempotency_key, request_hash)
+            if replay:
+                return replay
+
+            if self.write_strategy == WriteStrategy.STATEMENT:
+                user = await self.wallet_repo.enroll_with_operation(user_id=user_id, amount=amount)
+            else:
+                user = await self._enroll_queries(
+                    user_id=user_id, wallet_id=wallet_id, amount=amount
+                )
             if not user:
                 raise UserDoesNotExist("User does not exists")
+
+            await self._publish(
+                [
+                    CreateWalletOperation(
+                        operation=Operations.DEPOSIT,
+                        wallet_from=None,
+                        wallet_to=wallet_id,
+                        amount=amount,
+                    )
+                ]
+            )
+            await self._save_response(idempotency_key, user)
             return user
 
-    async def transfer(
-        self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
+    async def _enroll_statement(self, user_id: int, amount: Decimal) -> User:
+        """
+        Enroll user's wallet by one statement (without advisory lock).
+
+        :param user_id: ID of user
+        :param amount: Funds for enrollment
+        :returns: User entity
+        """
+
+        user = await self.wallet_repo.enroll_with_operation(user_id=user_id, amount=amount)
+        if not user:
+            raise UserDoesNotExist("User does not exists")
+
+        await self._publish(
+            [
+                CreateWalletOperation(
+                    operation=Operations.DEPOSIT,
+                    wallet_from=None,
+                    wallet_to=user.wallet_id,
+                    amount=amount,
+                )
+            ]
+        )
+        return user
+
+    async def _enroll_queries(
+        self, user_id: int, wallet_id: int, amount: Decimal
+    ) -> Optional[User]:
+        """
+        Enroll user's wallet by separate queries.
+
+        :param user_id: ID of user
+        :param wallet_id: ID of user's wallet
+        :param amount: Funds for enrollment
+        :returns: User entity or None
+        :raises WalletDoesNotExist: If wallet of the user does not exist
+        """
+
+        # Enroll user's wallet
+        if await self.wallet_repo.enroll(wallet_id=wallet_id, amount=amount) is None:
+            raise WalletDoesNotExist("Wallet does not exists")
+
+        # Create wallet operation for 'debit'
+        await self.wallet_operation_repo.create(
+            operation=Operations.DEPOSIT,
+            wallet_from=None,
+            wallet_to=wallet_id,
+            amount=amount,
+        )
+
+        # Find user
+        return await self.user_repo.get_by_id(user_id=user_id)
+
+    async def _enroll_many(
+        self, deposits: List[WalletDeposit], owners: Dict[int, User]
+    ) -> List[User]:
+        """
+        Enroll wallets of several users within one transaction.
+
+        :param deposits: Deposits of existing users
+        :param owners: Users by their ids
+        :returns: Users with their final balances
+        """
+
+        deltas: DefaultDict[int, Decimal] = defaultdict(Decimal)
+        for deposit in deposits:
+            deltas[owners[deposit.user_id].wallet_id] += deposit.amount
+
+        async with self.tx_manager.wallet_lock(
+            wallet_ids=[],
+            credited_wallet_ids=deltas,
+            isolation_level=IsolationLevels.SERIALIZABLE,
+        ):
+            operations = [
+                CreateWalletOperation(
+                    operation=Operations.DEPOSIT,
+                    wallet_from=None,
+                    wallet_to=owners[deposit.user_id].wallet_id,
+                    amount=deposit.amount,
+                )
+                for deposit in deposits
+            ]
+            await self.wallet_repo.update_balances(deltas=dict(deltas))
+            await self.wallet_operation_repo.create_many(operations=operations)
+            await self._publish(operations)
+            return await self.user_repo.get_by_ids(user_ids=sorted(owners))
+
+    async def _transfer(
+        self,
+        source_wallet_id: int,
+        destination_wallet_id: int,
+        amount: Decimal,
+        idempotency_key: Optional[str] = None,
+        request_hash: str = "",
     ) -> User:
         """
-        Transferfunds between wallets
+        Transfer funds between wallets within one transaction.
 
         :param source_wallet_id: ID of source wallet
         :param destination_wallet_id: ID of destination wallet
+        :param idempotency_key: Key of the request
+        :param request_hash: Fingerprint of the request
         :returns: User entity
         """
 
-        async with self.tx_manager.advisory_lock(
-            lock_id=LockID.WALLET_TRANSFER,
+        async with self.tx_manager.wallet_lock(
+            wallet_ids=[source_wallet_id],
+            credited_wallet_ids=[destination_wallet_id],
             isolation_level=IsolationLevels.SERIALIZABLE,
         ):
+            replay = await self._claim_key(idempotency_key, request_hash)
+            if replay:
+                return replay
+
             if amount <= 0:
                 raise ValueError("Insufficient amount")
 
-            source_wallet = await self.wallet_repo.get_by_id(wallet_id=source_wallet_id)
-            if not source_wallet:
-                raise WalletDoesNotExist("Source wallet does not exists")
+            if self.write_strategy == WriteStrategy.STATEMENT:
+                # Balance check, updates of both wallets and wallet operations
+                # are performed by one statement
+                user = await self.wallet_repo.transfer_with_operations(
+                    source_wallet_id=source_wallet_id,
+                    destination_wallet_id=destination_wallet_id,
+                    amount=amount,
+                )
+            else:
+                user = await self._transfer_queries(
+                    source_wallet_id=source_wallet_id,
+                    destination_wallet_id=destination_wallet_id,
+                    amount=amount,
+                )
 
-            destination_wallet = await self.wallet_repo.get_by_id(wallet_id=destination_wallet_id)
-            if not destination_wallet:
-                raise WalletDoesNotExist("Source wallet does not exists")
-
-            source_wallet_id = await self.wallet_repo.transfer(
-                source_wallet_id=source_wallet_id,
-                destination_wallet_id=destination_wallet_id,
-                amount=amount,
+            # Events mirror the rows written to wallet operations
+            await self._publish(
+                [
+                    CreateWalletOperation(
+                        operation=Operations.WITHDRAWAL,
+                        wallet_from=source_wallet_id,
+                        wallet_to=destination_wallet_id,
+                        amount=amount,
+                    ),
+                    CreateWalletOperation(
+                        operation=Operations.DEPOSIT,
+                        wallet_from=destination_wallet_id,
+                        wallet_to=source_wallet_id,
+                        amount=amount,
+                    ),
+                ]
             )
+            await self._save_response(idempotency_key, user)
+            return user
 
-            await self.wallet_operation_repo.create(
-                operation=Operations.WITHDRAWAL,
-                wallet_from=source_wallet_id,
-                wallet_to=destination_wallet_id,
-                amount=amount,
-            )
-            await self.wallet_operation_repo.create(
-                operation=Operations.DEPOSIT,
-                wallet_from=destination_wallet_id,
-                wallet_to=source_wallet_id,
-                amount=amount,
+    async def _transfer_queries(
+        self, source_wallet_id: int, destination_wallet_id: int, amount: Decimal
+    ) -> User:
+        """
+        Transfer funds between wallets by separate queries.
+
+        :param source_wallet_id: ID of source wallet
+        :param destination_wallet_id: ID of destination wallet
+        :returns: User entity
+        """
+
+        source_wallet = await self.wallet_repo.get_by_id(wallet_id=source_wallet_id)
+        if not source_wallet:
+            raise WalletDoesNotExist("Source wallet does not exists")
+
+        destination_wallet = await self.wallet_repo.get_by_id(wallet_id=destination_wallet_id)
+        if not destination_wallet:
+            raise WalletDoesNotExist("Source wallet does not exists")
+
+        source_wallet_id = await self.wallet_repo.transfer(
+            source_wallet_id=source_wallet_id,
+            destination_wallet_id=destination_wallet_id,
+            amount=amount,
+        )
+
+        await self.wallet_operation_repo.create(
+            operation=Operations.WITHDRAWAL,
+            wallet_from=source_wallet_id,
+            wallet_to=destination_wallet_id,
+            amount=amount,
+        )
+        await self.wallet_operation_repo.create(
+            operation=Operations.DEPOSIT,
+            wallet_from=destination_wallet_id,
+            wallet_to=source_wallet_id,
+            amount=amount,
+        )
+
+        user = await self.user_repo.get_by_wallet_id(wallet_id=source_wallet_id)
+        if not user:
+            raise UserDoesNotExist("User does not exist")
+
+        return user
+
+    async def _transfer_many(
+        self, transfers: List[WalletTransferParams], mode: TransferBatchModes
+    ) -> List[WalletTransferResult]:
+        """
+        Transfer funds between several pairs of wallets within one transaction.
+
+        :param transfers: List of transfers
+        :param mode: Atomic (all or nothing) or best effort
+        :returns: Result for each of the transfers
+        """
+
+        debited_wallet_ids = {transfer.wallet_from for transfer in transfers}
+        wallet_ids = debited_wallet_ids | {transfer.wallet_to for transfer in transfers}
+        async with self.tx_manager.wallet_lock(
+            wallet_ids=debited_wallet_ids,
+            credited_wallet_ids=wallet_ids - debited_wallet_ids,
+            isolation_level=IsolationLevels.SERIALIZABLE,
+        ):
+            wallets = await self.wallet_repo.get_by_ids(wallet_ids=sorted(wallet_ids))
+            balances: Dict[int, Decimal] = {wallet.id: wallet.balance for wallet in wallets}
+            deltas: DefaultDict[int, Decimal] = defaultdict(Decimal)
+            operations: List[CreateWalletOperation] = []
+            results: List[WalletTransferResult] = []
+
+            # Transfers are applied in the given order to the in-memory balances,
+            # so the later transfer may spend funds received by the earlier one
+            for transfer in transfers:
+                error = self._check_transfer(transfer=transfer, balances=balances)
+                if not error:
+                    balances[transfer.wallet_from] -= transfer.amount
+                    balances[transfer.wallet_to] += transfer.amount
+                    deltas[transfer.wallet_from] -= transfer.amount
+                    deltas[transfer.wallet_to] += transfer.amount
+                    operations.append(
+                        CreateWalletOperation(
+                            operation=Operations.WITHDRAWAL,
+                            wallet_from=transfer.wallet_from,
+                            wallet_to=transfer.wallet_to,
+                            amount=transfer.amount,
+                        )
+                    )
+                    operations.append(
+                        CreateWalletOperation(
+                            operation=Operations.DEPOSIT,
+                            wallet_from=transfer.wallet_to,
+                            wallet_to=transfer.wallet_from,
+                            amount=transfer.amount,
+                        )
+                    )
+                results.append(
+                    WalletTransferResult(
+                        wallet_from=transfer.wallet_from,
+                        wallet_to=transfer.wallet_to,
+                        amount=transfer.amount,
+                        success=not error,
+                        error=error,
+                    )
+                )
+
+            has_errors = any(not result.success for result in results)
+            if mode == TransferBatchModes.ATOMIC and has_errors:
+                return [
+                    result.copy(update={"success": False, "error": "Batch was rolled back"})
+                    if result.success
+                    else result
+                    for result in results
+                ]
+
+            await self.wallet_repo.update_balances(
+                deltas={wallet_id: delta for wallet_id, delta in deltas.items() if delta}
             )
+            await self.wallet_operation_repo.create_many(operations=operations)
+            await self._publish(operations)
+            return results
 
-            user = await self.user_repo.get_by_wallet_id(wallet_id=source_wallet_id)
-            if not user:
-                raise UserDoesNotExist("User does not exist")
+    @staticmethod
+    def _check_transfer(
+        transfer: WalletTransferParams, balances: Dict[int, Decimal]
+    ) -> Optional[str]:
+        """
+        Validate transfer against current balances.
 
-            return user
+        :param transfer: Transfer parameters
+        :param balances: Mapping of wallet id to its balance
+        :returns: Error description or None if transfer is valid
+        """
+
+        if transfer.amount <= 0:
+            return "Insufficient amount"
+        if transfer.wallet_from not in balances:
+            return "Source wallet does not exists"
+        if transfer.wallet_to not in balances:
+            return "Destination wallet does not exists"
+        if balances[transfer.wallet_from] < transfer.amount:
+            return "Insufficient funds"
+        return None
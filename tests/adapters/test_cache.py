@@ -0,0 +1,99 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from app.adapters.cache import BalanceCache, LRUCache, estimate_size
+from app.entities.currency import CurrencyEnum
+from app.entities.user import User
+from app.entities.wallet import WalletEntity
+
+
+def make_wallet(wallet_id: int) -> WalletEntity:
+    """Return wallet entity for tests."""
+
+    return WalletEntity(
+        id=wallet_id, user_id=wallet_id, balance=Decimal("1"), currency=CurrencyEnum.USD
+    )
+
+
+def test_lru_cache_eviction():
+    """Test least recently used entries are evicted over entries and memory limits."""
+
+    cache = LRUCache(ttl=60, max_entries=2, max_bytes=10**6)
+    for wallet_id in (1, 2):
+        cache.put(wallet_id, make_wallet(wallet_id))
+    assert cache.get(1) is not None
+    cache.put(3, make_wallet(3))
+    assert 2 not in cache
+    assert cache.get(3) is not None
+    assert cache.metrics.evictions == 1
+
+    size = estimate_size(make_wallet(1))
+    cache = LRUCache(ttl=60, max_entries=100, max_bytes=size * 2)
+    for wallet_id in (1, 2, 3):
+        cache.put(wallet_id, make_wallet(wallet_id))
+    assert len(cache) == 2
+    assert cache.size <= size * 2
+
+
+def test_lru_cache_expiration():
+    """Test expired entries are not returned."""
+
+    cache = LRUCache(ttl=0, max_entries=10, max_bytes=10**6)
+    cache.put(1, make_wallet(1))
+    assert cache.get(1) is None
+    assert cache.metrics.as_dict() == {
+        "hits": 0,
+        "misses": 1,
+        "evictions": 0,
+        "expirations": 1,
+        "invalidations": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_lru_cache_load_is_not_stored_after_invalidation():
+    """Test value loaded before invalidation is not cached."""
+
+    cache = LRUCache(ttl=60, max_entries=10, max_bytes=10**6)
+
+    async def loader():
+        await asyncio.sleep(0)
+        cache.invalidate([1])
+        return make_wallet(1)
+
+    assert await cache.get_or_load(1, loader) is not None
+    assert 1 not in cache
+
+
+@pytest.mark.asyncio
+async def test_balance_cache_invalidate_wallets():
+    """Test owner of changed wallet is removed from cache."""
+
+    cache = BalanceCache(ttl=60, max_entries=10, max_bytes=10**6)
+    user = User(id=1, email="user@example.com", wallet_id=5, balance=Decimal("1"), currency="USD")
+
+    async def loader():
+        return user
+
+    await cache.get_user(1, loader)
+    await cache.get_wallet(5, lambda: asyncio.sleep(0, result=make_wallet(5)))
+    assert 1 in cache.users and 5 in cache.wallets
+
+    cache.invalidate_wallets([5])
+    assert 1 not in cache.users
+    assert 5 not in cache.wallets
+
+
+def test_balance_cache_changed_recently():
+    """Test wallets are considered changed within the grace window after invalidation."""
+
+    cache = BalanceCache(ttl=60, change_grace=60)
+    cache.invalidate_wallets([5])
+    assert cache.changed_recently(5)
+    assert not cache.changed_recently(6)
+
+    cache = BalanceCache(ttl=60, change_grace=0)
+    cache.invalidate_wallets([5])
+    assert not cache.changed_recently(5)
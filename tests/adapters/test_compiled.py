@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+import pytest
+
+from app.repositories.wallet import CHANGE_BALANCE_QUERY, WalletRepository
+
+
+def test_compiled_query_args():
+    """Test named values are converted to positional arguments of the compiled query."""
+
+    assert CHANGE_BALANCE_QUERY.sql.count("$") == 2
+    args = CHANGE_BALANCE_QUERY.args({"wallet_id": 1, "delta": Decimal("10")})
+    assert args == [Decimal("10"), 1]
+
+
+@pytest.mark.asyncio
+async def test_compiled_query_joins_transaction(test_db, wallet_factory):
+    """Test compiled queries are executed within the transaction of the current task."""
+
+    wallet = wallet_factory.create(balance=Decimal("0"))
+    repository = WalletRepository(db=test_db)
+
+    transaction = test_db.transaction()
+    await transaction.start()
+    await repository.enroll(wallet_id=wallet.id, amount=Decimal("10"))
+    enrolled_wallet = await repository.get_by_id(wallet_id=wallet.id)
+    await transaction.rollback()
+
+    assert enrolled_wallet.balance == Decimal("10")
+    assert (await repository.get_by_id(wallet_id=wallet.id)).balance == Decimal("0")
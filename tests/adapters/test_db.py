@@ -0,0 +1,22 @@
+import pytest
+from databases import Database
+
+from app import settings
+from app.adapters.sql.db import warm_up_db
+
+
+@pytest.mark.asyncio
+async def test_success_pool_warm_up():
+    """Test pool is created with configured size and its connections are warmed up."""
+
+    db = Database(settings.BILLING_DB_DSN, min_size=2, max_size=3, statement_cache_size=0)
+    await db.connect()
+    try:
+        await warm_up_db(db, 3)
+        pool = db._backend._pool  # pylint: disable=protected-access
+        assert pool.get_max_size() == 3
+        assert pool.get_size() == 3
+    finally:
+        await db.disconnect()
+
+    assert not db.is_connected
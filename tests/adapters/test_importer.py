@@ -0,0 +1,74 @@
+import json
+
+import asyncpg
+import pytest
+
+from app import settings
+from app.adapters.sql.importer import BalanceImporter, ImportFormats
+
+
+@pytest.mark.asyncio
+async def test_success_balances_import(test_db, tmp_path, user_factory, caplog):
+    """Test success import of users with opening balances (and resuming of it)."""
+
+    user = user_factory()
+    path = tmp_path / "balances.csv"
+    path.write_text(
+        "email,balance\n"
+        "first@mail.com,10.50\n"
+        f"{user.email},20\n"
+        "not-valid,1\n"
+        "second@mail.com,0\n"
+        "third@mail.com,1.005\n"
+        "fourth@mail.com,100000000\n"
+        # Domain is normalized, so it is the same user as the first one
+        "first@MAIL.COM,3\n"
+        "fifth@localhost,1\n"
+    )
+    wallets_count = await test_db.execute("select count(*) from wallets")
+    wo_count = await test_db.execute("select count(*) from wallet_operations")
+
+    connection = await asyncpg.connect(settings.BILLING_DB_DSN)
+    try:
+        importer = BalanceImporter(connection=connection, chunk_size=2)
+        stats = await importer.run(str(path), ImportFormats.CSV, "balances")
+        assert (stats.last_line, stats.imported, stats.skipped) == (8, 2, 6)
+        skipped_lines = [
+            record.args[0] for record in caplog.records if record.levelname == "WARNING"
+        ]
+        assert skipped_lines == [3, 5, 6, 8]
+
+        resumed_stats = await importer.run(str(path), ImportFormats.CSV, "balances")
+        assert resumed_stats == stats
+    finally:
+        await connection.close()
+
+    new_wallets_count = await test_db.execute("select count(*) from wallets")
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations")
+    balance = await test_db.execute(
+        "select balance from wallets join users on users.id = wallets.user_id "
+        "where email = 'first@mail.com'"
+    )
+    assert new_wallets_count == wallets_count + 2
+    # CREATE operation for both wallets and DEPOSIT for non-zero opening balance
+    assert new_wo_count == wo_count + 3
+    assert balance == 10.5
+    # Downstream systems see imported users and opening balances
+    events = await test_db.fetch_all("select event_type, payload from outbox order by id")
+    assert sorted(event["event_type"] for event in events) == [
+        "DEPOSIT",
+        "USER_CREATED",
+        "USER_CREATED",
+    ]
+    deposit = next(event for event in events if event["event_type"] == "DEPOSIT")
+    wallet_id = await test_db.execute(
+        "select wallets.id from wallets join users on users.id = wallets.user_id "
+        "where email = 'first@mail.com'"
+    )
+    assert json.loads(deposit["payload"]) == {
+        "wallet_from": None,
+        "wallet_to": wallet_id,
+        "credited_wallet_id": wallet_id,
+        "debited_wallet_id": None,
+        "amount": "10.50",
+    }
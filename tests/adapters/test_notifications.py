@@ -0,0 +1,128 @@
+import asyncio
+from decimal import Decimal
+
+import asyncpg
+import pytest
+
+from app import settings
+from app.adapters.cache import BalanceCache
+from app.adapters.sql.models import wallets
+from app.adapters.sql.notifications import LISTENER_APPLICATION_NAME, WalletChangesListener
+from app.entities.currency import CurrencyEnum
+from app.entities.wallet import WalletEntity
+
+
+async def wait_for(condition, timeout: float = 5):
+    """Wait until condition is true."""
+
+    async def _wait():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(_wait(), timeout)
+
+
+async def cache_wallet(cache: BalanceCache, wallet_id: int):
+    """Put wallet into cache."""
+
+    async def loader():
+        return WalletEntity(
+            id=wallet_id, user_id=1, balance=Decimal("0"), currency=CurrencyEnum.USD
+        )
+
+    await cache.get_wallet(wallet_id, loader)
+
+
+@pytest.fixture
+async def listener():
+    """Return started listener of wallet changes."""
+
+    cache = BalanceCache(ttl=60)
+    listener = WalletChangesListener(
+        dsn=settings.BILLING_DB_DSN, cache=cache, reconnect_delay=0.05, keepalive=0.1
+    )
+    await listener.start()
+    await asyncio.wait_for(listener.connected.wait(), 5)
+    yield listener
+    await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_changed_wallet_is_evicted(test_db, listener, wallet_factory):
+    """Test wallet changed by other process is evicted from cache."""
+
+    changed_wallet = wallet_factory.create()
+    other_wallet = wallet_factory.create()
+    cache = listener._cache  # pylint: disable=protected-access
+    await cache_wallet(cache, changed_wallet.id)
+    await cache_wallet(cache, other_wallet.id)
+
+    await test_db.execute(
+        wallets.update().where(wallets.c.id == changed_wallet.id).values(balance=10)
+    )
+
+    await wait_for(lambda: changed_wallet.id not in cache.wallets)
+    assert other_wallet.id in cache.wallets
+
+
+@pytest.mark.asyncio
+async def test_cache_is_flushed_after_reconnect(test_db, listener):
+    """Test cache is flushed when connection of listener is lost."""
+
+    cache = listener._cache  # pylint: disable=protected-access
+    await cache_wallet(cache, 1)
+
+    await test_db.execute(
+        "select pg_terminate_backend(pid) from pg_stat_activity " "where application_name = :name",
+        values={"name": LISTENER_APPLICATION_NAME},
+    )
+
+    await wait_for(lambda: 1 not in cache.wallets)
+    await asyncio.wait_for(listener.connected.wait(), 5)
+
+
+@pytest.mark.asyncio
+async def test_listener_recovers_after_connect_timeout(monkeypatch):
+    """Test listener reconnects after timed out connection and cache is bypassed meanwhile."""
+
+    connect = asyncpg.connect
+    attempts = []
+
+    async def flaky_connect(*args, **kwargs):
+        attempts.append(args)
+        if len(attempts) == 1:
+            raise asyncio.TimeoutError()
+        return await connect(*args, **kwargs)
+
+    monkeypatch.setattr(asyncpg, "connect", flaky_connect)
+    cache = BalanceCache(ttl=60)
+    listener = WalletChangesListener(
+        dsn=settings.BILLING_DB_DSN, cache=cache, reconnect_delay=0.05, keepalive=0.1
+    )
+    await listener.start()
+    try:
+        # Changes are not received yet, so nothing is cached
+        await cache_wallet(cache, 1)
+        assert 1 not in cache.wallets
+
+        await asyncio.wait_for(listener.connected.wait(), 5)
+        assert len(attempts) == 2
+        await cache_wallet(cache, 1)
+        assert 1 in cache.wallets
+    finally:
+        await listener.stop()
+    assert cache.bypassed
+
+
+def test_empty_notification_flushes_cache():
+    """Test cache is flushed on notification without wallet ids."""
+
+    cache = BalanceCache(ttl=60)
+    cache.wallets.put(
+        1, WalletEntity(id=1, user_id=1, balance=Decimal("0"), currency=CurrencyEnum.USD)
+    )
+    listener = WalletChangesListener(dsn=settings.BILLING_DB_DSN, cache=cache)
+
+    listener._on_notification(None, 0, "wallet_changes", "")  # pylint: disable=protected-access
+
+    assert len(cache.wallets) == 0
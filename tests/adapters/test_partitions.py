@@ -0,0 +1,63 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.adapters.sql.partitions import (
+    DEFAULT_PARTITION,
+    PartitionManager,
+    add_months,
+    create_partitions,
+    partition_name,
+)
+
+
+def test_add_months():
+    """Test shifting of months across years."""
+
+    assert add_months(date(2026, 11, 20), 0) == date(2026, 11, 1)
+    assert add_months(date(2026, 11, 20), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 5), -1) == date(2025, 12, 1)
+
+
+@pytest.mark.asyncio
+async def test_create_future_partitions(test_db):
+    """Test partitions for the next months are created only once."""
+
+    manager = PartitionManager(db=test_db)
+    await manager.create_future_partitions(months_ahead=4)
+    created = await manager.create_future_partitions(months_ahead=4)
+    assert created == []
+
+    partitions = await manager._list_partitions()  # pylint: disable=protected-access
+    for months in range(5):
+        assert partition_name(add_months(datetime.now(timezone.utc).date(), months)) in partitions
+
+
+@pytest.mark.asyncio
+async def test_create_partition_with_rows_in_default(test_db):
+    """Test rows of the new partition's range are moved out of the default partition."""
+
+    month = add_months(datetime.now(timezone.utc).date(), 7)
+    name = partition_name(month)
+    await test_db.execute(f"drop table if exists {name}")
+    await test_db.execute(
+        "insert into wallet_operations (operation, wallet_to, amount, created_at) "
+        f"values ('DEPOSIT', 1, 10, '{month} 12:00:00+00')"
+    )
+
+    created = await PartitionManager(db=test_db).create_future_partitions(months_ahead=7)
+    assert name in created
+    assert await test_db.fetch_val(f"select count(*) from {name}") == 1
+    assert await test_db.fetch_val(f"select count(*) from {DEFAULT_PARTITION}") == 0
+
+
+@pytest.mark.asyncio
+async def test_create_partitions_over_own_connection(test_db):
+    """Test partitions are created without opening or closing the shared pool."""
+
+    await create_partitions(months_ahead=2)
+
+    assert test_db.is_connected
+    manager = PartitionManager(db=test_db)
+    partitions = await manager._list_partitions()  # pylint: disable=protected-access
+    assert partition_name(add_months(datetime.now(timezone.utc).date(), 2)) in partitions
@@ -0,0 +1,54 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+import asyncpg
+import pytest
+
+from app import settings
+from app.adapters.sql.reconciliation import LedgerReconciler
+from app.repositories.wallet import WalletRepository
+
+
+@pytest.mark.asyncio
+async def test_success_ledger_reconciliation(test_db, wallet_factory):
+    """Test balances are checked against operations and the next run resumes from watermark."""
+
+    wallet_1 = wallet_factory.create(balance=Decimal("0"))
+    wallet_2 = wallet_factory.create(balance=Decimal("0"))
+    # Balance without operations does not match the ledger
+    wallet_3 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    await repository.enroll_with_operation(user_id=wallet_1.user_id, amount=Decimal("30"))
+    await repository.transfer_with_operations(
+        source_wallet_id=wallet_1.id, destination_wallet_id=wallet_2.id, amount=Decimal("10")
+    )
+
+    pool = await asyncpg.create_pool(settings.BILLING_DB_DSN, min_size=2, max_size=2)
+    try:
+        reconciler = LedgerReconciler(pool=pool, chunk_size=2, settle_interval=timedelta(0))
+        report = StringIO()
+        stats = await reconciler.run(report=report)
+        assert (stats.processed, stats.wallets, stats.mismatches) == (3, 3, 1)
+        assert report.getvalue().splitlines()[1:] == [f"{wallet_3.id},100.00,0"]
+        totals = await test_db.fetch_all("select wallet_id, total from ledger_totals")
+        assert {row["wallet_id"]: row["total"] for row in totals} == {
+            wallet_1.id: Decimal("20"),
+            wallet_2.id: Decimal("10"),
+        }
+
+        # Operations younger than settle interval are left for the next run,
+        # but are still counted in comparison with balances
+        await repository.enroll_with_operation(user_id=wallet_2.user_id, amount=Decimal("5"))
+        watermark = stats.last_operation_id
+        stats = await LedgerReconciler(pool=pool, settle_interval=timedelta(hours=1)).run()
+        assert (stats.last_operation_id, stats.processed, stats.mismatches) == (watermark, 3, 1)
+
+        stats = await reconciler.run()
+        assert (stats.processed, stats.mismatches) == (4, 1)
+        total = await test_db.fetch_val(
+            f"select total from ledger_totals where wallet_id = {wallet_2.id}"
+        )
+        assert total == Decimal("15")
+    finally:
+        await pool.close()
@@ -0,0 +1,107 @@
+import pytest
+from databases import Database
+
+from app import settings
+from app.adapters.sql.pool import AsyncpgDatabase
+from app.adapters.sql.replica import ReplicaMonitor
+
+
+@pytest.fixture
+async def replica_db():
+    """Return database used as replica."""
+
+    db = Database(settings.BILLING_DB_DSN)
+    yield db
+    if db.is_connected:
+        await db.disconnect()
+
+
+async def read_primary():
+    """Read from primary."""
+
+    return "primary"
+
+
+@pytest.mark.asyncio
+async def test_replica_is_used(replica_db):
+    """Test reads are sent to replica which is not behind."""
+
+    replica = ReplicaMonitor(db=replica_db, max_staleness=1, check_interval=0)
+
+    async def read_replica():
+        return "replica"
+
+    assert await replica.read(read_replica, read_primary) == "replica"
+    assert replica.lag == 0
+
+
+@pytest.mark.asyncio
+async def test_not_fresh_replica_result_is_read_from_primary(replica_db):
+    """Test result rejected by freshness check is read from primary."""
+
+    replica = ReplicaMonitor(db=replica_db, max_staleness=1, check_interval=60)
+
+    async def read_replica():
+        return "replica"
+
+    assert await replica.read(read_replica, read_primary, is_fresh=lambda _: False) == "primary"
+    assert await replica.read(read_replica, read_primary, is_fresh=lambda _: True) == "replica"
+
+
+@pytest.mark.asyncio
+async def test_asyncpg_replica_is_used():
+    """Test lag of raw asyncpg replica is checked."""
+
+    db = AsyncpgDatabase(settings.BILLING_DB_DSN, min_size=1, max_size=1)
+    replica = ReplicaMonitor(db=db, max_staleness=1, check_interval=0)
+    try:
+        assert await replica.is_usable()
+    finally:
+        await replica.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_stale_replica_is_not_used(replica_db):
+    """Test reads are sent to primary while replica is behind."""
+
+    replica = ReplicaMonitor(db=replica_db, max_staleness=-1, check_interval=60)
+
+    async def read_replica():
+        raise AssertionError("Replica must not be used")
+
+    assert await replica.read(read_replica, read_primary) == "primary"
+
+
+@pytest.mark.asyncio
+async def test_failed_replica_falls_back_to_primary(replica_db):
+    """Test failed and missing reads are repeated on primary."""
+
+    replica = ReplicaMonitor(db=replica_db, max_staleness=1, check_interval=60)
+    calls = []
+
+    async def read_replica():
+        calls.append(1)
+        raise ConnectionResetError()
+
+    async def read_missing():
+        return None
+
+    assert await replica.read(read_missing, read_primary) == "primary"
+    assert await replica.read(read_replica, read_primary) == "primary"
+    assert await replica.read(read_replica, read_primary) == "primary"
+    # Replica is not used until the next check
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_is_not_used():
+    """Test reads are sent to primary if replica is unreachable."""
+
+    replica = ReplicaMonitor(
+        db=Database("postgresql://user@localhost:1/billing_test"),
+        max_staleness=1,
+        check_interval=0,
+    )
+    await replica.connect()
+
+    assert not await replica.is_usable()
@@ -0,0 +1,141 @@
+import asyncpg
+import pytest
+from asyncpg.exceptions import DeadlockDetectedError, SerializationError
+from mock import AsyncMock
+
+from app import settings
+from app.adapters.sql.tx import (
+    IsolationLevels,
+    LockID,
+    LockNotAcquired,
+    SQLTransactionManager,
+    TransactionRetriesExhausted,
+)
+
+WALLET_LOCKS_QUERY = (
+    "select count(*) from pg_locks "
+    f"where locktype = 'advisory' and classid = {LockID.WALLET.value} and granted"
+)
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_lock(test_db):
+    """Test success locking of wallets."""
+
+    tx_manager = SQLTransactionManager(db=test_db)
+    async with tx_manager.wallet_lock(
+        isolation_level=IsolationLevels.SERIALIZABLE,
+        wallet_ids=[2, 1, 2],
+    ):
+        locks_count = await test_db.execute(WALLET_LOCKS_QUERY)
+        assert locks_count == 2
+
+    locks_count = await test_db.execute(WALLET_LOCKS_QUERY)
+    assert locks_count == 0
+
+
+@pytest.mark.asyncio
+async def test_wallet_lock_released_on_error(test_db):
+    """Test wallet locks are released if transaction failed."""
+
+    tx_manager = SQLTransactionManager(db=test_db)
+    with pytest.raises(ValueError):
+        async with tx_manager.wallet_lock(
+            isolation_level=IsolationLevels.SERIALIZABLE,
+            wallet_ids=[1, 2],
+        ):
+            raise ValueError("Transaction error")
+
+    locks_count = await test_db.execute(WALLET_LOCKS_QUERY)
+    assert locks_count == 0
+
+
+@pytest.mark.asyncio
+async def test_credited_sharded_wallet_lock_is_shared(test_db, wallet_factory):
+    """Test credited wallet is locked in shared mode only if its balance is sharded."""
+
+    wallet_1 = wallet_factory.create()
+    wallet_2 = wallet_factory.create()
+    await test_db.execute(f"update wallets set balance_shards = 4 where id = {wallet_2.id}")
+    shared_locks_query = WALLET_LOCKS_QUERY + " and mode = 'ShareLock'"
+
+    other_connection = await asyncpg.connect(settings.BILLING_DB_DSN)
+    try:
+        tx_manager = SQLTransactionManager(db=test_db)
+        async with tx_manager.wallet_lock(
+            isolation_level=IsolationLevels.SERIALIZABLE,
+            wallet_ids=[],
+            credited_wallet_ids=[wallet_1.id, wallet_2.id],
+        ):
+            assert await test_db.execute(WALLET_LOCKS_QUERY) == 2
+            assert await test_db.execute(shared_locks_query) == 1
+            isolation = await test_db.execute("show transaction_isolation")
+            assert isolation == "repeatable read"
+            # Concurrent credit of the sharded wallet is not blocked
+            assert await other_connection.fetchval(
+                "select pg_try_advisory_lock_shared($1, $2)", LockID.WALLET.value, wallet_2.id
+            )
+            assert not await other_connection.fetchval(
+                "select pg_try_advisory_lock_shared($1, $2)", LockID.WALLET.value, wallet_1.id
+            )
+    finally:
+        await other_connection.close()
+
+    locks_count = await test_db.execute(WALLET_LOCKS_QUERY)
+    assert locks_count == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_lock_timeout(test_db):
+    """Test failed locking of wallets (lock is held by another session)."""
+
+    other_connection = await asyncpg.connect(settings.BILLING_DB_DSN)
+    try:
+        await other_connection.execute("select pg_advisory_lock($1, $2)", LockID.WALLET.value, 2)
+        tx_manager = SQLTransactionManager(db=test_db, lock_timeout=50, lock_retries=1)
+        with pytest.raises(LockNotAcquired):
+            async with tx_manager.wallet_lock(
+                isolation_level=IsolationLevels.SERIALIZABLE,
+                wallet_ids=[1, 2],
+            ):
+                pass
+    finally:
+        await other_connection.close()
+
+    locks_count = await test_db.execute(WALLET_LOCKS_QUERY)
+    assert locks_count == 0
+
+
+@pytest.mark.asyncio
+async def test_success_run_with_retries(test_db):
+    """Test transaction is executed once again after serialization failure and deadlock."""
+
+    tx_manager = SQLTransactionManager(db=test_db, tx_retries=2, tx_retry_base_delay=1)
+    transaction_fn = AsyncMock(
+        side_effect=[SerializationError("conflict"), DeadlockDetectedError("deadlock"), 42]
+    )
+
+    assert await tx_manager.run_with_retries(transaction_fn) == 42
+    assert transaction_fn.await_count == 3
+    assert tx_manager.retry_metrics.as_dict() == {
+        "transactions": 1,
+        "retries": {"40001": 1, "40P01": 1},
+        "exhausted": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_failed_run_with_retries(test_db):
+    """Test retries are limited and not retryable errors are raised immediately."""
+
+    tx_manager = SQLTransactionManager(db=test_db, tx_retries=1, tx_retry_base_delay=1)
+    transaction_fn = AsyncMock(side_effect=SerializationError("conflict"))
+    with pytest.raises(TransactionRetriesExhausted):
+        await tx_manager.run_with_retries(transaction_fn)
+    assert transaction_fn.await_count == 2
+    assert tx_manager.retry_metrics.exhausted == 1
+
+    transaction_fn = AsyncMock(side_effect=ValueError("Insufficient funds"))
+    with pytest.raises(ValueError):
+        await tx_manager.run_with_retries(transaction_fn)
+    assert transaction_fn.await_count == 1
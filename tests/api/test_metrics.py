@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_success_transactions_metrics(client):
+    """Test receiving of transaction retry counters."""
+
+    response = await client.post("/api/users", json={"email": "metrics@example.com"})
+    assert response.status_code == 201
+
+    response = await client.get("/api/metrics/transactions")
+    assert response.status_code == 200
+    assert response.json() == {"transactions": 1, "retries": {}, "exhausted": 0}
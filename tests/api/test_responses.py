@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from app.entities.currency import CurrencyEnum
+from app.entities.user import CreateUserResult, CreateUsersResult, User
+from app.entities.wallet import (
+    TransferBatchModes,
+    WalletBalance,
+    WalletBatchTransferResult,
+    WalletEntity,
+    WalletTransferResult,
+)
+from app.entities.wallet_operation import Operations, WalletOperationEntity, WalletOperationsPage
+from app.transport.http import api_router
+from app.transport.http.responses import FastJSONResponse, dumps
+
+USER = User(
+    id=1, email="user@mail.com", wallet_id=2, balance=Decimal("12345678.91"), currency="USD"
+)
+PAGE = WalletOperationsPage(
+    items=[
+        WalletOperationEntity(
+            id=3,
+            operation=Operations.DEPOSIT,
+            wallet_from=None,
+            wallet_to=2,
+            amount=Decimal("10.50"),
+            created_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+    ]
+)
+# Instances of response models of all endpoints
+RESPONSES = {
+    User: USER,
+    CreateUsersResult: CreateUsersResult(
+        results=[
+            CreateUserResult(email=USER.email, user=USER),
+            CreateUserResult(email="other@mail.com", error="User already exists"),
+        ]
+    ),
+    WalletEntity: WalletEntity(id=2, user_id=1, balance=Decimal("0.10"), currency=CurrencyEnum.USD),
+    WalletBalance: WalletBalance(
+        wallet_id=2, at=datetime(2026, 1, 1, tzinfo=timezone.utc), balance=Decimal("100.00")
+    ),
+    WalletBatchTransferResult: WalletBatchTransferResult(
+        mode=TransferBatchModes.BEST_EFFORT,
+        results=[
+            WalletTransferResult(wallet_from=2, wallet_to=4, amount=Decimal("1.5"), success=True),
+            WalletTransferResult(
+                wallet_from=2,
+                wallet_to=5,
+                amount=Decimal("100"),
+                success=False,
+                error="Insufficient funds",
+            ),
+        ],
+    ),
+    WalletOperationsPage: PAGE,
+}
+
+
+def test_success_models_serialization():
+    """Test models are serialized with decimals as exact numbers."""
+
+    assert json.loads(dumps(USER)) == {
+        "id": 1,
+        "email": "user@mail.com",
+        "wallet_id": 2,
+        "balance": 12345678.91,
+        "currency": "USD",
+    }
+    assert json.loads(dumps({"page": PAGE})) == {
+        "page": {
+            "items": [
+                {
+                    "id": 3,
+                    "operation": "DEPOSIT",
+                    "wallet_from": None,
+                    "wallet_to": 2,
+                    "amount": 10.5,
+                    "created_at": "2026-01-01T00:00:00+00:00",
+                }
+            ],
+            "next_cursor": None,
+        }
+    }
+    # Digits are not lost in float conversion
+    assert dumps({"balance": Decimal("123456789012345678.90")}) == (
+        b'{"balance":123456789012345678.90}'
+    )
+    with pytest.raises(TypeError):
+        dumps(object())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "route",
+    [
+        route
+        for route in api_router.routes
+        if isinstance(route, APIRoute) and route.response_model is not None
+    ],
+    ids=lambda route: f"{route.name}-{route.path}",
+)
+async def test_fast_response_matches_default(route):
+    """Test response models are rendered like FastAPI renders them by default."""
+
+    content = RESPONSES[route.response_model]
+    default = JSONResponse(
+        await serialize_response(field=route.response_field, response_content=content)
+    )
+
+    assert json.loads(FastJSONResponse(content).body, parse_float=Decimal) == json.loads(
+        default.body, parse_float=Decimal
+    )
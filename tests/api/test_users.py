@@ -89,3 +89,103 @@ async def test_failed_user_enroll_wrong_amount_type(client, wallet_factory):
 
     res = await client.put(f"/api/users/{wallet.user_id}/enroll", json={"amount": "abc"})
     assert res.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_success_users_bulk_creation(client, test_db, user_factory):
+    """Test success bulk user creation (with duplicated and existing emails)."""
+
+    user = user_factory()
+    wallets_count = await test_db.execute("select count(*) from wallets")
+    wo_count = await test_db.execute("select count(*) from wallet_operations")
+    params = {
+        "users": [
+            {"email": "first@mail.com"},
+            {"email": user.email},
+            {"email": "second@mail.com"},
+            {"email": "first@mail.com"},
+        ]
+    }
+    res = await client.post("/api/users:bulk", json=params)
+    assert res.status_code == 200
+    results = res.json()["results"]
+    assert [result["email"] for result in results] == [
+        "first@mail.com",
+        user.email,
+        "second@mail.com",
+        "first@mail.com",
+    ]
+    assert results[0]["user"]["balance"] == 0
+    assert results[1]["error"] == "User with this email already exists."
+    assert results[2]["user"]["email"] == "second@mail.com"
+    assert results[3]["error"] == "User with this email already exists."
+
+    new_wallets_count = await test_db.execute("select count(*) from wallets")
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations")
+    assert new_wallets_count == wallets_count + 2
+    assert new_wo_count == wo_count + 2
+
+
+@pytest.mark.asyncio
+async def test_failed_users_bulk_creation_empty(client):
+    """Test failed bulk user creation (list of users is empty)."""
+
+    res = await client.post("/api/users:bulk", json={"users": []})
+    assert res.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_success_user_get(client, wallet_factory):
+    """Test success receiving of user with balance."""
+
+    wallet = wallet_factory.create(balance=Decimal("15.50"))
+
+    res = await client.get(f"/api/users/{wallet.user.id}")
+    assert res.status_code == 200
+    assert res.json()["wallet_id"] == wallet.id
+    assert Decimal(str(res.json()["balance"])) == Decimal("15.50")
+
+
+@pytest.mark.asyncio
+async def test_failed_user_get(client):
+    """Test failed receiving of user (user does not exist)."""
+
+    res = await client.get("/api/users/0")
+    assert res.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_success_user_enroll_replay(client, wallet_factory):
+    """Test repeated enrollment with the same idempotency key is applied once."""
+
+    wallet = wallet_factory.create()
+    headers = {"Idempotency-Key": "enroll-1"}
+
+    first = await client.put(
+        f"/api/users/{wallet.user.id}/enroll", json={"amount": 10}, headers=headers
+    )
+    second = await client.put(
+        f"/api/users/{wallet.user.id}/enroll", json={"amount": 10}, headers=headers
+    )
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+
+    res = await client.get(f"/api/users/{wallet.user.id}")
+    assert res.json()["balance"] == 110
+
+
+@pytest.mark.asyncio
+async def test_failed_user_enroll_key_reused(client, wallet_factory):
+    """Test idempotency key can not be reused by other request."""
+
+    wallet = wallet_factory.create()
+    headers = {"Idempotency-Key": "enroll-2"}
+
+    res = await client.put(
+        f"/api/users/{wallet.user.id}/enroll", json={"amount": 10}, headers=headers
+    )
+    assert res.status_code == 200
+    res = await client.put(
+        f"/api/users/{wallet.user.id}/enroll", json={"amount": 20}, headers=headers
+    )
+    assert res.status_code == 422
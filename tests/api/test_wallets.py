@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from app.repositories.users import UserRepository
@@ -135,3 +137,279 @@ async def test_failed_wallet_transfer_wallets_not_enough_resources(
 
     assert new_user_data_1.balance == 100
     assert new_user_data_2.balance == 100
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_transfer_batch(client, test_db, user_factory, wallet_factory):
+    """Test success batch wallet transfer."""
+
+    user_repo = UserRepository(db=test_db)
+    base_user_1 = user_factory.create()
+    wallet_1 = wallet_factory.create(user=base_user_1)
+
+    base_user_2 = user_factory.create()
+    wallet_2 = wallet_factory.create(user=base_user_2)
+
+    wo_count = await test_db.execute("select count(*) from wallet_operations")
+    params = {
+        "transfers": [
+            {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": 50},
+            {"wallet_from": wallet_2.id, "wallet_to": wallet_1.id, "amount": 130},
+        ],
+    }
+    response = await client.post("/api/wallets/transfers:batch", json=params)
+
+    assert response.status_code == 200
+    assert response.json()["mode"] == "atomic"
+    assert all(result["success"] for result in response.json()["results"])
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations")
+    new_user_data_1 = await user_repo.get_by_id(user_id=base_user_1.id)
+    new_user_data_2 = await user_repo.get_by_id(user_id=base_user_2.id)
+
+    assert new_user_data_1.balance == 180
+    assert new_user_data_2.balance == 20
+    assert new_wo_count == wo_count + 4
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_transfer_batch_atomic(client, test_db, user_factory, wallet_factory):
+    """Test failed batch wallet transfer (one of transfers fails in atomic mode)."""
+
+    user_repo = UserRepository(db=test_db)
+    base_user_1 = user_factory.create()
+    wallet_1 = wallet_factory.create(user=base_user_1)
+
+    base_user_2 = user_factory.create()
+    wallet_2 = wallet_factory.create(user=base_user_2)
+
+    params = {
+        "mode": "atomic",
+        "transfers": [
+            {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": 50},
+            {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": 60},
+        ],
+    }
+    response = await client.post("/api/wallets/transfers:batch", json=params)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert not any(result["success"] for result in results)
+    assert results[1]["error"] == "Insufficient funds"
+    new_user_data_1 = await user_repo.get_by_id(user_id=base_user_1.id)
+    new_user_data_2 = await user_repo.get_by_id(user_id=base_user_2.id)
+
+    assert new_user_data_1.balance == 100
+    assert new_user_data_2.balance == 100
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_transfer_batch_best_effort(
+    client, test_db, user_factory, wallet_factory
+):
+    """Test batch wallet transfer (one of transfers fails in best effort mode)."""
+
+    user_repo = UserRepository(db=test_db)
+    base_user_1 = user_factory.create()
+    wallet_1 = wallet_factory.create(user=base_user_1)
+
+    base_user_2 = user_factory.create()
+    wallet_2 = wallet_factory.create(user=base_user_2)
+
+    params = {
+        "mode": "best_effort",
+        "transfers": [
+            {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": 50},
+            {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id + 1, "amount": 10},
+        ],
+    }
+    response = await client.post("/api/wallets/transfers:batch", json=params)
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["success"]
+    assert not results[1]["success"]
+    assert results[1]["error"] == "Destination wallet does not exists"
+    new_user_data_1 = await user_repo.get_by_id(user_id=base_user_1.id)
+    new_user_data_2 = await user_repo.get_by_id(user_id=base_user_2.id)
+
+    assert new_user_data_1.balance == 50
+    assert new_user_data_2.balance == 150
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_operations_list(client, user_factory, wallet_factory):
+    """Test success receiving of wallet operations with pagination and filters."""
+
+    wallet_1 = wallet_factory.create(user=user_factory.create())
+    wallet_2 = wallet_factory.create(user=user_factory.create())
+    for amount in (10, 20, 30):
+        params = {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": amount}
+        response = await client.post("/api/wallets/transfer", json=params)
+        assert response.status_code == 200
+
+    response = await client.get(f"/api/wallets/{wallet_1.id}/operations", params={"limit": 4})
+    assert response.status_code == 200
+    page = response.json()
+    assert len(page["items"]) == 4
+    assert page["items"][0]["amount"] == 30
+    assert page["next_cursor"] == page["items"][-1]["id"]
+
+    response = await client.get(
+        f"/api/wallets/{wallet_1.id}/operations",
+        params={"limit": 4, "cursor": page["next_cursor"]},
+    )
+    next_page = response.json()
+    assert len(next_page["items"]) == 2
+    assert next_page["next_cursor"] is None
+
+    response = await client.get(
+        f"/api/wallets/{wallet_1.id}/operations",
+        params={"operation": "WITHDRAWAL", "amount_min": 15, "amount_max": 25},
+    )
+    items = response.json()["items"]
+    assert [(item["operation"], item["amount"]) for item in items] == [("WITHDRAWAL", 20)]
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_operations_list(client):
+    """Test failed receiving of wallet operations (wallet does not exist, page is too big)."""
+
+    response = await client.get("/api/wallets/1/operations")
+    assert response.status_code == 404
+
+    response = await client.get("/api/wallets/1/operations", params={"limit": 100000})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_get(client, wallet_factory):
+    """Test success receiving of wallet with balance."""
+
+    wallet = wallet_factory.create()
+
+    response = await client.get(f"/api/wallets/{wallet.id}")
+    assert response.status_code == 200
+    assert response.json()["user_id"] == wallet.user.id
+    assert response.json()["balance"] == 100
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_get(client):
+    """Test failed receiving of wallet (wallet does not exist)."""
+
+    response = await client.get("/api/wallets/0")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_transfer_replay(client, test_db, wallet_factory):
+    """Test repeated transfer with the same idempotency key is applied once."""
+
+    user_repo = UserRepository(db=test_db)
+    wallet_1 = wallet_factory.create()
+    wallet_2 = wallet_factory.create()
+    params = {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": 30}
+
+    for _ in range(2):
+        response = await client.post(
+            "/api/wallets/transfer", json=params, headers={"Idempotency-Key": "transfer-1"}
+        )
+        assert response.status_code == 200
+        assert response.json()["balance"] == 70
+
+    assert (await user_repo.get_by_id(user_id=wallet_1.user.id)).balance == 70
+    assert (await user_repo.get_by_id(user_id=wallet_2.user.id)).balance == 130
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_balance_at(client, test_db, user_factory, wallet_factory):
+    """Test success receiving of wallet balance at given moment."""
+
+    wallet_1 = wallet_factory.create(user=user_factory.create())
+    wallet_2 = wallet_factory.create(user=user_factory.create())
+    params = {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": 10}
+    response = await client.post("/api/wallets/transfer", json=params)
+    assert response.status_code == 200
+    now = await test_db.fetch_val("select clock_timestamp()")
+
+    response = await client.get(
+        f"/api/wallets/{wallet_2.id}/balance", params={"at": now.isoformat()}
+    )
+    assert response.status_code == 200
+    assert response.json()["wallet_id"] == wallet_2.id
+    assert response.json()["balance"] == 10
+
+    response = await client.get(
+        f"/api/wallets/{wallet_2.id}/balance", params={"at": "2000-01-01T00:00:00"}
+    )
+    assert response.status_code == 200
+    assert response.json()["balance"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_balance_at(client):
+    """Test failed receiving of wallet balance (wallet does not exist, moment is missing)."""
+
+    response = await client.get("/api/wallets/0/balance", params={"at": "2000-01-01T00:00:00"})
+    assert response.status_code == 404
+
+    response = await client.get("/api/wallets/0/balance")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_operations_export(client, user_factory, wallet_factory):
+    """Test success streaming export of wallet operations as CSV and gzipped NDJSON."""
+
+    wallet_1 = wallet_factory.create(user=user_factory.create())
+    wallet_2 = wallet_factory.create(user=user_factory.create())
+    for amount in (10, 20):
+        params = {"wallet_from": wallet_1.id, "wallet_to": wallet_2.id, "amount": amount}
+        response = await client.post("/api/wallets/transfer", json=params)
+        assert response.status_code == 200
+
+    response = await client.get(f"/api/wallets/{wallet_1.id}/operations/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0] == "id,operation,wallet_from,wallet_to,amount,created_at"
+    assert [line.split(",")[1:5] for line in lines[1:]] == [
+        ["WITHDRAWAL", str(wallet_1.id), str(wallet_2.id), "10.00"],
+        ["DEPOSIT", str(wallet_2.id), str(wallet_1.id), "10.00"],
+        ["WITHDRAWAL", str(wallet_1.id), str(wallet_2.id), "20.00"],
+        ["DEPOSIT", str(wallet_2.id), str(wallet_1.id), "20.00"],
+    ]
+
+    response = await client.get(
+        f"/api/wallets/{wallet_1.id}/operations/export",
+        params={"format": "ndjson", "to": "2000-01-01T00:00:00+00:00"},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == ""
+
+    response = await client.get(
+        f"/api/wallets/{wallet_1.id}/operations/export",
+        params={"format": "ndjson"},
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [(item["operation"], item["amount"]) for item in items] == [
+        ("WITHDRAWAL", 10),
+        ("DEPOSIT", 10),
+        ("WITHDRAWAL", 20),
+        ("DEPOSIT", 20),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_operations_export(client):
+    """Test failed export of wallet operations (wallet does not exist, unknown format)."""
+
+    response = await client.get("/api/wallets/0/operations/export")
+    assert response.status_code == 404
+
+    response = await client.get("/api/wallets/0/operations/export", params={"format": "xml"})
+    assert response.status_code == 422
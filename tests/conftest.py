@@ -6,12 +6,26 @@ from databases.core import Database
 from httpx import AsyncClient
 from mock import AsyncMock
 
+from app import settings
+from app.adapters.cache import BalanceCache, LRUCache
 from app.adapters.sql.db import connect_db, disconnect_db, get_db
-from app.adapters.sql.models import users, wallet_operations, wallets
+from app.adapters.sql.models import (
+    idempotency_keys,
+    import_progress,
+    outbox,
+    reconciliation_progress,
+    users,
+    wallet_operations,
+    wallets,
+)
+from app.adapters.sql.pool import AsyncpgDatabase
+from app.adapters.sql.replica import ReplicaMonitor
 from app.adapters.sql.tx import SQLTransactionManager
 
 # pylint: disable=no-name-in-module
 from app.main import init_app
+from app.repositories.idempotency import IdempotencyKeyRepository
+from app.repositories.outbox import OutboxRepository
 from app.repositories.users import UserRepository
 from app.repositories.wallet import WalletRepository
 from app.repositories.wallet_operations import WalletOperationRepository
@@ -30,6 +44,13 @@ async def prepare_db(test_db):
     await test_db.execute(query=users.delete())
     await test_db.execute(query=wallets.delete())
     await test_db.execute(query=wallet_operations.delete())
+    await test_db.execute(query=idempotency_keys.delete())
+    await test_db.execute(query=outbox.delete())
+    await test_db.execute(query=import_progress.delete())
+    # Ledger totals are deleted together with wallets
+    await test_db.execute(
+        query=reconciliation_progress.update().values(last_operation_id=0, processed=0)
+    )
 
     # Unlock all advisory locks
     await test_db.execute(query="select pg_advisory_unlock_all()")
@@ -63,6 +84,16 @@ async def test_db(test_db_instance):
         await test_db_instance.disconnect()
 
 
+@pytest.fixture
+async def pool_db() -> AsyncGenerator:
+    """Retrieve connected instance of asyncpg database."""
+
+    db = AsyncpgDatabase(settings.BILLING_DB_DSN, min_size=1, max_size=5)
+    await db.connect()
+    yield db
+    await db.disconnect()
+
+
 @pytest.fixture
 def user_factory():
     """UserFactory as pytest factory"""
@@ -107,17 +138,34 @@ async def client(test_db_instance) -> AsyncGenerator:
     user_repo = UserRepository(db=test_db)
     wallet_repo = WalletRepository(db=test_db)
     wallet_operation_repo = WalletOperationRepository(db=test_db)
+    outbox_repo = OutboxRepository(db=test_db)
+    balance_cache = BalanceCache()
+    # Test database plays the role of the replica too
+    replica_db = Database(
+        settings.BILLING_DB_DSN, server_settings={"default_transaction_read_only": "on"}
+    )
+    replica = ReplicaMonitor(db=replica_db)
     user_usecase = UserUsecase(
         tx_manager=tx_manager,
         user_repo=user_repo,
         wallet_repo=wallet_repo,
         wallet_operation_repo=wallet_operation_repo,
+        cache=balance_cache,
+        replica=replica,
+        replica_user_repo=UserRepository(db=replica_db),
+        outbox_repo=outbox_repo,
     )
     wallet_usecase = WalletUsecase(
         tx_manager=tx_manager,
         user_repo=user_repo,
         wallet_repo=wallet_repo,
         wallet_operation_repo=wallet_operation_repo,
+        cache=balance_cache,
+        replica=replica,
+        replica_wallet_repo=WalletRepository(db=replica_db),
+        idempotency_repo=IdempotencyKeyRepository(db=test_db),
+        idempotency_cache=LRUCache(ttl=60, max_entries=100, max_bytes=10**6),
+        outbox_repo=outbox_repo,
     )
     app = init_app(
         connect_db=connect_db,
@@ -125,6 +173,9 @@ async def client(test_db_instance) -> AsyncGenerator:
         router=api_router,
         user_usecase=user_usecase,
         wallet_usecase=wallet_usecase,
+        tx_manager=tx_manager,
+        balance_cache=balance_cache,
+        replica=replica,
     )
     async with AsyncClient(
         app=app,
@@ -132,3 +183,4 @@ async def client(test_db_instance) -> AsyncGenerator:
         headers={"Content-Type": "application/json"},
     ) as client_data:
         yield client_data
+    await replica.disconnect()
@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+import pytest
+
+from app.adapters.sql.tx import AsyncpgTransactionManager, IsolationLevels
+from app.entities.wallet import WalletDoesNotExist
+from app.entities.wallet_operation import CreateWalletOperation, Operations
+from app.repositories.users import AsyncpgUserRepository
+from app.repositories.wallet import AsyncpgWalletRepository
+from app.repositories.wallet_operations import AsyncpgWalletOperationRepository
+
+
+@pytest.mark.asyncio
+async def test_success_asyncpg_users_and_wallets_creation(pool_db):
+    """Test creation and receiving of users and wallets through asyncpg repositories."""
+
+    user_repo = AsyncpgUserRepository(db=pool_db)
+    wallet_repo = AsyncpgWalletRepository(db=pool_db)
+
+    user_id = await user_repo.create(email="first@example.com")
+    created_users = await user_repo.create_many(emails=["first@example.com", "second@example.com"])
+    assert [user.email for user in created_users] == ["second@example.com"]
+
+    wallet_ids = await wallet_repo.create_many(user_ids=[user_id, created_users[0].id])
+    users = await user_repo.get_by_ids(user_ids=[user_id, created_users[0].id])
+    assert sorted(user.wallet_id for user in users) == sorted(wallet_ids)
+
+    user = await user_repo.get_by_wallet_id(wallet_id=wallet_ids[0])
+    assert user.id == user_id
+    assert (await wallet_repo.get_by_user_id(user_id=user_id)).id == wallet_ids[0]
+    assert await user_repo.get_by_id(user_id=0) is None
+
+
+@pytest.mark.asyncio
+async def test_success_asyncpg_transfer_within_transaction(pool_db, wallet_factory):
+    """Test repositories join the transaction of asyncpg transaction manager."""
+
+    source = wallet_factory.create(balance=Decimal("100"))
+    destination = wallet_factory.create(balance=Decimal("0"))
+    tx_manager = AsyncpgTransactionManager(db=pool_db)
+    wallet_repo = AsyncpgWalletRepository(db=pool_db)
+    wallet_operation_repo = AsyncpgWalletOperationRepository(db=pool_db)
+
+    with pytest.raises(ValueError):
+        async with tx_manager.wallet_lock(
+            isolation_level=IsolationLevels.SERIALIZABLE,
+            wallet_ids=[source.id, destination.id],
+        ):
+            await wallet_repo.update_balances(
+                deltas={source.id: Decimal("-10"), destination.id: Decimal("10")}
+            )
+            await wallet_operation_repo.create_many(
+                operations=[
+                    CreateWalletOperation(
+                        operation=Operations.WITHDRAWAL,
+                        wallet_from=source.id,
+                        wallet_to=destination.id,
+                        amount=Decimal("10"),
+                    )
+                ]
+            )
+            raise ValueError("Transaction error")
+
+    assert (await wallet_repo.get_by_id(wallet_id=source.id)).balance == Decimal("100")
+    assert await wallet_operation_repo.list_by_wallet(source.id, limit=10) == []
+
+    user = await wallet_repo.transfer_with_operations(
+        source_wallet_id=source.id, destination_wallet_id=destination.id, amount=Decimal("30")
+    )
+    assert user.balance == Decimal("70")
+    operations = await wallet_operation_repo.list_by_wallet(
+        source.id, limit=10, operation=Operations.DEPOSIT
+    )
+    assert [operation.amount for operation in operations] == [Decimal("30")]
+
+    with pytest.raises(WalletDoesNotExist):
+        await wallet_repo.transfer_with_operations(
+            source_wallet_id=0, destination_wallet_id=destination.id, amount=Decimal("1")
+        )
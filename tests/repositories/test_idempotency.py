@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.adapters.sql.models import idempotency_keys
+from app.repositories.idempotency import IdempotencyKeyRepository
+
+
+@pytest.mark.asyncio
+async def test_success_idempotency_key_claim(test_db):
+    """Test new key is claimed and stored response is returned for used key."""
+
+    repository = IdempotencyKeyRepository(db=test_db)
+
+    assert await repository.claim(key="key-1", request_hash="hash") is None
+    await repository.save_response(key="key-1", response='{"id": 1}')
+
+    record = await repository.claim(key="key-1", request_hash="other")
+    assert record.request_hash == "hash"
+    assert record.response == '{"id": 1}'
+
+
+@pytest.mark.asyncio
+async def test_success_idempotency_keys_deletion(test_db):
+    """Test expired keys are deleted in batches."""
+
+    repository = IdempotencyKeyRepository(db=test_db)
+    now = datetime.now(timezone.utc)
+    await test_db.execute_many(
+        query=idempotency_keys.insert(),
+        values=[
+            {"key": f"key-{index}", "request_hash": "hash", "created_at": now - timedelta(days=2)}
+            for index in range(3)
+        ]
+        + [{"key": "fresh", "request_hash": "hash", "created_at": now}],
+    )
+
+    before = now - timedelta(days=1)
+    assert await repository.delete_expired(before=before, limit=2) == 2
+    assert await repository.delete_expired(before=before, limit=2) == 1
+    assert await repository.delete_expired(before=before, limit=2) == 0
+    assert (
+        await test_db.fetch_val(
+            idempotency_keys.select().with_only_columns([idempotency_keys.c.key])
+        )
+        == "fresh"
+    )
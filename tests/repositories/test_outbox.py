@@ -0,0 +1,57 @@
+import asyncpg
+import pytest
+
+from app import settings
+from app.entities.outbox import CreateOutboxEvent, OutboxEventTypes
+from app.repositories.outbox import CLAIM_EVENTS_QUERY, OutboxRepository
+
+
+@pytest.mark.asyncio
+async def test_success_outbox_events_relay_cycle(test_db):
+    """Test events are claimed in order of writing and deleted after delivery."""
+
+    repository = OutboxRepository(db=test_db)
+    await repository.add_many(
+        events=[
+            CreateOutboxEvent(
+                event_type=OutboxEventTypes.DEPOSIT,
+                payload={"wallet_from": None, "wallet_to": index, "amount": "10.00"},
+            )
+            for index in range(3)
+        ]
+    )
+
+    events = await repository.claim(limit=2)
+    assert [event.payload["wallet_to"] for event in events] == [0, 1]
+    assert events[0].event_type == OutboxEventTypes.DEPOSIT
+
+    await repository.delete(ids=[event.id for event in events])
+    events = await repository.claim(limit=2)
+    assert [event.payload["wallet_to"] for event in events] == [2]
+
+
+@pytest.mark.asyncio
+async def test_outbox_events_locked_by_other_relay_are_skipped(test_db):
+    """Test relays claim different batches of events."""
+
+    repository = OutboxRepository(db=test_db)
+    await repository.add_many(
+        events=[
+            CreateOutboxEvent(event_type=OutboxEventTypes.USER_CREATED, payload={"user_id": index})
+            for index in range(4)
+        ]
+    )
+
+    other_connection = await asyncpg.connect(settings.BILLING_DB_DSN)
+    try:
+        async with other_connection.transaction():
+            other_rows = await other_connection.fetch(
+                CLAIM_EVENTS_QUERY.sql, *CLAIM_EVENTS_QUERY.args({"limit": 3})
+            )
+            async with test_db.transaction():
+                events = await repository.claim(limit=3)
+    finally:
+        await other_connection.close()
+
+    assert len(other_rows) == 3
+    assert [event.payload["user_id"] for event in events] == [3]
@@ -39,6 +39,20 @@ async def test_failed_user_creation_email_empty(test_db):
         await repository.create("")
 
 
+@pytest.mark.asyncio
+async def test_success_users_bulk_creation(test_db, user_factory):
+    """Test success bulk user creation (existing emails are skipped)"""
+
+    repository = UserRepository(db=test_db)
+    user_factory(email="example@mail.com")
+    users_count = await test_db.execute("select count(*) from users")
+
+    users = await repository.create_many(["example@mail.com", "other@mail.com"])
+    new_users_count = await test_db.execute("select count(*) from users")
+    assert [user.email for user in users] == ["other@mail.com"]
+    assert new_users_count == users_count + 1
+
+
 @pytest.mark.asyncio
 async def test_success_user_by_id_receiving(test_db, user_factory, wallet_factory):
     """Test success user receiving with user id"""
@@ -88,3 +102,15 @@ async def test_failed_user_by_wallet_id_receiving(test_db):
 
     user = await repository.get_by_wallet_id(wallet_id=1)
     assert user is None
+
+
+@pytest.mark.asyncio
+async def test_success_users_by_ids_receiving(test_db, wallet_factory):
+    """Test success users receiving with user ids"""
+
+    repository = UserRepository(db=test_db)
+    wallet_1 = wallet_factory.create()
+    wallet_2 = wallet_factory.create()
+
+    users = await repository.get_by_ids([wallet_1.user_id, wallet_2.user_id])
+    assert sorted(user.wallet_id for user in users) == [wallet_1.id, wallet_2.id]
@@ -1,9 +1,12 @@
+import asyncio
 from decimal import Decimal
 
+import asyncpg
 import asyncpg.exceptions as aioexceptions
 import pytest
 
-from app.entities.wallet import WalletEntity
+from app import settings
+from app.entities.wallet import WalletDoesNotExist, WalletEntity
 from app.repositories.wallet import WalletRepository
 
 
@@ -90,6 +93,71 @@ async def test_failed_wallet_enroll(test_db):
     assert wallet_id is None
 
 
+@pytest.mark.asyncio
+async def test_success_receiving_wallets_by_ids(test_db, wallet_factory):
+    """Test success receiving wallets by ids."""
+
+    wallet_1 = wallet_factory.create()
+    wallet_2 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    wallets = await repository.get_by_ids(wallet_ids=[wallet_1.id, wallet_2.id, wallet_2.id + 1])
+    assert sorted(wallet.id for wallet in wallets) == [wallet_1.id, wallet_2.id]
+
+
+@pytest.mark.asyncio
+async def test_success_wallets_update_balances(test_db, wallet_factory):
+    """Test success update of several wallet balances."""
+
+    wallet_1 = wallet_factory.create()
+    wallet_2 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    wallet_ids = await repository.update_balances(
+        deltas={wallet_1.id: Decimal("-10.5"), wallet_2.id: Decimal("10.5")}
+    )
+    refreshed_wallet_1 = await repository.get_by_id(wallet_1.id)
+    refreshed_wallet_2 = await repository.get_by_id(wallet_2.id)
+    assert sorted(wallet_ids) == [wallet_1.id, wallet_2.id]
+    assert refreshed_wallet_1.balance == wallet_1.balance - Decimal("10.5")
+    assert refreshed_wallet_2.balance == wallet_2.balance + Decimal("10.5")
+
+
+@pytest.mark.asyncio
+async def test_failed_wallets_update_balances(test_db, wallet_factory):
+    """Test failed update of several wallet balances (balance becomes negative)."""
+
+    wallet_1 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    with pytest.raises(aioexceptions.CheckViolationError):
+        await repository.update_balances(deltas={wallet_1.id: Decimal("-1000")})
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_enroll_with_operation(test_db, wallet_factory):
+    """Test success wallet enroll within single statement."""
+
+    wallet = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    wo_count = await test_db.execute("select count(*) from wallet_operations")
+    user = await repository.enroll_with_operation(user_id=wallet.user_id, amount=Decimal("10.0"))
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations")
+    assert user.id == wallet.user_id
+    assert user.wallet_id == wallet.id
+    assert user.balance == wallet.balance + Decimal("10.0")
+    assert new_wo_count == wo_count + 1
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_enroll_with_operation(test_db):
+    """Test failed wallet enroll within single statement (user does not exists)"""
+
+    repository = WalletRepository(db=test_db)
+    wo_count = await test_db.execute("select count(*) from wallet_operations")
+    user = await repository.enroll_with_operation(user_id=1, amount=Decimal("10.0"))
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations")
+    assert user is None
+    assert new_wo_count == wo_count
+
+
 @pytest.mark.asyncio
 async def test_success_wallet_transfer(test_db, wallet_factory):
     """Test success transfer between wallets function."""
@@ -121,3 +189,217 @@ async def test_failed_wallet_transfer(test_db, wallet_factory):
         await repository.transfer(
             source_wallet_id=1, destination_wallet_id=wallet_2.id, amount=Decimal("10")
         )
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_transfer_with_operations(test_db, wallet_factory):
+    """Test success transfer between wallets within single statement."""
+
+    wallet_1 = wallet_factory()
+    wallet_2 = wallet_factory()
+    repository = WalletRepository(db=test_db)
+    wo_count = await test_db.execute("select count(*) from wallet_operations")
+    user = await repository.transfer_with_operations(
+        source_wallet_id=wallet_1.id,
+        destination_wallet_id=wallet_2.id,
+        amount=Decimal("10"),
+    )
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations")
+    refreshed_wallet_2 = await repository.get_by_id(wallet_2.id)
+    assert user.id == wallet_1.user_id
+    assert user.wallet_id == wallet_1.id
+    assert user.balance == wallet_1.balance - Decimal("10")
+    assert refreshed_wallet_2.balance == wallet_2.balance + Decimal("10")
+    assert new_wo_count == wo_count + 2
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_transfer_with_operations_source(test_db, wallet_factory):
+    """
+    Test failed transfer between wallets within single statement
+    (source wallet does not exist).
+    """
+
+    wallet_2 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    with pytest.raises(WalletDoesNotExist):
+        await repository.transfer_with_operations(
+            source_wallet_id=wallet_2.id + 1,
+            destination_wallet_id=wallet_2.id,
+            amount=Decimal("10"),
+        )
+    refreshed_wallet_2 = await repository.get_by_id(wallet_2.id)
+    assert refreshed_wallet_2.balance == wallet_2.balance
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_transfer_with_operations_destination(test_db, wallet_factory):
+    """
+    Test failed transfer between wallets within single statement
+    (destination wallet does not exist).
+    """
+
+    wallet_1 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    with pytest.raises(WalletDoesNotExist):
+        await repository.transfer_with_operations(
+            source_wallet_id=wallet_1.id,
+            destination_wallet_id=wallet_1.id + 1,
+            amount=Decimal("10"),
+        )
+    refreshed_wallet_1 = await repository.get_by_id(wallet_1.id)
+    assert refreshed_wallet_1.balance == wallet_1.balance
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_transfer_with_operations_funds(test_db, wallet_factory):
+    """
+    Test failed transfer between wallets within single statement
+    (insufficient funds).
+    """
+
+    wallet_1 = wallet_factory()
+    wallet_2 = wallet_factory()
+    repository = WalletRepository(db=test_db)
+    wo_count = await test_db.execute("select count(*) from wallet_operations")
+    with pytest.raises(ValueError):
+        await repository.transfer_with_operations(
+            source_wallet_id=wallet_1.id,
+            destination_wallet_id=wallet_2.id,
+            amount=wallet_1.balance + Decimal("1"),
+        )
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations")
+    refreshed_wallet_2 = await repository.get_by_id(wallet_2.id)
+    assert refreshed_wallet_2.balance == wallet_2.balance
+    assert new_wo_count == wo_count
+
+
+@pytest.mark.asyncio
+async def test_success_sharded_wallet_balance(test_db, wallet_factory):
+    """Test balance of sharded wallet is the sum of its shards after credits and debits."""
+
+    wallet = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    balance = await repository.set_balance_shards(wallet_id=wallet.id, shards=4)
+    assert balance == Decimal("100.0")
+
+    for _ in range(8):
+        await repository.enroll(wallet_id=wallet.id, amount=Decimal("10"))
+    await repository.update_balances({wallet.id: Decimal("20")})
+    # Debit larger than any of the shards collects funds from several shards
+    await repository.transfer(
+        source_wallet_id=wallet.id, destination_wallet_id=wallet.id, amount=Decimal("150")
+    )
+    shards_count = await test_db.execute(
+        f"select count(*) from wallet_balance_shards where wallet_id = {wallet.id}"
+    )
+    refreshed_wallet = await repository.get_by_id(wallet_id=wallet.id)
+    assert shards_count == 4
+    assert refreshed_wallet.balance == Decimal("200.0")
+
+    balance = await repository.set_balance_shards(wallet_id=wallet.id, shards=0)
+    shards_count = await test_db.execute(
+        f"select count(*) from wallet_balance_shards where wallet_id = {wallet.id}"
+    )
+    assert balance == Decimal("200.0")
+    assert shards_count == 0
+    assert (await repository.get_by_id(wallet_id=wallet.id)).balance == Decimal("200.0")
+
+
+@pytest.mark.asyncio
+async def test_sharded_wallet_credit_blocks_resharding(test_db, wallet_factory):
+    """Test credit in flight is not lost when shards of the wallet are replaced."""
+
+    wallet = wallet_factory.create()
+    await WalletRepository(db=test_db).set_balance_shards(wallet_id=wallet.id, shards=4)
+
+    credit = await asyncpg.connect(settings.BILLING_DB_DSN)
+    reshard = await asyncpg.connect(settings.BILLING_DB_DSN)
+    try:
+        transaction = credit.transaction()
+        await transaction.start()
+        await credit.fetchval("select change_wallet_balance($1, 10)", wallet.id)
+        resharding = asyncio.create_task(
+            reshard.fetchval("select set_wallet_balance_shards($1, 2)", wallet.id)
+        )
+        await asyncio.sleep(0.1)
+        assert not resharding.done()
+
+        await transaction.commit()
+        assert await resharding == Decimal("110.00")
+    finally:
+        await credit.close()
+        await reshard.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_sharded_wallet_debit(test_db, wallet_factory):
+    """Test failed debit of sharded wallet (insufficient funds on all shards)."""
+
+    wallet_1 = wallet_factory.create()
+    wallet_2 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    await repository.set_balance_shards(wallet_id=wallet_1.id, shards=4)
+    with pytest.raises(aioexceptions.CheckViolationError):
+        await repository.transfer(
+            source_wallet_id=wallet_1.id,
+            destination_wallet_id=wallet_2.id,
+            amount=Decimal("100.01"),
+        )
+    with pytest.raises(ValueError):
+        await repository.transfer_with_operations(
+            source_wallet_id=wallet_1.id,
+            destination_wallet_id=wallet_2.id,
+            amount=Decimal("100.01"),
+        )
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_balance_snapshots(test_db, wallet_factory):
+    """Test balance at given moment is built from the snapshots and newer operations."""
+
+    wallet_1 = wallet_factory.create()
+    wallet_2 = wallet_factory.create()
+    repository = WalletRepository(db=test_db)
+    before_operations = await test_db.fetch_val("select clock_timestamp()")
+    await repository.enroll_with_operation(user_id=wallet_1.user_id, amount=Decimal("30"))
+    await repository.transfer_with_operations(
+        source_wallet_id=wallet_1.id, destination_wallet_id=wallet_2.id, amount=Decimal("10")
+    )
+    first_snapshot = await test_db.fetch_val("select clock_timestamp()")
+
+    last_wallet_id, snapshots = await repository.take_balance_snapshots(
+        taken_at=first_snapshot, after_wallet_id=wallet_1.id - 1, limit=2
+    )
+    assert last_wallet_id == wallet_2.id
+    assert snapshots == 2
+
+    await repository.transfer_with_operations(
+        source_wallet_id=wallet_1.id, destination_wallet_id=wallet_2.id, amount=Decimal("5")
+    )
+    second_snapshot = await test_db.fetch_val("select clock_timestamp()")
+    await repository.enroll_with_operation(user_id=wallet_2.user_id, amount=Decimal("1"))
+
+    # Only the wallets changed since the previous snapshot are snapshotted again
+    _, snapshots = await repository.take_balance_snapshots(
+        taken_at=second_snapshot, after_wallet_id=wallet_1.id - 1, limit=2
+    )
+    assert snapshots == 2
+    _, snapshots = await repository.take_balance_snapshots(
+        taken_at=second_snapshot, after_wallet_id=wallet_1.id - 1, limit=2
+    )
+    assert snapshots == 0
+    last_wallet_id, snapshots = await repository.take_balance_snapshots(
+        taken_at=second_snapshot, after_wallet_id=wallet_2.id, limit=2
+    )
+    assert last_wallet_id is None
+
+    # Factory wallets are created with balance without opening operation
+    assert await repository.get_balance_at(wallet_1.id, before_operations) == Decimal("0")
+    assert await repository.get_balance_at(wallet_1.id, first_snapshot) == Decimal("20")
+    assert await repository.get_balance_at(wallet_2.id, first_snapshot) == Decimal("10")
+    assert await repository.get_balance_at(wallet_1.id, second_snapshot) == Decimal("15")
+    assert await repository.get_balance_at(wallet_2.id, second_snapshot) == Decimal("15")
+    now = await test_db.fetch_val("select clock_timestamp()")
+    assert await repository.get_balance_at(wallet_2.id, now) == Decimal("16")
+    assert await repository.get_balance_at(wallet_2.id + 1, now) is None
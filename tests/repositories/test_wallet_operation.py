@@ -1,9 +1,11 @@
+from datetime import datetime, timezone
 from decimal import Decimal
 
 import pytest
 from asyncpg.exceptions import CheckViolationError
 
-from app.entities.wallet_operation import Operations
+from app.adapters.sql.models import wallet_operations
+from app.entities.wallet_operation import CreateWalletOperation, Operations
 from app.repositories.wallet_operations import WalletOperationRepository
 
 
@@ -33,3 +35,107 @@ async def test_failed_wallet_operation_creation(test_db):
             wallet_to=2,
             amount=Decimal("-100.00"),
         )
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_operations_bulk_creation(test_db):
+    """Test success creation of several wallet operations."""
+
+    repository = WalletOperationRepository(db=test_db)
+    wallet_operation_ids = await repository.create_many(
+        operations=[
+            CreateWalletOperation(
+                operation=Operations.WITHDRAWAL,
+                wallet_from=1,
+                wallet_to=2,
+                amount=Decimal("10.00"),
+            ),
+            CreateWalletOperation(
+                operation=Operations.DEPOSIT,
+                wallet_from=2,
+                wallet_to=1,
+                amount=Decimal("10.00"),
+            ),
+        ]
+    )
+    assert len(wallet_operation_ids) == 2
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_operations_list_by_wallet(test_db):
+    """Test success receiving of wallet operations (keyset pagination)."""
+
+    repository = WalletOperationRepository(db=test_db)
+    ids = [
+        await repository.create(
+            operation=Operations.DEPOSIT,
+            wallet_from=None,
+            wallet_to=1,
+            amount=Decimal(amount),
+        )
+        for amount in ("1.00", "2.00", "3.00")
+    ]
+    await repository.create(
+        operation=Operations.DEPOSIT, wallet_from=None, wallet_to=2, amount=Decimal("1.00")
+    )
+
+    first_page = await repository.list_by_wallet(1, limit=2)
+    second_page = await repository.list_by_wallet(1, limit=2, cursor=first_page[-1].id)
+    assert [operation.id for operation in first_page] == [ids[2], ids[1]]
+    assert [operation.id for operation in second_page] == [ids[0]]
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_operations_list_by_created_range(test_db):
+    """Test receiving of wallet operations created within time range."""
+
+    repository = WalletOperationRepository(db=test_db)
+    await test_db.execute_many(
+        query=wallet_operations.insert(),
+        values=[
+            {
+                "operation": Operations.DEPOSIT.value,
+                "wallet_to": 1,
+                "amount": Decimal("1.00"),
+                "created_at": datetime(2026, month, 15, tzinfo=timezone.utc),
+            }
+            for month in (1, 2, 3)
+        ],
+    )
+
+    operations = await repository.list_by_wallet(
+        1,
+        limit=10,
+        created_from=datetime(2026, 2, 1, tzinfo=timezone.utc),
+        created_to=datetime(2026, 3, 1, tzinfo=timezone.utc),
+    )
+    assert [operation.created_at.month for operation in operations] == [2]
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_operations_iterate_by_wallet(test_db):
+    """Test streaming of wallet operations within time range in chunks (oldest first)."""
+
+    repository = WalletOperationRepository(db=test_db)
+    await test_db.execute_many(
+        query=wallet_operations.insert(),
+        values=[
+            {
+                "operation": Operations.DEPOSIT.value,
+                "wallet_to": 1,
+                "amount": Decimal(month),
+                "created_at": datetime(2026, month, 15, tzinfo=timezone.utc),
+            }
+            for month in (1, 2, 3, 4, 5)
+        ],
+    )
+
+    chunks = [
+        chunk
+        async for chunk in repository.iterate_by_wallet(
+            1, chunk_size=2, created_from=datetime(2026, 2, 1, tzinfo=timezone.utc)
+        )
+    ]
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert [operation.amount for chunk in chunks for operation in chunk] == [2, 3, 4, 5]
+    assert chunks[0][0].operation == Operations.DEPOSIT
@@ -0,0 +1,59 @@
+import asyncio
+from decimal import Decimal
+from typing import List
+
+import pytest
+
+from app.entities.user import User
+from app.entities.wallet import WalletDeposit
+from app.usecases.coalescer import EnrollCoalescer
+
+
+@pytest.mark.asyncio
+async def test_coalescer_flushes_full_batch():
+    """Test batch is applied without waiting when it is full."""
+
+    batches: List[List[WalletDeposit]] = []
+
+    async def apply(deposits: List[WalletDeposit]):
+        batches.append(deposits)
+        return [
+            User(
+                id=deposit.user_id,
+                email="user@example.com",
+                wallet_id=deposit.user_id,
+                balance=deposit.amount,
+                currency="USD",
+            )
+            for deposit in deposits
+        ]
+
+    coalescer = EnrollCoalescer(apply, max_delay=10000, max_size=2)
+    users = await asyncio.wait_for(
+        asyncio.gather(
+            coalescer.enroll(user_id=1, amount=Decimal("1")),
+            coalescer.enroll(user_id=2, amount=Decimal("2")),
+        ),
+        timeout=1,
+    )
+
+    assert [user.id for user in users] == [1, 2]
+    assert len(batches) == 1
+    assert coalescer.metrics.as_dict() == {"batches": 1, "deposits": 2, "max_batch_size": 2}
+
+
+@pytest.mark.asyncio
+async def test_coalescer_fails_whole_batch():
+    """Test error of the batch is raised to each of the callers."""
+
+    async def apply(deposits: List[WalletDeposit]):
+        raise RuntimeError("Batch failed")
+
+    coalescer = EnrollCoalescer(apply, max_delay=1, max_size=10)
+    results = await asyncio.gather(
+        coalescer.enroll(user_id=1, amount=Decimal("1")),
+        coalescer.enroll(user_id=2, amount=Decimal("2")),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,98 @@
+import io
+import json
+from decimal import Decimal
+
+import pytest
+from mock import AsyncMock
+
+from app.adapters.sinks import StreamSink
+from app.adapters.sql.tx import SQLTransactionManager
+from app.repositories.outbox import OutboxRepository
+from app.repositories.users import UserRepository
+from app.repositories.wallet import WalletRepository
+from app.repositories.wallet_operations import WalletOperationRepository
+from app.usecases.outbox import OutboxRelay
+from app.usecases.user import UserUsecase
+from app.usecases.wallet import WalletUsecase, WriteStrategy
+
+
+@pytest.mark.asyncio
+async def test_success_outbox_relay(test_db):
+    """Test events of writes are delivered by relay in batches and deleted."""
+
+    tx_manager = SQLTransactionManager(db=test_db)
+    outbox_repo = OutboxRepository(db=test_db)
+    repos = dict(
+        tx_manager=tx_manager,
+        user_repo=UserRepository(db=test_db),
+        wallet_repo=WalletRepository(db=test_db),
+        wallet_operation_repo=WalletOperationRepository(db=test_db),
+        outbox_repo=outbox_repo,
+    )
+    user_usecase = UserUsecase(**repos)
+    wallet_usecase = WalletUsecase(**repos, write_strategy=WriteStrategy.STATEMENT)
+
+    user_1 = await user_usecase.create(email="first@example.com")
+    user_2 = await user_usecase.create(email="second@example.com")
+    await wallet_usecase.enroll(user_id=user_1.id, amount=Decimal("10.5"))
+    await wallet_usecase.transfer(
+        source_wallet_id=user_1.wallet_id,
+        destination_wallet_id=user_2.wallet_id,
+        amount=Decimal("3"),
+    )
+
+    stream = io.StringIO()
+    relay = OutboxRelay(
+        tx_manager=tx_manager, outbox_repo=outbox_repo, sink=StreamSink(stream), batch_size=3
+    )
+    assert await relay.relay_batch() == 3
+    assert await relay.relay_batch() == 2
+    assert await relay.relay_batch() == 0
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [event["event_type"] for event in events] == [
+        "USER_CREATED",
+        "USER_CREATED",
+        "DEPOSIT",
+        "WITHDRAWAL",
+        "DEPOSIT",
+    ]
+    assert events[0]["payload"]["wallet_id"] == user_1.wallet_id
+    assert events[2]["payload"] == {
+        "wallet_from": None,
+        "wallet_to": user_1.wallet_id,
+        "credited_wallet_id": user_1.wallet_id,
+        "debited_wallet_id": None,
+        "amount": "10.5",
+    }
+    # Both events of transfer have the same direction
+    for event in events[3:]:
+        assert event["payload"]["credited_wallet_id"] == user_2.wallet_id
+        assert event["payload"]["debited_wallet_id"] == user_1.wallet_id
+        assert event["payload"]["amount"] == "3"
+    assert relay.metrics.as_dict() == {"batches": 2, "events": 5, "failures": 0}
+
+
+@pytest.mark.asyncio
+async def test_failed_outbox_relay_delivery(test_db, user_factory):
+    """Test events stay in outbox if sink did not accept them."""
+
+    tx_manager = SQLTransactionManager(db=test_db)
+    outbox_repo = OutboxRepository(db=test_db)
+    user_usecase = UserUsecase(
+        tx_manager=tx_manager,
+        user_repo=UserRepository(db=test_db),
+        wallet_repo=WalletRepository(db=test_db),
+        wallet_operation_repo=WalletOperationRepository(db=test_db),
+        outbox_repo=outbox_repo,
+    )
+    await user_usecase.create_many(emails=["first@example.com", "second@example.com"])
+
+    sink = AsyncMock()
+    sink.deliver.side_effect = ConnectionError("sink is down")
+    relay = OutboxRelay(tx_manager=tx_manager, outbox_repo=outbox_repo, sink=sink)
+    with pytest.raises(ConnectionError):
+        await relay.relay_batch()
+
+    events_count = await test_db.execute("select count(*) from outbox")
+    assert events_count == 2
@@ -1,14 +1,19 @@
+import asyncio
 from decimal import Decimal
 
 import pytest
 
+from app.adapters.cache import BalanceCache
 from app.adapters.sql.tx import SQLTransactionManager
+from app.entities.idempotency import IdempotencyKeyReused
 from app.entities.user import UserDoesNotExist
 from app.entities.wallet import WalletDoesNotExist
+from app.repositories.idempotency import IdempotencyKeyRepository
 from app.repositories.users import UserRepository
 from app.repositories.wallet import WalletRepository
 from app.repositories.wallet_operations import WalletOperationRepository
-from app.usecases.wallet import WalletUsecase
+from app.usecases.user import UserUsecase
+from app.usecases.wallet import WalletUsecase, WriteStrategy
 
 
 @pytest.mark.asyncio
@@ -142,6 +147,50 @@ async def test_failed_wallet_enroll_usecase_wallet_operation(
     assert new_user.balance == wallet.balance
 
 
+@pytest.mark.asyncio
+async def test_success_wallet_enroll_usecase_statement(test_db, user_factory, wallet_factory):
+    """Test success wallet enroll usecase (single statement strategy)."""
+
+    user = user_factory.create()
+    wallet = wallet_factory.create(user=user)
+    old_balance = wallet.balance
+
+    tx_manager = SQLTransactionManager(db=test_db)
+    user_repo = UserRepository(db=test_db)
+    wallet_repo = WalletRepository(db=test_db)
+    wallet_operation_repo = WalletOperationRepository(db=test_db)
+
+    usecase = WalletUsecase(
+        tx_manager=tx_manager,
+        user_repo=user_repo,
+        wallet_repo=wallet_repo,
+        wallet_operation_repo=wallet_operation_repo,
+        write_strategy=WriteStrategy.STATEMENT,
+    )
+    new_user = await usecase.enroll(user_id=user.id, amount=Decimal("10.0"))
+    assert new_user.balance == old_balance + Decimal("10.0")
+
+
+@pytest.mark.asyncio
+async def test_failed_wallet_enroll_usecase_statement(test_db):
+    """Test failed wallet enroll usecase (single statement strategy, user does not exist)"""
+
+    tx_manager = SQLTransactionManager(db=test_db)
+    user_repo = UserRepository(db=test_db)
+    wallet_repo = WalletRepository(db=test_db)
+    wallet_operation_repo = WalletOperationRepository(db=test_db)
+
+    usecase = WalletUsecase(
+        tx_manager=tx_manager,
+        user_repo=user_repo,
+        wallet_repo=wallet_repo,
+        wallet_operation_repo=wallet_operation_repo,
+        write_strategy=WriteStrategy.STATEMENT,
+    )
+    with pytest.raises(UserDoesNotExist):
+        await usecase.enroll(user_id=1, amount=Decimal("10.0"))
+
+
 @pytest.mark.asyncio
 async def test_success_wallet_transfer_usecase(test_db, user_factory, wallet_factory):
     """Test success wallet enroll usecase."""
@@ -355,3 +404,167 @@ async def test_failed_wallet_transfer_usecase_transfer(
     new_wallet_2 = await wallet_repo.get_by_id(wallet_id=wallet_2.id)
     assert new_user.balance == wallet_1.balance
     assert new_wallet_2.balance == wallet_2.balance
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_transfer_usecase_statement(test_db, user_factory, wallet_factory):
+    """Test success wallet transfer usecase (single statement strategy)."""
+
+    base_user_1 = user_factory.create()
+    wallet_1 = wallet_factory.create(user=base_user_1)
+
+    base_user_2 = user_factory.create()
+    wallet_2 = wallet_factory.create(user=base_user_2)
+
+    tx_manager = SQLTransactionManager(db=test_db)
+    user_repo = UserRepository(db=test_db)
+    wallet_repo = WalletRepository(db=test_db)
+    wallet_operation_repo = WalletOperationRepository(db=test_db)
+
+    wo_count = await test_db.execute("select count(*) from wallet_operations;")
+
+    usecase = WalletUsecase(
+        tx_manager=tx_manager,
+        user_repo=user_repo,
+        wallet_repo=wallet_repo,
+        wallet_operation_repo=wallet_operation_repo,
+        write_strategy=WriteStrategy.STATEMENT,
+    )
+    new_user = await usecase.transfer(
+        source_wallet_id=wallet_1.id,
+        destination_wallet_id=wallet_2.id,
+        amount=Decimal("10.0"),
+    )
+    new_wo_count = await test_db.execute("select count(*) from wallet_operations;")
+    new_wallet_2 = await wallet_repo.get_by_id(wallet_id=wallet_2.id)
+    assert new_user.id == base_user_1.id
+    assert new_user.balance == wallet_1.balance - Decimal("10.0")
+    assert new_wallet_2.balance == wallet_2.balance + Decimal("10.0")
+    assert new_wo_count == wo_count + 2
+
+
+@pytest.mark.asyncio
+async def test_wallet_enroll_usecase_invalidates_cache(test_db, user_factory, wallet_factory):
+    """Test cached user is invalidated when wallet is enrolled."""
+
+    user = user_factory.create()
+    wallet_factory.create(user=user, balance=Decimal("0"))
+
+    cache = BalanceCache()
+    user_repo = UserRepository(db=test_db)
+    usecase = WalletUsecase(
+        tx_manager=SQLTransactionManager(db=test_db),
+        user_repo=user_repo,
+        wallet_repo=WalletRepository(db=test_db),
+        wallet_operation_repo=WalletOperationRepository(db=test_db),
+        cache=cache,
+    )
+    user_usecase = UserUsecase(
+        tx_manager=SQLTransactionManager(db=test_db),
+        user_repo=user_repo,
+        wallet_repo=WalletRepository(db=test_db),
+        wallet_operation_repo=WalletOperationRepository(db=test_db),
+        cache=cache,
+    )
+
+    assert (await user_usecase.get(user.id)).balance == Decimal("0")
+    await usecase.enroll(user_id=user.id, amount=Decimal("10.0"))
+    assert (await user_usecase.get(user.id)).balance == Decimal("10.0")
+    assert cache.users.metrics.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_wallet_enroll_usecase_replays_stored_response(test_db, user_factory, wallet_factory):
+    """Test enrollment with used idempotency key returns stored response from database."""
+
+    user = user_factory.create()
+    wallet_factory.create(user=user, balance=Decimal("0"))
+
+    usecase = WalletUsecase(
+        tx_manager=SQLTransactionManager(db=test_db),
+        user_repo=UserRepository(db=test_db),
+        wallet_repo=WalletRepository(db=test_db),
+        wallet_operation_repo=WalletOperationRepository(db=test_db),
+        write_strategy=WriteStrategy.STATEMENT,
+        idempotency_repo=IdempotencyKeyRepository(db=test_db),
+    )
+
+    first = await usecase.enroll(user_id=user.id, amount=Decimal("10.0"), idempotency_key="key")
+    second = await usecase.enroll(user_id=user.id, amount=Decimal("10"), idempotency_key="key")
+    assert first == second
+    assert first.balance == Decimal("10.0")
+
+    with pytest.raises(IdempotencyKeyReused):
+        await usecase.enroll(user_id=user.id, amount=Decimal("5"), idempotency_key="key")
+
+
+@pytest.mark.asyncio
+async def test_wallet_enroll_usecase_batches_deposits(test_db, user_factory, wallet_factory):
+    """Test concurrent enrollments are applied in one batch with post-state of each caller."""
+
+    user = user_factory.create()
+    wallet = wallet_factory.create(user=user, balance=Decimal("100"))
+
+    usecase = WalletUsecase(
+        tx_manager=SQLTransactionManager(db=test_db),
+        user_repo=UserRepository(db=test_db),
+        wallet_repo=WalletRepository(db=test_db),
+        wallet_operation_repo=WalletOperationRepository(db=test_db),
+        enroll_batch_delay=50,
+        enroll_batch_size=10,
+    )
+
+    results = await asyncio.gather(
+        usecase.enroll(user_id=user.id, amount=Decimal("10")),
+        usecase.enroll(user_id=0, amount=Decimal("5")),
+        usecase.enroll(user_id=user.id, amount=Decimal("20")),
+        return_exceptions=True,
+    )
+
+    assert results[0].balance == Decimal("110")
+    assert isinstance(results[1], UserDoesNotExist)
+    assert results[2].balance == Decimal("130")
+    assert usecase.coalescer.metrics.batches == 1
+
+    operations = await WalletOperationRepository(db=test_db).list_by_wallet(wallet.id, limit=10)
+    assert [operation.amount for operation in operations] == [Decimal("20"), Decimal("10")]
+
+
+@pytest.mark.asyncio
+async def test_success_wallet_transfer_usecase_sharded(test_db, user_factory, wallet_factory):
+    """Test transfers into sharded wallet and back with both write strategies."""
+
+    wallet_1 = wallet_factory.create(user=user_factory.create())
+    wallet_2 = wallet_factory.create(user=user_factory.create())
+    wallet_repo = WalletRepository(db=test_db)
+    usecases = [
+        WalletUsecase(
+            tx_manager=SQLTransactionManager(db=test_db),
+            user_repo=UserRepository(db=test_db),
+            wallet_repo=wallet_repo,
+            wallet_operation_repo=WalletOperationRepository(db=test_db),
+            write_strategy=write_strategy,
+        )
+        for write_strategy in WriteStrategy
+    ]
+    sharded_wallet = await usecases[0].set_balance_shards(wallet_id=wallet_2.id, shards=4)
+    assert sharded_wallet.balance == wallet_2.balance
+
+    for usecase in usecases:
+        await usecase.transfer(
+            source_wallet_id=wallet_1.id,
+            destination_wallet_id=wallet_2.id,
+            amount=Decimal("30.0"),
+        )
+    user = await usecases[1].transfer(
+        source_wallet_id=wallet_2.id,
+        destination_wallet_id=wallet_1.id,
+        amount=Decimal("150.0"),
+    )
+    assert user.balance == wallet_2.balance + Decimal("60.0") - Decimal("150.0")
+    assert (await wallet_repo.get_by_id(wallet_id=wallet_1.id)).balance == Decimal("190.0")
+
+    with pytest.raises(WalletDoesNotExist):
+        await usecases[0].set_balance_shards(wallet_id=wallet_2.id + 100, shards=4)
+    with pytest.raises(ValueError):
+        await usecases[0].set_balance_shards(wallet_id=wallet_2.id, shards=-1)